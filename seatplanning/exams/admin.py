@@ -1,4 +1,11 @@
-from django.contrib import admin
+import io
+import zipfile
+
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connection
+from django.http import HttpResponse
+from django.utils.functional import cached_property
 
 # Register your models here.
 
@@ -8,18 +15,240 @@ from .models import Class
 from .models import Section
 from .models import Exam
 from .models import SeatAssignment
+from .models import SeatAssignmentChange
 from .models import Student
 from .models import Room
+from .models import Seat
+from .allocation import generate_seat_plan, plan_scope, SeatPlanError
+from .archiving import archive_exam, archived_plan
+from .changes import record_changes
+from .exporting import assignment_rows, entry_row, exam_entries, write_csv, write_workbook, XLSX_CONTENT_TYPE
+from .locking import ExamLocked
+from .seatmaps import bump_plan_version
+from .snapshots import refresh_assignments
+
+# Unfiltered changelists of tables at least this big show an estimated row count.
+ESTIMATE_COUNT_ABOVE = 10000
+
+
+def _estimated_rows(model):
+    """
+    The backend's cheap estimate of the number of rows in the model's table,
+    or None where there is none.
+    """
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+                [table],
+            )
+        elif connection.vendor == 'sqlite':
+            # Only there once ANALYZE has run; the first number is the row count.
+            try:
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+            except DatabaseError:
+                return None
+            row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+        else:
+            return None
+        row = cursor.fetchone()
+    # PostgreSQL reports -1 for tables that were never analysed.
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Skips the full COUNT(*) of unfiltered changelists on big tables, using
+    the backend's estimate of the table size instead. Filtered lists (a
+    search or a filter on an indexed column) are counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = _estimated_rows(self.object_list.model)
+            if estimate is not None and estimate >= ESTIMATE_COUNT_ABOVE:
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables with hundreds of thousands of rows."""
+    paginator = EstimatedCountPaginator
+    # Don't count the whole table again next to a search's result count.
+    show_full_result_count = False
+    list_per_page = 50
+
+
+@admin.register(Faculty)
+class FacultyAdmin(admin.ModelAdmin):
+    search_fields = ('name',)
+
+
+@admin.register(Year)
+class YearAdmin(admin.ModelAdmin):
+    search_fields = ('=year_value',)
+
+
+@admin.register(Class)
+class ClassAdmin(admin.ModelAdmin):
+    list_display = ('name', 'faculty', 'year')
+    list_select_related = ('faculty', 'year')
+    list_filter = ('year', 'faculty')
+    search_fields = ('name',)
+
+
+@admin.register(Section)
+class SectionAdmin(admin.ModelAdmin):
+    list_display = ('name', 'class_name', 'faculty', 'year')
+    # Section and Class print their class, faculty and year.
+    list_select_related = ('class_name__faculty', 'class_name__year', 'faculty', 'year')
+    list_filter = ('year', 'faculty')
+    search_fields = ('class_name__name', '=name')
+    autocomplete_fields = ('class_name', 'faculty', 'year')
+
+
+@admin.register(Student)
+class StudentAdmin(LargeTableAdmin):
+    list_display = ('roll_no', 'name', 'section', 'year', 'faculty')
+    list_select_related = ('section__class_name__faculty', 'section__class_name__year', 'year', 'faculty')
+    list_filter = ('year', 'faculty')
+    # Prefix matches, which can use the roll_no index, rather than substring scans.
+    search_fields = ('^roll_no', '^name')
+    ordering = ('roll_no',)
+    autocomplete_fields = ('section', 'class_name', 'year', 'faculty')
+
+
+@admin.register(Exam)
+class ExamAdmin(admin.ModelAdmin):
+    list_display = ('name', 'date', 'start_time', 'end_time', 'plan_version')
+    date_hierarchy = 'date'
+    search_fields = ('name',)
+    ordering = ('-date', 'start_time')
+    actions = ('regenerate_plans', 'export_plans', 'archive_plans')
+
+    @admin.action(description="Regenerate the seat plans of the selected exams (same rooms and sections)")
+    def regenerate_plans(self, request, queryset):
+        for exam in queryset:
+            room_ids, section_ids = plan_scope(exam)
+            if not room_ids:
+                self.message_user(request, f"{exam} has no seat plan to regenerate.", messages.WARNING)
+                continue
+            try:
+                result = generate_seat_plan(exam, room_ids, section_ids)
+            except (SeatPlanError, ExamLocked) as e:
+                self.message_user(request, f"{exam}: {e}", messages.ERROR)
+                continue
+            self.message_user(request, f"{exam}: seated {result['assigned']} students in {result['seconds']}s.")
+
+    @admin.action(description="Export the seat plans of the selected exams")
+    def export_plans(self, request, queryset):
+        exams = list(queryset)
+        if len(exams) == 1:
+            exam = exams[0]
+            rows = assignment_rows(exam)
+            if not rows:
+                self.message_user(request, f"{exam} has no seat plan to export.", messages.WARNING)
+                return None
+            response = HttpResponse(content_type=XLSX_CONTENT_TYPE)
+            response['Content-Disposition'] = f'attachment; filename="seat_assignments_{exam.name}.xlsx"'
+            write_workbook(rows, response)
+            return response
+
+        # Several exams: one CSV per exam in a ZIP, written row by row.
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for exam in exams:
+                with archive.open(f"seat_assignments_{exam.pk}_{exam.date}.csv", mode='w') as fh:
+                    write_csv((entry_row(exam, entry) for entry in exam_entries(exam)), fh)
+        response = HttpResponse(buffer.getvalue(), content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="seat_assignments.zip"'
+        return response
+
+    @admin.action(description="Archive the seat plans of the selected exams")
+    def archive_plans(self, request, queryset):
+        for exam in queryset:
+            if archived_plan(exam) is not None:
+                self.message_user(request, f"{exam} is already archived.", messages.WARNING)
+                continue
+            if not SeatAssignment.objects.filter(exam=exam).exists():
+                self.message_user(request, f"{exam} has no seat plan to archive.", messages.WARNING)
+                continue
+            try:
+                plan = archive_exam(exam)
+            except ExamLocked as e:
+                self.message_user(request, f"{exam}: {e}", messages.ERROR)
+                continue
+            self.message_user(request, f"Archived {plan.row_count} seats of {exam} to {plan.file.name}.")
+
+
+@admin.register(Room)
+class RoomAdmin(admin.ModelAdmin):
+    list_display = ('name', 'building', 'capacity', 'is_available')
+    list_filter = ('building', 'is_available')
+    search_fields = ('name', 'building')
+
+
+@admin.register(Seat)
+class SeatAdmin(LargeTableAdmin):
+    list_display = ('seat_number', 'room', 'row_num', 'col_num')
+    list_select_related = ('room',)
+    list_filter = ('room__building',)
+    search_fields = ('^room__name', '=seat_number')
+    ordering = ('room__name', 'row_num', 'col_num')
+    autocomplete_fields = ('room',)
+
+
+@admin.register(SeatAssignment)
+class SeatAssignmentAdmin(LargeTableAdmin):
+    list_display = ('exam', 'roll_no', 'student_name', 'room', 'seat_number')
+    # __str__ would follow student -> seat -> room -> exam for every row.
+    list_display_links = ('roll_no',)
+    list_select_related = ('exam', 'student', 'seat__room')
+    list_filter = ('exam',)
+    search_fields = ('^student__roll_no',)
+    ordering = ('-id',)
+    autocomplete_fields = ('exam', 'student', 'seat')
+
+    @admin.display(description='Roll No', ordering='student__roll_no')
+    def roll_no(self, obj):
+        return obj.student.roll_no
+
+    @admin.display(description='Student', ordering='student__name')
+    def student_name(self, obj):
+        return obj.student.name
+
+    @admin.display(description='Room', ordering='seat__room__name')
+    def room(self, obj):
+        return obj.seat.room.name
+
+    @admin.display(description='Seat', ordering='seat__seat_number')
+    def seat_number(self, obj):
+        return obj.seat.seat_number
 
+    # Edits here change the plan like those made through the API (see SeatAssignmentViewSet).
+    def save_model(self, request, obj, form, change):
+        old_exam_id = form.initial.get('exam') if change else None
+        if change and old_exam_id != obj.exam_id:
+            record_changes(SeatAssignmentChange.DELETE, [obj.pk])
+        super().save_model(request, obj, form, change)
+        refresh_assignments([obj.pk])
+        moved = not change or old_exam_id != obj.exam_id
+        record_changes(SeatAssignmentChange.INSERT if moved else SeatAssignmentChange.UPDATE, [obj.pk])
+        bump_plan_version({obj.exam_id, old_exam_id} - {None})
 
- # Make sure to import your Faculty model
-admin.site.register(Faculty)
-admin.site.register(Year)
-admin.site.register(Class)
-admin.site.register(Section)
-admin.site.register(Student)
-admin.site.register(Exam)
-admin.site.register(Room)
-admin.site.register(SeatAssignment)
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, SeatAssignment.objects.filter(pk=obj.pk))
 
-# This line registers the Faculty model with the admin site
+    def delete_queryset(self, request, queryset):
+        assignments = list(queryset.values_list('id', 'exam_id'))
+        assignment_ids = [assignment_id for assignment_id, _ in assignments]
+        record_changes(SeatAssignmentChange.DELETE, assignment_ids)
+        super().delete_queryset(request, queryset)
+        refresh_assignments(assignment_ids)
+        bump_plan_version({exam_id for _, exam_id in assignments})
@@ -0,0 +1,299 @@
+import numpy as np
+from django.db import connection, transaction
+
+from . import metrics, strategies
+from .changes import record_changes, record_reset
+from .clashes import find_clashes_for_exam
+from .grid import SeatGrid
+from .locking import exam_lock
+from .routers import mark_exam_written
+from .seatmaps import bump_plan_version
+from .snapshots import rebuild_exams, refresh_assignments
+from .models import ArchivedPlan, Student, SeatAssignment, SeatAssignmentChange
+from .previews import PREVIEW_TIMEOUT, discard_preview, load_preview, previews_enabled, save_preview
+from .progress import NO_PROGRESS
+
+
+class SeatPlanError(Exception):
+    """Raised when a seat plan cannot be built from the requested rooms and sections."""
+
+
+class ExamClashError(SeatPlanError):
+    """Raised when students would be seated in two overlapping exams."""
+
+    def __init__(self, clashes):
+        self.clashes = clashes
+        super().__init__(
+            f"{len({c['student_id'] for c in clashes})} students are already seated "
+            f"in another exam that overlaps this one."
+        )
+
+
+# Backends that accept a multi-row INSERT ... VALUES (...), (...) statement.
+MULTI_ROW_INSERT_VENDORS = ('sqlite', 'mysql', 'postgresql')
+
+# Upper bound on the assignments written by a single INSERT statement.
+MAX_INSERT_BATCH = 5000
+
+
+def _insert_batch_size():
+    """Rows per INSERT, kept under the backend's limit on query parameters (3 per row)."""
+    max_params = connection.features.max_query_params or MAX_INSERT_BATCH * 3
+    return max(1, min(MAX_INSERT_BATCH, max_params // 3))
+
+
+def insert_assignments(exam_id, student_ids, seat_ids, progress=NO_PROGRESS):
+    """
+    Writes one SeatAssignment per (student, seat) pair in bounded batches,
+    using raw multi-row INSERTs where the backend supports them.
+    `student_ids` and `seat_ids` are equally long NumPy id arrays.
+    """
+    batch_size = _insert_batch_size()
+
+    if connection.vendor not in MULTI_ROW_INSERT_VENDORS:
+        for start in range(0, len(student_ids), batch_size):
+            SeatAssignment.objects.bulk_create([
+                SeatAssignment(exam_id=exam_id, student_id=student_id, seat_id=seat_id)
+                for student_id, seat_id in zip(
+                    student_ids[start:start + batch_size].tolist(), seat_ids[start:start + batch_size].tolist()
+                )
+            ])
+            progress.advance(min(batch_size, len(student_ids) - start))
+        return
+
+    meta = SeatAssignment._meta
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(meta.get_field(name).column) for name in ('exam', 'student', 'seat'))
+    prefix = f"INSERT INTO {qn(meta.db_table)} ({columns}) VALUES "
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(student_ids), batch_size):
+            students = student_ids[start:start + batch_size].tolist()
+            seats = seat_ids[start:start + batch_size].tolist()
+            params = []
+            for student_id, seat_id in zip(students, seats):
+                params.extend((exam_id, student_id, seat_id))
+            cursor.execute(prefix + ', '.join(['(%s, %s, %s)'] * len(students)), params)
+            progress.advance(len(students))
+
+
+def generate_seat_plan(exam, room_ids, section_ids, allow_clashes=False, progress=NO_PROGRESS,
+                       strategy=strategies.DEFAULT_STRATEGY, candidates=None,
+                       time_budget=strategies.DEFAULT_TIME_BUDGET, workers=None, preview=False):
+    """
+    Seats every student of the given sections in the seats of the given
+    rooms with the named allocation strategy (see exams.strategies),
+    replacing any previous plan for the exam. With strategy='best' the
+    `candidates` strategies (all by default) and random restarts of them are
+    tried in a process pool of `workers` for `time_budget` seconds, and only
+    the plan with the fewest same-class neighbours is written.
+
+    Students and seats are handled as id arrays rather than model instances
+    and the assignments are inserted in bounded batches, so memory stays flat
+    for very large cohorts. Returns a dict with the number of students
+    assigned, the strategy used, the plan's penalty (see
+    strategies.penalty), the wall time and the peak memory used.
+
+    Raises SeatPlanError for an unknown strategy, and ExamClashError if any
+    of the students sits another exam at the same time, unless
+    `allow_clashes` is set. Generations of the same exam run one at a time;
+    ExamLocked is raised if the running one takes too long. Each stage is
+    reported to `progress`.
+
+    With `preview` set nothing is written: the plan is cached as a preview
+    (see exams.previews) and its token returned under 'preview', to be
+    written later by commit_preview.
+    """
+    if isinstance(candidates, str):
+        candidates = [candidates]
+    names = candidates if strategy == strategies.BEST_OF else [strategy]
+    try:
+        for name in names or ():
+            strategies.get_strategy(name)
+    except ValueError as e:
+        raise SeatPlanError(str(e))
+
+    if preview:
+        if not previews_enabled():
+            raise SeatPlanError("Seat plan previews are turned off on this server.")
+        # Previews don't touch the exam's plan, so they need no lock.
+        with metrics.measure() as measurement:
+            grid, students = _load(exam, room_ids, section_ids, allow_clashes, progress)
+            stats = _place(grid, students, strategy, names, time_budget, workers, progress)
+            seat_indexes = stats.pop('seat_indexes')
+            progress.stage('preview')
+            token = save_preview(
+                exam, students.ids, grid.seat_ids[seat_indexes], room_ids, section_ids, allow_clashes, stats
+            )
+        return {
+            'assigned': len(students), **stats, **measurement.as_dict(),
+            'preview': token, 'expires_in': PREVIEW_TIMEOUT,
+        }
+
+    progress.stage('waiting')
+    with exam_lock(exam.pk), metrics.measure() as measurement:
+        # The search runs outside the transaction, so the database isn't held
+        # while candidates are tried; the lock keeps other generations out.
+        grid, students = _load(exam, room_ids, section_ids, allow_clashes, progress)
+        stats = _place(grid, students, strategy, names, time_budget, workers, progress)
+        _write_plan(
+            exam, grid.seat_ids[stats.pop('seat_indexes')], students.ids, progress,
+            None if allow_clashes else section_ids,
+        )
+    # Readers of this exam see the new plan before the replica has it.
+    transaction.on_commit(lambda: mark_exam_written(exam.pk))
+    return {'assigned': len(students), **stats, **measurement.as_dict()}
+
+
+def commit_preview(exam, token, progress=NO_PROGRESS):
+    """
+    Writes a preview made by generate_seat_plan(preview=True) as the exam's
+    plan and discards it. Raises SeatPlanError if the preview has expired,
+    or if its students or seats changed since (generate it again then), and
+    ExamClashError as generate_seat_plan does. Returns the preview's stats
+    with the wall time and peak memory of writing it.
+    """
+    preview = load_preview(token, exam.pk)
+    if preview is None:
+        raise SeatPlanError("This preview has expired or belongs to another exam. Generate it again.")
+
+    progress.stage('waiting')
+    with exam_lock(exam.pk), metrics.measure() as measurement:
+        grid, students = _load(exam, preview['room_ids'], preview['section_ids'], preview['allow_clashes'], progress)
+        if not np.array_equal(np.sort(students.ids), np.sort(preview['student_ids'])):
+            raise SeatPlanError("The students of the selected sections changed since the preview. Generate it again.")
+        if not np.isin(preview['seat_ids'], grid.seat_ids).all():
+            raise SeatPlanError("The seats of the selected rooms changed since the preview. Generate it again.")
+        _write_plan(
+            exam, preview['seat_ids'], preview['student_ids'], progress,
+            None if preview['allow_clashes'] else preview['section_ids'],
+        )
+    discard_preview(token)
+    transaction.on_commit(lambda: mark_exam_written(exam.pk))
+    return {'assigned': len(preview['student_ids']), **preview['stats'], **measurement.as_dict()}
+
+
+def _load_students(section_ids):
+    """The students of the sections as arrays of their ids, classes and sections, in roll number order."""
+    rows = Student.objects.filter(section__id__in=section_ids).order_by('roll_no').values_list(
+        'id', 'class_name_id', 'section_id'
+    )
+    columns = np.fromiter(rows.iterator(chunk_size=5000), dtype=np.dtype((np.int64, 3))).reshape(-1, 3)
+    return strategies.Students(columns[:, 0].copy(), columns[:, 1].copy(), columns[:, 2].copy())
+
+
+def _load(exam, room_ids, section_ids, allow_clashes, progress):
+    """Loads the students and seats of a plan and checks they can be seated. Returns (grid, students)."""
+    if ArchivedPlan.objects.filter(exam=exam).exists():
+        raise SeatPlanError("This exam's seat plan has been archived and can no longer be changed.")
+
+    with metrics.stage('generate', 'load'):
+        progress.stage('load')
+        students = _load_students(section_ids)
+        # The seats of the selected rooms, in fill order (room name, row, column)
+        grid = SeatGrid.for_rooms(room_ids)
+
+    if len(grid) < len(students):
+        raise SeatPlanError(
+            f"Insufficient capacity. {len(students)} students require seating, "
+            f"but only {len(grid)} seats are available in the selected rooms."
+        )
+
+    if not allow_clashes:
+        # Checked again when the plan is written (see _write_plan); this
+        # one fails before the search is run.
+        with metrics.stage('generate', 'clash_check'):
+            progress.stage('clash_check')
+            clashes = find_clashes_for_exam(exam, section_ids)
+        if clashes:
+            raise ExamClashError(clashes)
+    return grid, students
+
+
+def _place(grid, students, strategy, names, time_budget, workers, progress):
+    """
+    Places the students with the strategy, or the best of `names`. Returns
+    the stats of the plan, with the seat index of every student under 'seat_indexes'.
+    """
+    seats = strategies.Seats.from_grid(grid)
+    with metrics.stage('generate', 'search'):
+        progress.stage('search')
+        if strategy == strategies.BEST_OF:
+            best, scored = strategies.best_of(
+                seats, students, names, time_budget=time_budget, workers=workers, progress=progress
+            )
+            name, _, seat_indexes, score = best
+            return {'strategy': name, 'penalty': score, 'seat_indexes': seat_indexes, 'candidates': len(scored)}
+        name, _, seat_indexes, score = strategies.run_candidate(strategy, None, seats, students)
+    return {'strategy': name, 'penalty': score, 'seat_indexes': seat_indexes}
+
+
+@transaction.atomic
+def _write_plan(exam, seat_ids, student_ids, progress, clash_section_ids=None):
+    """
+    Replaces the exam's assignments with the given (student, seat) pairs and
+    rebuilds its snapshot. With `clash_section_ids`, raises ExamClashError
+    if students of those sections are seated in an overlapping exam, checked
+    in the same transaction under the overlapping exams' row locks, so two
+    overlapping plans can't both pass the check.
+    """
+    if clash_section_ids is not None:
+        with metrics.stage('generate', 'clash_check'):
+            clashes = find_clashes_for_exam(exam, clash_section_ids, lock=True)
+        if clashes:
+            raise ExamClashError(clashes)
+
+    with metrics.stage('generate', 'delete'):
+        progress.stage('delete')
+        # Clear any previous assignments for this exam
+        SeatAssignment.objects.filter(exam=exam).delete()
+
+    with metrics.stage('generate', 'insert'):
+        progress.stage('insert', total=len(student_ids))
+        insert_assignments(exam.id, student_ids, seat_ids, progress)
+
+    with metrics.stage('generate', 'snapshot'):
+        progress.stage('snapshot')
+        rebuild_exams([exam.id])
+    bump_plan_version([exam.id])
+    record_reset([exam.id])
+
+    metrics.ROWS.inc('generate', amount=len(student_ids))
+
+
+def plan_scope(exam):
+    """The ids of the rooms and sections in the exam's current plan, to regenerate it with."""
+    assignments = SeatAssignment.objects.filter(exam=exam)
+    room_ids = list(assignments.values_list('seat__room_id', flat=True).distinct())
+    section_ids = list(assignments.values_list('student__section_id', flat=True).distinct())
+    return room_ids, section_ids
+
+
+def swap_seats(exam, roll_no_a, roll_no_b):
+    """
+    Swaps the seats of two students in an exam's plan. Raises SeatPlanError
+    if either of them has no seat in the exam.
+    """
+    with exam_lock(exam.pk), transaction.atomic():
+        assignments = {
+            a.student.roll_no: a
+            for a in SeatAssignment.objects.filter(
+                exam=exam, student__roll_no__in=[roll_no_a, roll_no_b]
+            ).select_related('student')
+        }
+        missing = [roll_no for roll_no in (roll_no_a, roll_no_b) if roll_no not in assignments]
+        if missing:
+            raise SeatPlanError(f"No seat found in this exam for roll number(s): {', '.join(missing)}.")
+        if roll_no_a == roll_no_b:
+            raise SeatPlanError("Choose two different students to swap.")
+
+        first, second = assignments[roll_no_a], assignments[roll_no_b]
+        # Swapping the students keeps the (exam, seat) pairs unique at every step.
+        first.student_id, second.student_id = second.student_id, first.student_id
+        SeatAssignment.objects.bulk_update([first, second], ['student'])
+
+        bump_plan_version([exam.id])
+        refresh_assignments([first.id, second.id])
+        record_changes(SeatAssignmentChange.UPDATE, [first.id, second.id])
+    transaction.on_commit(lambda: mark_exam_written(exam.pk))
+    return first, second
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ExamsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'exams'
+
+    def ready(self):
+        from . import checks  # noqa: F401 (registers the system checks)
+        from . import signals  # noqa: F401 (keeps seat plans in step with the rows they show)
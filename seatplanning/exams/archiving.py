@@ -0,0 +1,106 @@
+"""
+Archival of past exams' seat plans.
+
+An archived plan is moved out of the hot SeatAssignment and SeatPlanEntry
+tables into a gzip-compressed NDJSON file in media storage, one snapshot
+entry per line in seat order, and recorded as an ArchivedPlan. Exports read
+archived plans back through `exporting.exam_entries`, so the export
+endpoints serve current and archived exams alike.
+"""
+import gzip
+import json
+import tempfile
+
+from django.core.files import File
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+
+from . import metrics
+from .changes import record_reset
+from .locking import exam_lock
+from .models import ArchivedPlan, Exam, SeatAssignment, SeatPlanEntry
+from .seatmaps import bump_plan_version
+from .snapshots import rebuild_exams
+
+# Every snapshot field an archive line carries, so a plan can be inspected or restored from it.
+ARCHIVE_FIELDS = (
+    'assignment_id', 'student_id', 'seat_id', 'room_id', 'building', 'room_name', 'seat_number',
+    'row_num', 'col_num', 'roll_no', 'student_name', 'section', 'class_name', 'year', 'faculty',
+)
+
+# Archives are written through a temporary file that moves to disk past this size.
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+
+def archivable_exams(before):
+    """Exams dated before `before` that still have a seat plan in the hot tables, oldest first."""
+    return Exam.objects.filter(
+        date__lt=before, archived_plan__isnull=True,
+    ).filter(Exists(SeatAssignment.objects.filter(exam=OuterRef('pk')))).order_by('date', 'start_time')
+
+
+def archive_exam(exam):
+    """
+    Writes the exam's plan to an archive file and deletes it from the hot
+    tables. The snapshot is rebuilt first, so the archive matches the
+    assignments even after edits made outside the API. Returns the ArchivedPlan.
+    """
+    with exam_lock(exam.pk), transaction.atomic(), metrics.stage('archive', 'exam'):
+        rebuild_exams([exam.pk])
+        entries = SeatPlanEntry.objects.filter(exam=exam).order_by('room_name', 'row_num', 'col_num').values_list(
+            *ARCHIVE_FIELDS
+        )
+
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+            row_count = 0
+            with gzip.GzipFile(fileobj=spool, mode='wb') as archive:
+                for entry in entries.iterator(chunk_size=2000):
+                    archive.write(json.dumps(dict(zip(ARCHIVE_FIELDS, entry))).encode() + b'\n')
+                    row_count += 1
+            spool.seek(0)
+
+            plan = ArchivedPlan(exam=exam, row_count=row_count)
+            plan.file.save(f"exam_{exam.pk}.ndjson.gz", File(spool), save=False)
+
+        try:
+            plan.save()
+            SeatPlanEntry.objects.filter(exam=exam).delete()
+            SeatAssignment.objects.filter(exam=exam).delete()
+            bump_plan_version([exam.pk])
+            record_reset([exam.pk])
+        except Exception:
+            # Nothing was deleted, so don't leave an orphaned archive behind.
+            plan.file.delete(save=False)
+            raise
+
+    metrics.ROWS.inc('archive', amount=row_count)
+    return plan
+
+
+def archived_plan(exam):
+    """The exam's ArchivedPlan, or None if its plan is in the hot tables."""
+    return ArchivedPlan.objects.filter(exam=exam).first()
+
+
+def iter_archived_entries(plan):
+    """Reads an archived plan back as dicts of ARCHIVE_FIELDS, in seat order."""
+    with plan.file.open('rb') as fh, gzip.GzipFile(fileobj=fh, mode='rb') as archive:
+        for line in archive:
+            yield json.loads(line)
+
+
+def compact():
+    """
+    Gives the space of deleted rows back to the operating system and
+    refreshes the planner statistics, where the backend supports it.
+    Must run outside a transaction.
+    """
+    tables = [model._meta.db_table for model in (SeatAssignment, SeatPlanEntry)]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('VACUUM')
+        elif connection.vendor == 'postgresql':
+            for table in tables:
+                cursor.execute(f'VACUUM ANALYZE {connection.ops.quote_name(table)}')
+        elif connection.vendor == 'mysql':
+            cursor.execute(f"OPTIMIZE TABLE {', '.join(connection.ops.quote_name(t) for t in tables)}")
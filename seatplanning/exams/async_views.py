@@ -0,0 +1,285 @@
+"""
+Async counterparts of the upload and export views, for serving the app under
+ASGI (seatplanning/asgi.py). Database access goes through the async ORM and
+the CPU-bound workbook parsing/rendering runs in the default executor, so the
+event loop keeps serving other downloads while an import is in progress.
+
+Each view runs the authentication, permission and throttle checks of its
+sync counterpart before doing any work, so both variants accept the same
+clients.
+"""
+import asyncio
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from . import metrics, progress
+from .exporting import (
+    aexam_entries, entry_row, render_workbook,
+    csv_header, csv_line, XLSX_CONTENT_TYPE,
+)
+from .importing import (
+    parse_student_workbook, check_student_rows, import_student_sheets, import_student_sheets_chunked,
+    start_import_run, claim_import_run, ImportRunError, ImportRunBusy,
+)
+from .models import Exam, ImportRun
+from .previews import load_preview
+from .serializers import ExcelUploadSerializer, ImportRunSerializer
+from .views import ExcelUploadView, ExportSeatAssignments, ExportSeatAssignmentsCSV
+
+logger = logging.getLogger(__name__)
+
+# Response headers worth keeping when a DRF error response is turned into a JsonResponse.
+ERROR_HEADERS = ('WWW-Authenticate', 'Retry-After')
+
+
+def _check_access(view_class, request, kwargs):
+    """
+    Runs the authentication, permission and throttle checks of the DRF view
+    `view_class` on `request`; returns None if they pass and the error
+    response that view would have sent if they fail.
+    """
+    view = view_class()
+    view.setup(request, **kwargs)
+    view.args, view.kwargs = (), kwargs
+    drf_request = view.initialize_request(request, **kwargs)
+    view.request = drf_request
+    view.headers = view.default_response_headers
+    try:
+        view.initial(drf_request, **kwargs)
+    except Exception as exc:
+        response = view.handle_exception(exc)
+        denied = JsonResponse(response.data, status=response.status_code)
+        for header in ERROR_HEADERS:
+            if header in response:
+                denied[header] = response[header]
+        return denied
+    return None
+
+
+class AsyncAPIView(View):
+    """
+    Base for the async views: `sync_view` is the DRF view whose access
+    checks apply. Like APIView, the view is exempt from Django's CSRF
+    middleware: JWT requests carry no cookies to forge, and
+    SessionAuthentication (if it is enabled) enforces CSRF itself.
+    """
+    sync_view = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        denied = await sync_to_async(_check_access)(self.sync_view, request, kwargs)
+        if denied is not None:
+            return denied
+        return await super().dispatch(request, *args, **kwargs)
+
+
+async def _requested_preview(request, exam_id):
+    """The async counterpart of views.requested_preview."""
+    token = request.GET.get('preview')
+    if not token:
+        return None, None
+    preview = await sync_to_async(load_preview)(token, exam_id)
+    if preview is None:
+        return None, JsonResponse(
+            {"error": "This preview has expired or belongs to another exam. Generate it again."},
+            status=404
+        )
+    return preview, None
+
+
+class AsyncExcelUploadView(AsyncAPIView):
+    """Async version of ExcelUploadView."""
+    sync_view = ExcelUploadView
+
+    async def post(self, request, *args, **kwargs):
+        serializer = ExcelUploadSerializer(data={**request.POST.dict(), **request.FILES.dict()})
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=400)
+
+        file = serializer.validated_data['file']
+
+        try:
+            tracker = progress.tracker(progress.progress_id_from(request), 'import')
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        try:
+            loop = asyncio.get_running_loop()
+            report, frame = await loop.run_in_executor(None, parse_student_workbook, file, tracker)
+            # The vectorised checks are quick but look up existing students and faculties.
+            await sync_to_async(check_student_rows)(report, frame, tracker)
+            if not report.is_valid:
+                message = f"The workbook has {report.error_count} errors. Nothing was imported."
+                tracker.fail(message)
+                return JsonResponse({"error": message, "report": report.as_dict()}, status=400)
+
+            if serializer.validated_data['dry_run']:
+                message = (f"The workbook is valid: {report.row_count - report.existing_count} new students "
+                           f"would be imported from {len(report.sheets)} sheets.")
+                tracker.finish(message)
+                return JsonResponse({"message": message, "report": report.as_dict()}, status=200)
+
+            resume = serializer.validated_data.get('resume')
+            if resume is None and report.existing_count == report.row_count:
+                # Every student exists already (e.g. the same workbook was imported before): nothing to write.
+                message = f"All {report.row_count} students in the workbook already exist. Nothing was imported."
+                tracker.finish(message)
+                return JsonResponse({"message": message, "report": report.as_dict()}, status=200)
+
+            if resume is not None or serializer.validated_data['chunked']:
+                if resume is not None:
+                    run = await sync_to_async(claim_import_run)(resume, report)
+                else:
+                    run = await sync_to_async(start_import_run)(report, serializer.validated_data['chunk_size'])
+                # Every chunk commits on its own, but they run one after another in the ORM's sync thread.
+                total_students_created = await sync_to_async(import_student_sheets_chunked)(run, report, tracker)
+
+                message = f"Successfully imported {total_students_created} new students from {report.sheet_count} sheets."
+                tracker.finish(message)
+                return JsonResponse(
+                    {"message": message, "report": report.as_dict(), "import_run": ImportRunSerializer(run).data},
+                    status=201
+                )
+
+            # The inserts have to share one transaction, which the async ORM cannot
+            # span, so the whole write step runs in the ORM's sync thread.
+            total_students_created = await sync_to_async(import_student_sheets)(report.sheets, tracker)
+
+            message = f"Successfully imported {total_students_created} new students from {report.sheet_count} sheets."
+            tracker.finish(message)
+            return JsonResponse({"message": message, "report": report.as_dict()}, status=201)
+
+        except ImportRun.DoesNotExist:
+            tracker.fail("Import run not found")
+            return JsonResponse({"error": "Import run not found"}, status=404)
+        except ImportRunError as e:
+            tracker.fail(str(e))
+            data = {"error": str(e)}
+            if e.run is not None:
+                data["import_run"] = ImportRunSerializer(e.run).data
+            return JsonResponse(data, status=409 if isinstance(e, ImportRunBusy) else 400)
+        except Exception as e:
+            logger.exception("Unexpected error in %s", type(self).__name__)
+            metrics.VIEW_ERRORS.inc(type(self).__name__)
+            tracker.fail(str(e))
+            return JsonResponse({"error": f"An unexpected error occurred: {str(e)}"}, status=400)
+
+
+class AsyncExportSeatAssignments(AsyncAPIView):
+    """Async version of ExportSeatAssignments; ?preview=<token> exports a plan preview."""
+    sync_view = ExportSeatAssignments
+
+    async def get(self, request, exam_id, *args, **kwargs):
+        try:
+            exam = await Exam.objects.aget(id=exam_id)
+            preview, error = await _requested_preview(request, exam.id)
+            if error:
+                return error
+
+            with metrics.stage('export', 'query'):
+                if preview:
+                    rows = [entry_row(exam, entry) for entry in preview['entries']]
+                else:
+                    rows = [entry_row(exam, entry) async for entry in aexam_entries(exam)]
+            if not rows:
+                return JsonResponse({"message": "No seat assignments found for this exam."}, status=404)
+
+            loop = asyncio.get_running_loop()
+            content = await loop.run_in_executor(None, render_workbook, rows)
+
+            response = HttpResponse(content, content_type=XLSX_CONTENT_TYPE)
+            response['Content-Disposition'] = f'attachment; filename="seat_assignments_{exam.name}.xlsx"'
+            return response
+
+        except Exam.DoesNotExist:
+            return JsonResponse({"error": "Exam not found"}, status=404)
+        except Exception as e:
+            logger.exception("Unexpected error in %s", type(self).__name__)
+            metrics.VIEW_ERRORS.inc(type(self).__name__)
+            return JsonResponse({"error": f"An unexpected error occurred: {str(e)}"}, status=500)
+
+
+class AsyncExportSeatAssignmentsCSV(AsyncAPIView):
+    """
+    Async version of ExportSeatAssignmentsCSV, streamed from an async
+    iterator; ?preview=<token> exports a plan preview.
+    """
+    sync_view = ExportSeatAssignmentsCSV
+
+    async def get(self, request, exam_id, *args, **kwargs):
+        try:
+            exam = await Exam.objects.aget(id=exam_id)
+        except Exam.DoesNotExist:
+            return JsonResponse({"error": "Exam not found"}, status=404)
+        preview, error = await _requested_preview(request, exam.id)
+        if error:
+            return error
+
+        async def stream():
+            yield csv_header()
+            if preview:
+                for entry in preview['entries']:
+                    yield csv_line(entry_row(exam, entry))
+                return
+            async for entry in aexam_entries(exam):
+                yield csv_line(entry_row(exam, entry))
+
+        response = StreamingHttpResponse(stream(), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="seat_assignments_{exam.name}.csv"'
+        return response
+
+
+class ProgressEvents(View):
+    """
+    Streams the progress of an import or generation as server-sent events.
+    Each "progress" event carries the stage, the rows done, the total and an
+    ETA; the stream ends after the job finishes or fails. Serve the app under
+    ASGI for this: WSGI servers would hold a worker thread per listener.
+    """
+    # How often the progress is checked, and how long an unknown id is waited for.
+    poll_interval = 0.25
+    wait_for_start = 30
+    keep_alive_interval = 15
+
+    async def get(self, request, progress_id, *args, **kwargs):
+        if not progress.PROGRESS_ID_PATTERN.match(progress_id):
+            return JsonResponse({"error": "Invalid progress id."}, status=400)
+
+        response = StreamingHttpResponse(self._events(progress_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Stops nginx from buffering the stream.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def _events(self, progress_id):
+        started = last_sent = time.monotonic()
+        last_seq = None
+        # Tells EventSource to reconnect after a second if the connection drops.
+        yield "retry: 1000\n\n"
+        while time.monotonic() - started < progress.PROGRESS_TIMEOUT:
+            state = await progress.aread(progress_id)
+
+            if state is None:
+                if time.monotonic() - started > self.wait_for_start:
+                    yield f"event: error\ndata: {json.dumps({'error': 'Unknown progress id.'})}\n\n"
+                    return
+            elif state['seq'] != last_seq:
+                last_seq, last_sent = state['seq'], time.monotonic()
+                yield f"id: {state['seq']}\nevent: progress\ndata: {json.dumps(state)}\n\n"
+                if state['status'] != progress.RUNNING:
+                    return
+
+            if time.monotonic() - last_sent >= self.keep_alive_interval:
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(self.poll_interval)
+
@@ -0,0 +1,101 @@
+import csv
+import io
+import re
+import zipfile
+from itertools import groupby
+
+from .exporting import exam_entries
+
+DOOR_LIST_COLUMNS = ['Seat Number', 'Roll No', 'Student Name']
+DESK_LABEL_COLUMNS = ['Seat Number', 'Roll No', 'Student Name', 'Room Name', 'Building', 'Exam Name', 'Exam Date']
+
+
+class _ZipSink(io.RawIOBase):
+    """
+    A write-only, unseekable stream that collects what ZipFile writes until
+    it is drained. ZipFile falls back to data descriptors for such streams,
+    so entries can be emitted as soon as they are written.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _safe_name(value):
+    return re.sub(r'[^\w.-]+', '_', value).strip('_') or 'room'
+
+
+def _folder(building, room_name, used):
+    """A folder name for the room that no other room of the archive has."""
+    base = _safe_name(f"{building}_{room_name}")
+    folder, n = base, 1
+    while folder in used:
+        n += 1
+        folder = f"{base}_{n}"
+    used.add(folder)
+    return folder
+
+
+def _csv_bytes(header, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def iter_room_bundle(exam, entries=None):
+    """
+    Streams a ZIP archive with a folder (building_room) holding a door list
+    and desk labels for every room of the exam. The plan (current or archived) is read in seat order and
+    each room's files are yielded as soon as they are compressed, so only
+    one room is held in memory at a time. `entries` (e.g. a preview's)
+    replace the exam's plan.
+    """
+    entries = (
+        (e['room_id'], e['room_name'], e['building'], e['seat_number'], e['roll_no'], e['student_name'])
+        for e in (exam_entries(exam) if entries is None else entries)
+    )
+
+    sink = _ZipSink()
+    used = set()
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        # Room names are unique, so each room's seats come together in seat order.
+        for _, rows in groupby(entries, key=lambda r: r[0]):
+            rows = [row[1:] for row in rows]
+            folder = _folder(rows[0][1], rows[0][0], used)
+
+            archive.writestr(
+                f"{folder}/door_list.csv",
+                _csv_bytes(DOOR_LIST_COLUMNS, ([seat, roll_no, name] for _, _, seat, roll_no, name in rows)),
+            )
+            yield sink.drain()
+
+            archive.writestr(
+                f"{folder}/desk_labels.csv",
+                _csv_bytes(DESK_LABEL_COLUMNS, (
+                    [seat, roll_no, name, room, building, exam.name, exam.date]
+                    for room, building, seat, roll_no, name in rows
+                )),
+            )
+            yield sink.drain()
+
+    # The central directory is written when the archive is closed.
+    yield sink.drain()
@@ -0,0 +1,68 @@
+"""
+The change log of seat assignments, for clients that poll for edits
+instead of re-fetching whole plans.
+"""
+from .models import SeatAssignment, SeatAssignmentChange
+
+DEFAULT_CHANGES_LIMIT = 1000
+MAX_CHANGES_LIMIT = 5000
+
+CHANGE_FIELDS = ('id', 'op', 'assignment_id', 'student_id', 'roll_no', 'seat_id', 'seat_number', 'room_id')
+
+
+def record_reset(exam_ids):
+    """
+    Logs that the plans of the given exams were replaced as a whole and
+    prunes their older entries, which the reset supersedes.
+    """
+    exam_ids = list(exam_ids)
+    if not exam_ids:
+        return
+    SeatAssignmentChange.objects.filter(exam_id__in=exam_ids).delete()
+    SeatAssignmentChange.objects.bulk_create(
+        SeatAssignmentChange(exam_id=exam_id, op=SeatAssignmentChange.RESET) for exam_id in exam_ids
+    )
+
+
+def record_changes(op, assignment_ids):
+    """Logs an insert/update/delete of the given assignments, as they are now."""
+    rows = SeatAssignment.objects.filter(id__in=assignment_ids).values_list(
+        'id', 'exam_id', 'student_id', 'student__roll_no', 'seat_id', 'seat__seat_number', 'seat__room_id'
+    )
+    SeatAssignmentChange.objects.bulk_create(
+        SeatAssignmentChange(
+            exam_id=exam_id, op=op, assignment_id=assignment_id,
+            student_id=student_id, roll_no=roll_no, seat_id=seat_id, seat_number=seat_number, room_id=room_id,
+        )
+        for assignment_id, exam_id, student_id, roll_no, seat_id, seat_number, room_id in rows
+    )
+
+
+def changes_since(exam_id, since=0, limit=DEFAULT_CHANGES_LIMIT):
+    """
+    The changes of an exam's plan after the `since` cursor, oldest first.
+
+    If the plan was replaced after the cursor, `reset` is True: the client
+    should fetch the whole plan again and then apply the returned changes,
+    which start at the reset. Returns a dict with the new cursor to poll with.
+    """
+    changes = SeatAssignmentChange.objects.filter(exam_id=exam_id, id__gt=since).order_by('id')
+
+    last_reset = changes.filter(op=SeatAssignmentChange.RESET).order_by('-id').values_list('id', flat=True).first()
+    if last_reset is not None:
+        changes = changes.filter(id__gt=last_reset)
+
+    rows = list(changes.values_list(*CHANGE_FIELDS)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if rows:
+        cursor = rows[-1][0]
+    else:
+        cursor = max(since, last_reset or 0)
+    return {
+        'cursor': cursor,
+        'reset': last_reset is not None,
+        'has_more': has_more,
+        'changes': [dict(zip(CHANGE_FIELDS, row)) for row in rows],
+    }
@@ -0,0 +1,42 @@
+"""
+System checks of the deployment settings the exams app relies on.
+"""
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+from .routers import replica_configured
+
+# Cache backends whose entries only the process that wrote them can see.
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Previews, sticky replica reads and seat grid invalidations go through
+    the cache, and are lost on other workers if each process has its own.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    features = [name for name, enabled in (
+        ('a read replica', replica_configured()),
+        ('seat plan previews', getattr(settings, 'SEAT_PLAN_PREVIEWS', True)),
+    ) if enabled]
+    if features:
+        return [Error(
+            f"The default cache ({backend}) is local to each process, but {' and '.join(features)} "
+            f"need a cache that every worker shares.",
+            hint="Use the file-based or Redis cache (see CACHES in settings), "
+                 "or set SEAT_PLAN_PREVIEWS = False and run without a replica.",
+            id='exams.E001',
+        )]
+    return [Warning(
+        f"The default cache ({backend}) is local to each process: with more than one worker, "
+        f"a worker can keep using the seat grid of a room whose seats another one changed.",
+        hint="Use the file-based or Redis cache (see CACHES in settings), or run a single worker.",
+        id='exams.W001',
+    )]
@@ -0,0 +1,138 @@
+import datetime
+from bisect import bisect_left
+
+from django.db.models import F
+
+from .models import Exam, SeatAssignment
+
+
+def _interval(date, start_time, end_time):
+    """Turns an exam's date/start/end into a (start, end) pair of datetimes."""
+    start = datetime.datetime.combine(date, start_time)
+    end = datetime.datetime.combine(date, end_time)
+    if end <= start:
+        # An end time before the start means the exam runs past midnight.
+        end += datetime.timedelta(days=1)
+    return start, end
+
+
+class ExamIntervalIndex:
+    """
+    Exams sorted by start time, so overlapping exams can be found with a
+    bisect instead of comparing every pair of exams.
+    """
+
+    def __init__(self, exams):
+        """`exams` is an iterable of (id, date, start_time, end_time) tuples."""
+        intervals = sorted(_interval(d, s, e) + (exam_id,) for exam_id, d, s, e in exams)
+        self.starts = [i[0] for i in intervals]
+        self.ends = [i[1] for i in intervals]
+        self.ids = [i[2] for i in intervals]
+        # No exam is longer than this, which bounds how far back a search has to look.
+        self.max_duration = max((e - s for s, e in zip(self.starts, self.ends)), default=datetime.timedelta(0))
+
+    @classmethod
+    def build(cls, date_from=None, date_to=None):
+        """Builds the index from the Exam table, optionally limited to a date range."""
+        exams = Exam.objects.all()
+        if date_from:
+            # Exams running past midnight can overlap with the first day of the range.
+            exams = exams.filter(date__gte=date_from - datetime.timedelta(days=1))
+        if date_to:
+            exams = exams.filter(date__lte=date_to)
+        return cls(exams.values_list('id', 'date', 'start_time', 'end_time'))
+
+    def overlapping(self, start, end, exclude=None):
+        """Ids of the exams that overlap the [start, end) interval."""
+        lo = bisect_left(self.starts, start - self.max_duration)
+        hi = bisect_left(self.starts, end)
+        return [
+            self.ids[i] for i in range(lo, hi)
+            if self.ends[i] > start and self.ids[i] != exclude
+        ]
+
+    def windows(self, min_size=2):
+        """
+        Splits the exams into windows of transitively overlapping exams.
+        Yields (exam_ids, overlapping_pairs) for every window of at least `min_size` exams.
+        """
+        i, n = 0, len(self.ids)
+        while i < n:
+            j, window_end = i + 1, self.ends[i]
+            while j < n and self.starts[j] < window_end:
+                window_end = max(window_end, self.ends[j])
+                j += 1
+            if j - i >= min_size:
+                pairs = set()
+                for a in range(i, j):
+                    # Only exams starting before this one ends can overlap with it.
+                    for b in range(a + 1, bisect_left(self.starts, self.ends[a], a + 1, j)):
+                        pairs.add(tuple(sorted((self.ids[a], self.ids[b]))))
+                yield self.ids[i:j], pairs
+            i = j
+
+
+def find_clashes(date_from=None, date_to=None):
+    """
+    Finds every student seated in two exams that overlap in time.
+
+    Each window of overlapping exams is checked with a single self-join of
+    SeatAssignment on the student. Returns a list of dicts with the student
+    and the two clashing exam ids.
+    """
+    index = ExamIntervalIndex.build(date_from, date_to)
+    # The index reaches back a day for exams running past midnight; pairs
+    # entirely before the range are left out.
+    in_range = None if not date_from else {
+        exam_id for exam_id, start in zip(index.ids, index.starts) if start.date() >= date_from
+    }
+    clashes = []
+    for exam_ids, pairs in index.windows():
+        if in_range is not None:
+            pairs = {pair for pair in pairs if pair[0] in in_range or pair[1] in in_range}
+            if not pairs:
+                continue
+        rows = SeatAssignment.objects.filter(
+            exam_id__in=exam_ids,
+            student__seatassignment__exam_id__in=exam_ids,
+            student__seatassignment__exam_id__gt=F('exam_id'),
+        ).values_list('student_id', 'student__roll_no', 'student__name', 'exam_id', 'student__seatassignment__exam_id')
+
+        for student_id, roll_no, name, exam_a, exam_b in rows:
+            if (exam_a, exam_b) in pairs:
+                clashes.append({
+                    'student_id': student_id,
+                    'roll_no': roll_no,
+                    'name': name,
+                    'exams': [exam_a, exam_b],
+                })
+    return clashes
+
+
+def find_clashes_for_exam(exam, section_ids, lock=False):
+    """
+    Finds the students of the given sections that are already seated in
+    another exam overlapping `exam`. Used before a new plan is committed.
+
+    With `lock` set, which needs a transaction, the rows of the exam and of
+    every exam overlapping it are locked first, in id order, and stay locked
+    until the transaction ends: plans of overlapping exams are then checked
+    and written one at a time, so each check sees the others' plans.
+    (SQLite ignores row locks, but fails one of two concurrent writers.)
+    """
+    start, end = _interval(exam.date, exam.start_time, exam.end_time)
+    index = ExamIntervalIndex.build(exam.date - datetime.timedelta(days=1), exam.date + datetime.timedelta(days=1))
+    other_exam_ids = index.overlapping(start, end, exclude=exam.id)
+    if not other_exam_ids:
+        return []
+    if lock:
+        list(Exam.objects.select_for_update().filter(id__in=[exam.id, *other_exam_ids]).order_by('id').values_list('id'))
+
+    rows = SeatAssignment.objects.filter(
+        exam_id__in=other_exam_ids,
+        student__section_id__in=section_ids,
+    ).values_list('student_id', 'student__roll_no', 'student__name', 'exam_id')
+    return [
+        {'student_id': student_id, 'roll_no': roll_no, 'name': name, 'exams': [exam.id, other_id]}
+        for student_id, roll_no, name, other_id in rows
+    ]
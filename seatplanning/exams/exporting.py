@@ -0,0 +1,189 @@
+import csv
+import io
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+
+from . import metrics
+from .archiving import archived_plan, iter_archived_entries
+from .models import ArchivedPlan, SeatPlanEntry
+
+EXPORT_COLUMNS = [
+    'Exam Name', 'Exam Date', 'Building', 'Room Name', 'Seat Number',
+    'Student Name', 'Roll No', 'Section', 'Class', 'Year', 'Faculty',
+]
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+# The SeatPlanEntry field behind each of EXPORT_COLUMNS after the exam's name and date.
+ENTRY_FIELDS = {
+    'Building': 'building',
+    'Room Name': 'room_name',
+    'Seat Number': 'seat_number',
+    'Student Name': 'student_name',
+    'Roll No': 'roll_no',
+    'Section': 'section',
+    'Class': 'class_name',
+    'Year': 'year',
+    'Faculty': 'faculty',
+}
+
+
+def plan_entries(exam):
+    """
+    The exam's rows from the denormalized plan snapshot, in seat order, as
+    dicts of ENTRY_FIELDS and the room id. A single indexed scan with no joins.
+    """
+    # values() rather than values_list(): only its rows are fetched lazily by aiterator().
+    return SeatPlanEntry.objects.filter(exam=exam).order_by('room_name', 'row_num', 'col_num').values(
+        'room_id', *ENTRY_FIELDS.values()
+    )
+
+
+def exam_entries(exam):
+    """
+    The exam's plan as dicts of ENTRY_FIELDS (at least), in seat order: from
+    the snapshot table, or from its archive file once the plan was archived.
+    """
+    plan = archived_plan(exam)
+    if plan is None:
+        return plan_entries(exam).iterator(chunk_size=2000)
+    return iter_archived_entries(plan)
+
+
+def has_plan(exam):
+    """Whether the exam has a plan to export, current or archived."""
+    return SeatPlanEntry.objects.filter(exam=exam).exists() or ArchivedPlan.objects.filter(exam=exam).exists()
+
+
+async def aexam_entries(exam, chunk_size=2000):
+    """Async version of exam_entries; archive files are read in a worker thread."""
+    plan = await ArchivedPlan.objects.filter(exam=exam).afirst()
+    if plan is None:
+        async for entry in plan_entries(exam).aiterator(chunk_size=chunk_size):
+            yield entry
+        return
+
+    entries = iter_archived_entries(plan)
+    read_chunk = sync_to_async(lambda: list(islice(entries, chunk_size)), thread_sensitive=False)
+    while chunk := await read_chunk():
+        for entry in chunk:
+            yield entry
+
+
+def entry_row(exam, entry):
+    """One export row for the snapshot `entry`, keyed by EXPORT_COLUMNS."""
+    row = {'Exam Name': exam.name, 'Exam Date': exam.date}
+    for column, field in ENTRY_FIELDS.items():
+        row[column] = entry[field]
+    return row
+
+
+def assignment_rows(exam, entries=None):
+    """Every export row of the exam, or of the given entries (e.g. a preview's)."""
+    with metrics.stage('export', 'query'):
+        rows = [entry_row(exam, entry) for entry in (exam_entries(exam) if entries is None else entries)]
+    metrics.ROWS.inc('export', amount=len(rows))
+    return rows
+
+
+def write_workbook(rows, fh):
+    """Writes the rows to `fh` as an Excel workbook with one sheet per room, sorted by seat."""
+    # Only workbook exports need pandas (and openpyxl), so they load it.
+    import pandas as pd
+
+    with metrics.stage('export', 'render'):
+        df = pd.DataFrame(rows, columns=EXPORT_COLUMNS)
+
+        # This logic creates a separate, sorted sheet for each room
+        writer = pd.ExcelWriter(fh, engine='openpyxl')
+        room_names = sorted(df['Room Name'].unique())
+        for room_name in room_names:
+            room_df = df[df['Room Name'] == room_name].copy()
+            room_df.sort_values(by='Seat Number', inplace=True)
+            room_df.to_excel(writer, index=False, sheet_name=room_name)
+
+    with metrics.stage('export', 'write'):
+        writer.close()
+
+
+def render_workbook(rows):
+    """The rows as the bytes of an Excel workbook."""
+    buffer = io.BytesIO()
+    write_workbook(rows, buffer)
+    return buffer.getvalue()
+
+
+class _Echo:
+    """A file-like object that hands back whatever is written to it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_header():
+    """The encoded CSV header line."""
+    return csv.writer(_Echo()).writerow(EXPORT_COLUMNS).encode()
+
+
+def csv_line(row):
+    """One export row as an encoded CSV line."""
+    return csv.writer(_Echo()).writerow([row[col] for col in EXPORT_COLUMNS]).encode()
+
+
+def write_csv(rows, fh):
+    """Writes the rows to the binary file `fh` as CSV."""
+    fh.write(csv_header())
+    for row in rows:
+        fh.write(csv_line(row))
+
+
+def write_pdf(rows, fh):
+    """
+    Writes a printable seating chart to `fh`: one page per room listing
+    its seats in order. Needs the optional reportlab package.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Table, TableStyle
+
+    styles = getSampleStyleSheet()
+    by_room = {}
+    for row in rows:
+        by_room.setdefault((row['Building'], row['Room Name']), []).append(row)
+
+    story = []
+    for (building, room_name), room_rows in sorted(by_room.items()):
+        if story:
+            story.append(PageBreak())
+        first = room_rows[0]
+        story.append(Paragraph(f"{first['Exam Name']} ({first['Exam Date']})", styles['Title']))
+        story.append(Paragraph(f"{room_name}, {building}: {len(room_rows)} students", styles['Heading2']))
+
+        table = Table(
+            [['Seat Number', 'Roll No', 'Student Name', 'Section']] + [
+                [r['Seat Number'], r['Roll No'], r['Student Name'], r['Section']]
+                for r in sorted(room_rows, key=lambda r: r['Seat Number'])
+            ],
+            repeatRows=1,
+        )
+        table.setStyle(TableStyle([
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ]))
+        story.append(table)
+
+    SimpleDocTemplate(fh, pagesize=A4).build(story)
+
+
+def iter_csv(exam, entries=None):
+    """
+    Streams the exam's export (or that of the given entries) as CSV lines
+    without loading every row first.
+    """
+    yield csv_header()
+    for entry in exam_entries(exam) if entries is None else entries:
+        yield csv_line(entry_row(exam, entry))
@@ -0,0 +1,167 @@
+import numpy as np
+from django.core.cache import cache
+
+from .models import Seat
+
+# Room details cached with its layout.
+ROOM_FIELDS = ('name', 'building', 'entrance_row', 'entrance_col', 'aisles')
+
+# Row/column offsets of the eight neighbours of a seat: the four orthogonal ones first, then the diagonals.
+NEIGHBOR_OFFSETS = ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+ORTHOGONAL = 4
+
+GRID_CACHE_TIMEOUT = 60 * 60
+
+
+def _cache_key(room_id):
+    # v2: layouts carry the room's details as well.
+    return f"seat-grid:v2:{room_id}"
+
+
+def invalidate_seat_grid(room_id):
+    """Drops the cached layout of a room. Call this whenever its seats change."""
+    cache.delete(_cache_key(room_id))
+
+
+def _room_layout(room, rows):
+    """
+    Packs one room's seats, given as (id, row, col, label) tuples sorted by
+    row and column, into the arrays that are cached for the room, along with
+    the room's name, building, entrance and aisles.
+    """
+    seat_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    row_nums = np.fromiter((r[1] for r in rows), dtype=np.int32, count=len(rows))
+    col_nums = np.fromiter((r[2] for r in rows), dtype=np.int32, count=len(rows))
+    labels = np.array([r[3] for r in rows], dtype=str)
+
+    # A dense (rows + 2) x (cols + 2) lookup of seat indexes with a border of -1,
+    # so the neighbours of every seat can be gathered without bounds checks.
+    neighbors = np.full((len(rows), len(NEIGHBOR_OFFSETS)), -1, dtype=np.int32)
+    if len(rows):
+        lookup = np.full((row_nums.max() + 2, col_nums.max() + 2), -1, dtype=np.int32)
+        lookup[row_nums, col_nums] = np.arange(len(rows), dtype=np.int32)
+        for k, (dr, dc) in enumerate(NEIGHBOR_OFFSETS):
+            neighbors[:, k] = lookup[row_nums + dr, col_nums + dc]
+
+    return {
+        **room,
+        'seat_ids': seat_ids,
+        'rows': row_nums,
+        'cols': col_nums,
+        'labels': labels,
+        'neighbors': neighbors,
+    }
+
+
+class SeatGrid:
+    """
+    The seats of one or more rooms as parallel NumPy arrays, ordered by room
+    name, row and column (the order seats are filled in).
+
+    `seat_ids`, `room_ids`, `rows`, `cols` and `labels` describe seat i at
+    index i, `neighbors[i]` holds the indexes of its neighbours in
+    NEIGHBOR_OFFSETS order (-1 where there is no seat) and `occupied` is the
+    occupancy bitmap of the grid. `rooms` maps each room id to its
+    ROOM_FIELDS.
+    """
+
+    def __init__(self, layouts, room_ids):
+        self.room_slices = {}
+        start = 0
+        for room_id, layout in zip(room_ids, layouts):
+            self.room_slices[room_id] = slice(start, start + len(layout['seat_ids']))
+            start += len(layout['seat_ids'])
+
+        self.rooms = {room_id: {f: layout[f] for f in ROOM_FIELDS} for room_id, layout in zip(room_ids, layouts)}
+        self.room_names = {room_id: room['name'] for room_id, room in self.rooms.items()}
+        self.seat_ids = np.concatenate([l['seat_ids'] for l in layouts] or [np.empty(0, np.int64)])
+        self.rows = np.concatenate([l['rows'] for l in layouts] or [np.empty(0, np.int32)])
+        self.cols = np.concatenate([l['cols'] for l in layouts] or [np.empty(0, np.int32)])
+        self.labels = np.concatenate([l['labels'] for l in layouts] or [np.empty(0, str)])
+        self.room_ids = np.repeat(
+            np.array(room_ids, dtype=np.int64),
+            [len(l['seat_ids']) for l in layouts],
+        )
+
+        # Neighbour indexes are local to each room, so shift them by the room's offset.
+        neighbors = [l['neighbors'] for l in layouts] or [np.empty((0, len(NEIGHBOR_OFFSETS)), np.int32)]
+        self.neighbors = np.concatenate(neighbors)
+        for room_id in room_ids:
+            block = self.neighbors[self.room_slices[room_id]]
+            block[block >= 0] += self.room_slices[room_id].start
+
+        self.occupied = np.zeros(len(self.seat_ids), dtype=bool)
+
+    @classmethod
+    def for_rooms(cls, room_ids):
+        """
+        Builds the grid for the given rooms. Layouts come from the cache;
+        rooms that are not cached are loaded with a single values_list query.
+        The cache is dropped whenever a room or its seats are saved.
+        """
+        room_ids = list(dict.fromkeys(int(r) for r in room_ids))
+        cached = cache.get_many([_cache_key(r) for r in room_ids])
+        layouts = {r: cached[_cache_key(r)] for r in room_ids if _cache_key(r) in cached}
+
+        missing = [r for r in room_ids if r not in layouts]
+        if missing:
+            per_room = {r: [] for r in missing}
+            rooms = {}
+            seats = Seat.objects.filter(room_id__in=missing).order_by('room_id', 'row_num', 'col_num').values_list(
+                'room_id', *(f'room__{f}' for f in ROOM_FIELDS), 'id', 'row_num', 'col_num', 'seat_number'
+            )
+            for room_id, *rest in seats:
+                rooms[room_id] = rest[:len(ROOM_FIELDS)]
+                per_room[room_id].append(tuple(rest[len(ROOM_FIELDS):]))
+            # Rooms without any seats are not cached so they are picked up once a template is parsed.
+            for room_id, rows in per_room.items():
+                room = dict(zip(ROOM_FIELDS, rooms.get(room_id, ('', '', None, None, None))))
+                layouts[room_id] = _room_layout(room, rows)
+            cache.set_many(
+                {_cache_key(r): layouts[r] for r in missing if per_room[r]},
+                GRID_CACHE_TIMEOUT,
+            )
+
+        ordered = sorted((r for r in room_ids if len(layouts[r]['seat_ids'])), key=lambda r: layouts[r]['name'])
+        return cls([layouts[r] for r in ordered], ordered)
+
+    def __len__(self):
+        return len(self.seat_ids)
+
+    @property
+    def nbytes(self):
+        """Memory held by the grid's arrays."""
+        return sum(a.nbytes for a in (
+            self.seat_ids, self.room_ids, self.rows, self.cols, self.labels, self.neighbors, self.occupied
+        ))
+
+    def neighbors_of(self, index, diagonal=True):
+        """Indexes of the seats next to seat `index`."""
+        row = self.neighbors[index] if diagonal else self.neighbors[index, :ORTHOGONAL]
+        return row[row >= 0]
+
+    def adjacent_pairs(self, diagonal=True):
+        """
+        Every pair of neighbouring seats once, as two index arrays (a, b) with a < b.
+        """
+        neighbors = self.neighbors if diagonal else self.neighbors[:, :ORTHOGONAL]
+        a = np.repeat(np.arange(len(self), dtype=np.int32), neighbors.shape[1])
+        b = neighbors.ravel()
+        keep = b > a
+        return a[keep], b[keep]
+
+    def occupy(self, indexes):
+        """Marks the seats at the given indexes as taken."""
+        self.occupied[indexes] = True
+
+    def free_indexes(self):
+        """Indexes of the seats that are still free, in fill order."""
+        return np.flatnonzero(~self.occupied)
+
+    def occupancy_map(self, room_id):
+        """The room's occupancy as a dense max_rows x max_columns boolean array."""
+        part = self.room_slices[room_id]
+        rows, cols = self.rows[part], self.cols[part]
+        dense = np.zeros((rows.max(), cols.max()), dtype=bool)
+        dense[rows - 1, cols - 1] = self.occupied[part]
+        return dense
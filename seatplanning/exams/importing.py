@@ -0,0 +1,444 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import metrics
+from .uploads import cached_parse
+from .models import Faculty, Year, Class, Section, Student, ImportRun
+from .progress import NO_PROGRESS
+
+# Basic validation to ensure a sheet has student data
+REQUIRED_COLUMNS = ['University ID', 'Student Name', 'Group', 'Course']
+
+# Longest values the Student, Class and Faculty columns accept.
+MAX_LENGTHS = {'University ID': 20, 'Student Name': 100, 'Group': 100, 'Course': 100}
+ROLL_NO_PATTERN = r'^[A-Za-z0-9][A-Za-z0-9/_-]*$'
+
+# The report lists at most this many problems of each severity; the counts cover all of them.
+MAX_REPORTED_ISSUES = 1000
+
+# Version of _read_student_workbook's output in the upload cache; bump it when the output changes.
+STUDENT_PARSER_VERSION = 1
+
+
+class WorkbookReport:
+    """
+    The outcome of reading and checking a student workbook: the sheets that
+    can be imported, the sheets that were skipped and why, and row-level
+    errors (which block the import) and warnings (which don't).
+    """
+
+    def __init__(self):
+        self.sheets = []
+        self.sheet_names = []
+        self.sheet_count = 0
+        self.skipped_sheets = []
+        self.errors = []
+        self.warnings = []
+        self.error_count = 0
+        self.warning_count = 0
+        self.row_count = 0
+        self.existing_count = 0
+        # SHA-256 of the workbook, and whether its rows came from the upload cache.
+        self.digest = None
+        self.cached = False
+
+    @property
+    def is_valid(self):
+        return self.error_count == 0
+
+    def add(self, severity, sheet, row, column, code, message, value=None):
+        issues = self.errors if severity == 'error' else self.warnings
+        if severity == 'error':
+            self.error_count += 1
+        else:
+            self.warning_count += 1
+        if len(issues) < MAX_REPORTED_ISSUES:
+            issues.append({
+                'sheet': sheet, 'row': row, 'column': column,
+                'code': code, 'message': message, 'value': value,
+            })
+
+    def as_dict(self):
+        return {
+            'valid': self.is_valid,
+            'summary': {
+                'sheets': self.sheet_count,
+                'student_sheets': len(self.sheets),
+                'rows': self.row_count,
+                'existing_students': self.existing_count,
+                'new_students': self.row_count - self.existing_count if self.is_valid else None,
+                'errors': self.error_count,
+                'warnings': self.warning_count,
+            },
+            'upload': {'sha256': self.digest, 'cached': self.cached},
+            'skipped_sheets': self.skipped_sheets,
+            'errors': self.errors,
+            'warnings': self.warnings,
+        }
+
+
+def validate_student_workbook(file, progress=NO_PROGRESS):
+    """
+    Reads a student workbook and checks every sheet before anything is
+    written: skipped sheets, missing values, malformed or over-long values,
+    University IDs repeated within or across sheets, students that already
+    exist and courses that have no faculty yet. The checks run as vectorised
+    pandas operations over all sheets at once and only read the database.
+    Returns a WorkbookReport.
+    """
+    report, frame = parse_student_workbook(file, progress)
+    check_student_rows(report, frame, progress)
+    return report
+
+
+def parse_student_workbook(file, progress=NO_PROGRESS):
+    """
+    The CPU-bound half of validate_student_workbook, which does not touch the
+    database. Returns the report so far and a DataFrame of every row. A
+    workbook that was uploaded before is not read again: its rows come from
+    the upload cache (see exams.uploads).
+    """
+    with metrics.stage('import', 'parse'):
+        digest, frame, meta, cached = cached_parse(
+            file, 'students', lambda path: _read_student_workbook(path, progress), STUDENT_PARSER_VERSION
+        )
+        report = WorkbookReport()
+        report.digest, report.cached = digest, cached
+        report.sheet_count = meta['sheet_count']
+        report.skipped_sheets = meta['skipped_sheets']
+        report.row_count = len(frame)
+        for (sheet_name, year_value), rows in frame.groupby(['_sheet', '_year'], sort=False):
+            clean = rows[REQUIRED_COLUMNS].astype(object).where(rows[REQUIRED_COLUMNS].notna(), None)
+            report.sheets.append((int(year_value), clean.to_dict('records')))
+            report.sheet_names.append(sheet_name)
+        return report, frame
+
+
+def check_student_rows(report, frame, progress=NO_PROGRESS):
+    """The row checks of validate_student_workbook, added to the report."""
+    with metrics.stage('import', 'validate'):
+        progress.stage('validate', total=len(frame))
+        _validate_rows(report, frame)
+        progress.advance(len(frame))
+
+
+def _normalize_ids(ids):
+    """University IDs as strings. Numeric cells read as 2.0231e+06 or 2023101.0 become "2023101"."""
+    import pandas as pd
+    numeric = pd.to_numeric(ids, errors='coerce')
+    integral = numeric.notna() & (numeric % 1 == 0)
+    normalized = ids.astype('string').str.strip()
+    normalized[integral] = numeric[integral].astype('int64').astype('string')
+    return normalized
+
+
+def _read_student_workbook(file, progress):
+    """
+    Returns a DataFrame of the rows of every importable sheet, and the
+    workbook's sheet count and skipped sheets.
+    """
+    # pandas is imported where workbooks are read, so that importing this
+    # module (as the views do) doesn't load it in every process.
+    import pandas as pd
+
+    # Use pandas ExcelFile to get access to all sheets
+    xls = pd.ExcelFile(file)
+    skipped_sheets = []
+    frames = []
+    progress.stage('parse', total=len(xls.sheet_names))
+
+    for sheet_name in xls.sheet_names:
+        progress.advance()
+
+        # Determine the Year for all students in this sheet from the sheet's name
+        try:
+            # Extracts the number from a sheet name like "Year 1", "Year 2", etc.
+            year_value = int(sheet_name.split(' ')[-1])
+        except (ValueError, IndexError):
+            # If the sheet name is not in the format "Year X", we can't process it.
+            skipped_sheets.append({'sheet': sheet_name, 'reason': 'The sheet name is not in the format "Year N".'})
+            continue
+
+        df = pd.read_excel(xls, sheet_name=sheet_name, dtype=object)
+        df.columns = df.columns.astype(str).str.strip()
+
+        missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+        if missing:
+            # If a sheet doesn't have these columns, skip it (e.g., an info sheet)
+            skipped_sheets.append({'sheet': sheet_name, 'reason': f"Missing columns: {', '.join(missing)}."})
+            continue
+
+        df = df[REQUIRED_COLUMNS].copy()
+        df['University ID'] = _normalize_ids(df['University ID'])
+        for col in REQUIRED_COLUMNS[1:]:
+            df[col] = df[col].astype('string').str.strip()
+        df = df.replace('', pd.NA)
+        # Drop fully blank rows, which Excel leaves behind after deletions.
+        df = df.dropna(how='all')
+        # Row numbers as shown in Excel: the header is row 1.
+        df['_row'] = df.index + 2
+        df['_sheet'] = sheet_name
+        df['_year'] = year_value
+        frames.append(df)
+
+    frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        columns=REQUIRED_COLUMNS + ['_row', '_sheet', '_year']
+    )
+    return frame, {'sheet_count': len(xls.sheet_names), 'skipped_sheets': skipped_sheets}
+
+
+def _report_rows(report, frame, mask, severity, column, code, message):
+    """Adds one issue per row selected by the boolean mask."""
+    import pandas as pd
+    for sheet, row, value in frame.loc[mask, ['_sheet', '_row', column]].itertuples(index=False):
+        report.add(severity, sheet, int(row), column, code, message, None if pd.isna(value) else str(value))
+
+
+def _validate_rows(report, frame):
+    if frame.empty:
+        if not report.sheets:
+            report.add('error', None, None, None, 'no_students', "No sheet named \"Year N\" with the required columns was found.")
+        return
+
+    for col in REQUIRED_COLUMNS:
+        _report_rows(report, frame, frame[col].isna(), 'error', col, 'missing', f"{col} is empty.")
+        too_long = frame[col].str.len() > MAX_LENGTHS[col]
+        _report_rows(report, frame, too_long.fillna(False), 'error', col, 'too_long',
+                     f"{col} is longer than {MAX_LENGTHS[col]} characters.")
+
+    ids = frame['University ID']
+    malformed = ids.notna() & ~ids.str.match(ROLL_NO_PATTERN).fillna(False)
+    _report_rows(report, frame, malformed, 'error', 'University ID', 'malformed_id',
+                 "University ID may only contain letters, digits, '/', '_' and '-'.")
+
+    # Every repeat of an ID points back at its first occurrence, in any sheet.
+    duplicated = ids.notna() & ids.duplicated(keep='first')
+    if duplicated.any():
+        first = frame[ids.notna()].drop_duplicates('University ID').set_index('University ID')[['_sheet', '_row']]
+        for sheet, row, roll_no in frame.loc[duplicated, ['_sheet', '_row', 'University ID']].itertuples(index=False):
+            first_sheet, first_row = first.loc[roll_no]
+            report.add('error', sheet, int(row), 'University ID', 'duplicate_id',
+                       f"University ID also appears in {first_sheet} row {int(first_row)}.", roll_no)
+
+    # Read-only lookups: students that exist already are skipped by the import,
+    # courses without a faculty get one created.
+    existing = _existing_roll_nos(ids.dropna().unique().tolist())
+    is_existing = ids.isin(existing) & ~duplicated
+    report.existing_count = int(is_existing.sum())
+    _report_rows(report, frame, is_existing, 'warning', 'University ID', 'existing_student',
+                 "A student with this University ID already exists and will be skipped.")
+
+    courses = frame['Course']
+    known = set(Faculty.objects.filter(name__in=courses.dropna().unique().tolist()).values_list('name', flat=True))
+    unknown = courses.notna() & ~courses.isin(known)
+    _report_rows(report, frame, unknown & ~courses.duplicated(), 'warning', 'Course', 'unknown_course',
+                 "No faculty with this name exists yet; the import will create it.")
+
+
+# Roll numbers are looked up this many at a time, below SQLite's limit on query parameters.
+LOOKUP_BATCH_SIZE = 900
+
+
+def _existing_roll_nos(roll_nos):
+    """The roll numbers among `roll_nos` that already belong to a student."""
+    existing = set()
+    for start in range(0, len(roll_nos), LOOKUP_BATCH_SIZE):
+        batch = roll_nos[start:start + LOOKUP_BATCH_SIZE]
+        existing.update(Student.objects.filter(roll_no__in=batch).values_list('roll_no', flat=True))
+    return existing
+
+
+# Students are inserted in batches of this size, reporting progress after each.
+INSERT_BATCH_SIZE = 2000
+
+
+@transaction.atomic
+def import_student_sheets(sheets, progress=NO_PROGRESS):
+    """
+    Creates the students of sheets checked by validate_student_workbook, along with
+    any missing Year, Faculty, Class and Section rows. Students whose roll
+    number already exists (or appeared earlier in the workbook) are skipped.
+    Returns the number of students created.
+    """
+    students_to_create = []
+    seen_roll_nos = set()
+
+    with metrics.stage('import', 'resolve_fks'):
+        progress.stage('resolve', total=sum(len(rows) for _, rows in sheets))
+        for year_value, rows in sheets:
+            _resolve_sheet(year_value, rows, students_to_create, seen_roll_nos, progress)
+
+    with metrics.stage('import', 'insert'):
+        progress.stage('insert', total=len(students_to_create))
+        for start in range(0, len(students_to_create), INSERT_BATCH_SIZE):
+            batch = students_to_create[start:start + INSERT_BATCH_SIZE]
+            Student.objects.bulk_create(batch)
+            progress.advance(len(batch))
+
+    metrics.ROWS.inc('import', amount=len(students_to_create))
+    return len(students_to_create)
+
+
+# --- Chunked imports ---
+
+# Rows per transaction of a chunked import, by default and at most.
+IMPORT_CHUNK_SIZE = 1000
+MAX_IMPORT_CHUNK_SIZE = 20000
+
+# A run still marked running after this long without a commit is taken to
+# have died with its process, and can be resumed.
+STALE_RUN_AFTER = timedelta(minutes=10)
+
+
+class ImportRunError(Exception):
+    """Raised when a chunked import cannot be started or resumed, or stops at a chunk that failed."""
+
+    def __init__(self, message, run=None):
+        self.run = run
+        super().__init__(message)
+
+
+class ImportRunBusy(ImportRunError):
+    """Raised when the run to resume is still running or has completed."""
+
+
+def start_import_run(report, chunk_size=IMPORT_CHUNK_SIZE):
+    """Records a new chunked import of the checked workbook."""
+    return ImportRun.objects.create(
+        digest=report.digest, chunk_size=chunk_size, total_rows=sum(len(rows) for _, rows in report.sheets),
+        sheet_name=report.sheet_names[0] if report.sheet_names else '',
+    )
+
+
+@transaction.atomic
+def claim_import_run(run_id, report):
+    """
+    Marks a failed (or stale) run as running again so it can be resumed with
+    the checked workbook. Raises ImportRun.DoesNotExist, ImportRunBusy if it
+    is running or done, and ImportRunError if the workbook is another one.
+    """
+    run = ImportRun.objects.select_for_update().get(pk=run_id)
+    if run.digest != report.digest:
+        raise ImportRunError(f"Import run {run.pk} was started with another workbook. Upload the same file to resume it.", run)
+    if run.status == ImportRun.COMPLETED:
+        raise ImportRunBusy(f"Import run {run.pk} has already completed.", run)
+    if run.status == ImportRun.RUNNING and run.updated_at > timezone.now() - STALE_RUN_AFTER:
+        raise ImportRunBusy(f"Import run {run.pk} is still running.", run)
+    run.status = ImportRun.RUNNING
+    run.error = ''
+    run.save(update_fields=['status', 'error', 'updated_at'])
+    return run
+
+
+def import_student_sheets_chunked(run, report, progress=NO_PROGRESS):
+    """
+    Imports the sheets of a checked workbook like import_student_sheets, but commits every
+    run.chunk_size rows in a transaction of their own, together with the
+    run's checkpoint, so other writers are only held up for one chunk and a
+    failure keeps every chunk before it. Starts from the run's checkpoint;
+    students that already exist are skipped, so resuming never creates
+    duplicates. Returns the number of students this call created.
+
+    Raises ImportRunError (with the run) when a chunk fails, after marking
+    the run failed.
+    """
+    created = 0
+    progress.stage('insert', total=run.total_rows - run.rows_done)
+    for sheet_index in range(run.sheet_index, len(report.sheets)):
+        year_value, rows = report.sheets[sheet_index]
+        sheet_name = report.sheet_names[sheet_index]
+        start = run.row_offset if sheet_index == run.sheet_index else 0
+        for offset in range(start, len(rows), run.chunk_size):
+            try:
+                created += _import_chunk(run, sheet_index, sheet_name, offset, year_value, rows, progress)
+            except Exception as e:
+                run.status, run.error = ImportRun.FAILED, str(e)
+                run.save(update_fields=['status', 'error', 'updated_at'])
+                raise ImportRunError(
+                    f"The import stopped in sheet '{sheet_name}': {str(e).rstrip('.')}. {run.rows_done} of {run.total_rows} rows "
+                    f"were imported; resume import run {run.pk} to import the rest.", run
+                ) from e
+
+    run.status, run.finished_at = ImportRun.COMPLETED, timezone.now()
+    run.save(update_fields=['status', 'finished_at', 'updated_at'])
+    return created
+
+
+def _import_chunk(run, sheet_index, sheet_name, offset, year_value, rows, progress):
+    """Imports rows[offset:offset + run.chunk_size] of a sheet and moves the run's checkpoint past them."""
+    chunk = rows[offset:offset + run.chunk_size]
+    students = []
+    with metrics.stage('import', 'insert'), transaction.atomic():
+        # Rows of earlier chunks are in the database by now, which is how they are skipped.
+        _resolve_sheet(year_value, chunk, students, set(), progress)
+        Student.objects.bulk_create(students)
+        checkpoint = {
+            'sheet_index': sheet_index, 'sheet_name': sheet_name, 'row_offset': offset + len(chunk),
+            'rows_done': run.rows_done + len(chunk), 'created_count': run.created_count + len(students),
+        }
+        ImportRun.objects.filter(pk=run.pk).update(updated_at=timezone.now(), **checkpoint)
+    # Only moved once the chunk is committed.
+    for field, value in checkpoint.items():
+        setattr(run, field, value)
+    metrics.ROWS.inc('import', amount=len(students))
+    return len(students)
+
+
+def _resolve_sheet(year_value, rows, students_to_create, seen_roll_nos, progress=NO_PROGRESS):
+    """
+    Builds the unsaved Student rows of one sheet, creating their related rows
+    as needed. The existing roll numbers are fetched in one pass and each
+    faculty, class and section is looked up once per sheet, so the queries
+    grow with the number of groups rather than of rows.
+    """
+    year_obj, _ = Year.objects.get_or_create(year_value=year_value)
+    existing = _existing_roll_nos(list({str(row['University ID']) for row in rows}))
+    faculties, classes, sections = {}, {}, {}
+
+    for row in rows:
+        progress.advance()
+        roll_no = str(row['University ID'])
+
+        if roll_no in seen_roll_nos or roll_no in existing:
+            continue
+        seen_roll_nos.add(roll_no)
+
+        # Look up or create the foreign key objects
+        faculty_obj = faculties.get(row['Course'])
+        if faculty_obj is None:
+            faculty_obj, _ = Faculty.objects.get_or_create(name=row['Course'])
+            faculties[row['Course']] = faculty_obj
+
+        # A Class is unique by its name, faculty, AND year. All must be in the main query.
+        class_key = (row['Group'], faculty_obj.pk)
+        class_obj = classes.get(class_key)
+        if class_obj is None:
+            class_obj, _ = Class.objects.get_or_create(
+                name=row['Group'],
+                faculty=faculty_obj,
+                year=year_obj
+            )
+            classes[class_key] = class_obj
+
+        section_obj = sections.get(class_obj.pk)
+        if section_obj is None:
+            section_obj, _ = Section.objects.get_or_create(
+                name='A', # Using 'A' as a default section
+                class_name=class_obj,
+                faculty=faculty_obj,
+                year=year_obj
+            )
+            sections[class_obj.pk] = section_obj
+
+        students_to_create.append(
+            Student(
+                name=row['Student Name'],
+                roll_no=roll_no,
+                faculty=faculty_obj,
+                year=year_obj,
+                class_name=class_obj,
+                section=section_obj
+            )
+        )
@@ -0,0 +1,224 @@
+"""
+A compact JSON (or MessagePack) room layout format, as an alternative to
+Excel templates. A single room looks like:
+
+    {
+        "format": "seat-layout/1",
+        "name": "Fewa",
+        "building": "Nepal Block",
+        "entrance": [1, 8],
+        "aisles": [4],
+        "seats": [["A-01", 1, 1], ["A-02", 1, 2], ...]
+    }
+
+Seats are [seat number, row, column] with 1-based rows and columns, and the
+entrance is the [row, column] of the door. A file with several rooms holds
+them in a "rooms" list. The per-sheet JSON written by the old
+ExcelTesting.readExcel script (seats keyed by number with 0-based x/y) is
+accepted as well.
+"""
+import json
+
+from .grid import invalidate_seat_grid
+from .models import Seat
+from .seatmaps import bump_room_plans
+
+LAYOUT_FORMAT = 'seat-layout/1'
+LAYOUT_EXTENSIONS = ('.json', '.msgpack')
+
+
+class LayoutError(ValueError):
+    """Raised when a layout file cannot be read or is malformed."""
+
+
+def is_layout_file(name):
+    """True if the file name has a JSON/MessagePack layout extension."""
+    return str(name).lower().endswith(LAYOUT_EXTENSIONS)
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise LayoutError("MessagePack layouts need the msgpack package (pip install msgpack).")
+    return msgpack
+
+
+def decode(data, fmt='json'):
+    """Parses raw layout bytes in the given format ('json' or 'msgpack')."""
+    try:
+        if fmt == 'msgpack':
+            return _msgpack().unpackb(data, raw=False)
+        return json.loads(data)
+    except LayoutError:
+        raise
+    except Exception as e:
+        raise LayoutError(f"Could not read the {fmt} layout: {e}")
+
+
+def encode(layout, fmt='json'):
+    """Serialises a layout dict to bytes in the given format."""
+    if fmt == 'msgpack':
+        return _msgpack().packb(layout, use_bin_type=True)
+    return json.dumps(layout, separators=(',', ':')).encode()
+
+
+def format_for(name):
+    """The layout format implied by a file name."""
+    return 'msgpack' if str(name).lower().endswith('.msgpack') else 'json'
+
+
+def _as_int(value, what):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise LayoutError(f"{what} must be an integer, got {value!r}.")
+    if number < 1:
+        raise LayoutError(f"{what} must be 1 or more, got {number}.")
+    return number
+
+
+def _coordinate(value, offset, what):
+    """A 1-based coordinate from a value that is `offset` below it (1 for legacy 0-based files)."""
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise LayoutError(f"{what} must be an integer, got {value!r}.")
+    try:
+        value = int(value)
+    except ValueError:
+        raise LayoutError(f"{what} must be an integer, got {value!r}.")
+    return _as_int(value + offset, what)
+
+
+def normalize_room(data, name=None):
+    """
+    Validates one room's layout and returns it in the canonical form:
+    a dict with name, building, entrance ([row, col] or None), aisles and
+    seats as a list of (seat number, row, col) tuples.
+    """
+    if not isinstance(data, dict):
+        raise LayoutError("A room layout must be an object.")
+
+    raw_seats = data.get('seats')
+    seats = []
+    if isinstance(raw_seats, dict):
+        # Legacy ExcelTesting output: {"A-01": {"x": row, "y": col}} with 0-based coordinates.
+        offset = 1
+        for label, pos in raw_seats.items():
+            if not isinstance(pos, dict):
+                raise LayoutError(f"Seat {label!r} must have x and y coordinates.")
+            seats.append((
+                str(label).strip(),
+                _coordinate(pos.get('x'), offset, f"Row of seat {label!r}"),
+                _coordinate(pos.get('y'), offset, f"Column of seat {label!r}"),
+            ))
+    elif isinstance(raw_seats, list):
+        offset = 0
+        for seat in raw_seats:
+            if not isinstance(seat, (list, tuple)) or len(seat) != 3:
+                raise LayoutError(f"Seats must be [seat number, row, column], got {seat!r}.")
+            label = str(seat[0]).strip()
+            seats.append((
+                label,
+                _coordinate(seat[1], offset, f"Row of seat {label!r}"),
+                _coordinate(seat[2], offset, f"Column of seat {label!r}"),
+            ))
+    else:
+        raise LayoutError("A room layout needs a list of seats.")
+
+    labels = [s[0] for s in seats]
+    if len(set(labels)) != len(labels):
+        raise LayoutError("Seat numbers must be unique within a room.")
+    if len({(s[1], s[2]) for s in seats}) != len(seats):
+        raise LayoutError("Two seats cannot share the same row and column.")
+
+    entrance = data.get('entrance') or None
+    if entrance is not None:
+        if not isinstance(entrance, (list, tuple)) or len(entrance) != 2:
+            raise LayoutError("The entrance must be [row, column].")
+        entrance = [
+            _coordinate(entrance[0], offset, "Entrance row"),
+            _coordinate(entrance[1], offset, "Entrance column"),
+        ]
+
+    aisles = sorted({_coordinate(col, 0, "Aisle column") for col in data.get('aisles') or []})
+
+    return {
+        'name': str(data.get('name') or name or '').strip(),
+        'building': str(data.get('building') or '').strip(),
+        'entrance': entrance,
+        'aisles': aisles,
+        'seats': seats,
+    }
+
+
+def normalize_rooms(data):
+    """
+    Returns every room of a layout document (single room, {"rooms": [...]}
+    or the legacy {sheet name: room} mapping) in canonical form.
+    """
+    if isinstance(data, dict) and isinstance(data.get('rooms'), list):
+        return [normalize_room(room) for room in data['rooms']]
+    if isinstance(data, dict) and 'seats' in data:
+        return [normalize_room(data)]
+    if isinstance(data, dict):
+        return [normalize_room(room, name=name) for name, room in data.items()]
+    raise LayoutError("A layout file must be an object.")
+
+
+def read_layout_file(path_or_file, name=None):
+    """Reads every room of a JSON/MessagePack layout file."""
+    fmt = format_for(name or getattr(path_or_file, 'name', path_or_file))
+    if hasattr(path_or_file, 'read'):
+        data = path_or_file.read()
+    else:
+        with open(path_or_file, 'rb') as fh:
+            data = fh.read()
+    return normalize_rooms(decode(data, fmt))
+
+
+def dump_room(room):
+    """The layout of a saved Room, in the compact single-room format."""
+    seats = room.seats.order_by('row_num', 'col_num').values_list('seat_number', 'row_num', 'col_num')
+    entrance = None
+    if room.entrance_row is not None and room.entrance_col is not None:
+        entrance = [room.entrance_row, room.entrance_col]
+    return {
+        'format': LAYOUT_FORMAT,
+        'name': room.name,
+        'building': room.building,
+        'entrance': entrance,
+        'aisles': room.aisles or [],
+        'seats': [list(seat) for seat in seats],
+    }
+
+
+def apply_layout(room, layout):
+    """
+    Replaces the room's seats with those of a canonical layout and updates
+    its capacity, grid size, entrance and aisles.
+    """
+    bump_room_plans(room.pk)
+    room.seats.all().delete()
+    invalidate_seat_grid(room.pk)
+
+    Seat.objects.bulk_create([
+        Seat(room=room, seat_number=label, row_num=row, col_num=col)
+        for label, row, col in layout['seats']
+    ])
+
+    entrance = layout['entrance'] or [None, None]
+    room.capacity = len(layout['seats'])
+    room.max_rows = max((s[1] for s in layout['seats']), default=0)
+    room.max_columns = max((s[2] for s in layout['seats']), default=0)
+    room.entrance_row, room.entrance_col = entrance
+    room.aisles = layout['aisles']
+    # Bypass save() so the template isn't parsed again.
+    type(room)._base_manager.filter(pk=room.pk).update(
+        capacity=room.capacity,
+        max_rows=room.max_rows,
+        max_columns=room.max_columns,
+        entrance_row=room.entrance_row,
+        entrance_col=room.entrance_col,
+        aisles=room.aisles,
+    )
+    invalidate_seat_grid(room.pk)
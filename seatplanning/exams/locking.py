@@ -0,0 +1,140 @@
+import hashlib
+import json
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import IntegrityError, OperationalError, transaction
+from django.utils import timezone
+
+from .models import GenerationLock, IdempotencyRecord
+
+# How long a generation waits for another one of the same exam to finish.
+LOCK_WAIT_SECONDS = 60
+# A lock older than this belongs to a worker that died mid-generation and is taken over.
+STALE_LOCK_SECONDS = 15 * 60
+POLL_SECONDS = 0.25
+
+# How long a duplicate request waits for the first one's response.
+IDEMPOTENCY_WAIT_SECONDS = 60
+# Stored responses are forgotten after this long (and pruned by archive_exams).
+IDEMPOTENCY_TTL = timedelta(hours=24)
+
+
+class ExamLocked(Exception):
+    """Raised when another generation of the same exam holds the lock for too long."""
+
+
+class IdempotencyConflict(Exception):
+    """Raised when an Idempotency-Key is reused for a different request."""
+
+
+def _try_acquire(exam_id, owner):
+    try:
+        with transaction.atomic():
+            GenerationLock.objects.create(exam_id=exam_id, owner=owner)
+        return True
+    except IntegrityError:
+        return False
+    except OperationalError as e:
+        # SQLite reports a concurrent writer as a locked database; treat it as contention.
+        if 'locked' not in str(e):
+            raise
+        return False
+
+
+@contextmanager
+def exam_lock(exam_id, wait=LOCK_WAIT_SECONDS):
+    """
+    Holds the generation lock of one exam for the duration of the block.
+    Waits up to `wait` seconds for a running generation of the same exam
+    and raises ExamLocked if it does not finish in time.
+    """
+    owner = uuid.uuid4().hex
+    deadline = time.monotonic() + wait
+    while not _try_acquire(exam_id, owner):
+        # Wait with plain reads: writing while the holder works would make
+        # SQLite fail the holder's own writes with "database is locked".
+        while True:
+            held = GenerationLock.objects.filter(exam_id=exam_id).values_list('acquired_at', flat=True).first()
+            if held is None:
+                break
+            if held < timezone.now() - timedelta(seconds=STALE_LOCK_SECONDS):
+                GenerationLock.objects.filter(exam_id=exam_id, acquired_at=held).delete()
+                break
+            if time.monotonic() >= deadline:
+                raise ExamLocked("Another seat plan is being generated for this exam. Try again shortly.")
+            time.sleep(POLL_SECONDS)
+    try:
+        yield
+    finally:
+        GenerationLock.objects.filter(exam_id=exam_id, owner=owner).delete()
+
+
+def request_hash(payload):
+    """A stable fingerprint of a request payload."""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def run_idempotent(key, exam_id, payload, handler, wait=IDEMPOTENCY_WAIT_SECONDS):
+    """
+    Runs `handler` once per Idempotency-Key. It must return (status_code, data).
+
+    The first request with a key runs the handler and stores its response;
+    duplicates wait for that response (up to `wait` seconds) and get it
+    back instead of running again. Returns (status_code, data, replayed).
+    Server errors are not stored, so the client can retry with the same key,
+    and neither is the run of a worker that died before it answered: its
+    record is taken over once it is STALE_LOCK_SECONDS old, like a stale lock.
+    """
+    fingerprint = request_hash(payload)
+
+    try:
+        with transaction.atomic():
+            record = IdempotencyRecord.objects.create(key=key, exam_id=exam_id, request_hash=fingerprint)
+    except IntegrityError:
+        record = None
+
+    if record is None:
+        deadline = time.monotonic() + wait
+        while True:
+            existing = IdempotencyRecord.objects.filter(key=key).first()
+            if existing is not None and _abandoned(existing):
+                IdempotencyRecord.objects.filter(pk=existing.pk, created_at=existing.created_at).delete()
+                existing = None
+            if existing is None:
+                # The first request failed and released the key: run this one instead.
+                return run_idempotent(key, exam_id, payload, handler, max(0, deadline - time.monotonic()))
+            if existing.exam_id != exam_id or existing.request_hash != fingerprint:
+                raise IdempotencyConflict("This Idempotency-Key was already used for a different request.")
+            if existing.status_code is not None:
+                return existing.status_code, existing.response, True
+            if time.monotonic() >= deadline:
+                raise ExamLocked("A request with this Idempotency-Key is still in progress.")
+            time.sleep(POLL_SECONDS)
+
+    try:
+        status_code, data = handler()
+    except BaseException:
+        record.delete()
+        raise
+    if status_code >= 500:
+        record.delete()
+    else:
+        IdempotencyRecord.objects.filter(pk=record.pk).update(status_code=status_code, response=data)
+    return status_code, data, False
+
+
+def _abandoned(record):
+    """Whether a record has expired, or is still running long after any generation would have finished."""
+    age = timezone.now() - record.created_at
+    if record.status_code is None:
+        return age > timedelta(seconds=STALE_LOCK_SECONDS)
+    return age > IDEMPOTENCY_TTL
+
+
+def prune_idempotency_records():
+    """Deletes the stored responses older than IDEMPOTENCY_TTL. Returns how many there were."""
+    deleted, _ = IdempotencyRecord.objects.filter(created_at__lt=timezone.now() - IDEMPOTENCY_TTL).delete()
+    return deleted
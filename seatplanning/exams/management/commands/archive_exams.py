@@ -0,0 +1,71 @@
+# exams/management/commands/archive_exams.py
+
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from exams.archiving import archivable_exams, archive_exam, compact
+from exams.locking import ExamLocked, prune_idempotency_records
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves the seat plans of exams held before a cutoff out of the database into compressed "
+        "per-exam archive files under MEDIA_ROOT. Exports keep working for archived exams."
+    )
+
+    def add_arguments(self, parser):
+        cutoff = parser.add_mutually_exclusive_group(required=True)
+        cutoff.add_argument('--before', help='Archive exams dated before this day (YYYY-MM-DD).')
+        cutoff.add_argument('--older-than', type=int, metavar='DAYS', help='Archive exams held more than DAYS days ago.')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the exams that would be archived.')
+        parser.add_argument('--compact', action='store_true', help=(
+            'Afterwards reclaim the space of the deleted rows (VACUUM on SQLite and PostgreSQL, '
+            'OPTIMIZE TABLE on MySQL). This can take a while and locks the tables on some backends.'
+        ))
+
+    def handle(self, *args, **options):
+        if options['before']:
+            try:
+                before = parse_date(options['before'])
+            except ValueError:
+                before = None
+            if before is None:
+                raise CommandError("--before must be a date in YYYY-MM-DD format.")
+        else:
+            before = timezone.localdate() - datetime.timedelta(days=options['older_than'])
+
+        if not options['dry_run']:
+            pruned = prune_idempotency_records()
+            if pruned:
+                self.stdout.write(f"Forgot {pruned} expired Idempotency-Key responses.")
+
+        exams = list(archivable_exams(before))
+        if not exams:
+            self.stdout.write(f"No exams before {before} have a seat plan to archive.")
+            return
+
+        archived = rows = 0
+        for exam in exams:
+            if options['dry_run']:
+                self.stdout.write(f"Would archive {exam}.")
+                continue
+            try:
+                plan = archive_exam(exam)
+            except ExamLocked as e:
+                self.stderr.write(f"Skipped {exam}: {e}")
+                continue
+            archived += 1
+            rows += plan.row_count
+            self.stdout.write(f"Archived {exam}: {plan.row_count} seats -> {plan.file.name}")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"{len(exams)} exam(s) would be archived."))
+            return
+
+        if options['compact'] and archived:
+            self.stdout.write("Compacting the database...")
+            compact()
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} exam(s) and {rows} seat assignments."))
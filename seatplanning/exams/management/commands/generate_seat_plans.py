@@ -0,0 +1,211 @@
+# exams/management/commands/generate_seat_plans.py
+
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from django.utils.dateparse import parse_date
+
+from exams.clashes import ExamIntervalIndex
+from exams.models import Exam
+
+EXPORT_FORMATS = ('xlsx', 'csv', 'pdf')
+
+# SQLite allows one writer at a time, so a worker that finds the database
+# locked waits and tries again instead of failing the exam.
+LOCKED_RETRIES = 5
+LOCKED_RETRY_DELAY = 2.0
+
+
+def _init_worker():
+    """Sets up Django in a pool process without reusing the parent's connections."""
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def _slug(value):
+    return re.sub(r'[^A-Za-z0-9]+', '_', str(value)).strip('_')
+
+
+def _plan_exam(exam, entry, output_dir, formats, allow_clashes):
+    """Generates and exports the plan of one exam. Returns a summary dict."""
+    from exams.allocation import generate_seat_plan
+    from exams import strategies
+    from exams import exporting
+    from exams.planner import plan_rooms, DEFAULT_SPARE_MARGIN
+
+    summary = {'exam_id': exam.id, 'exam': str(exam), 'files': []}
+    section_ids = entry.get('section_ids') or []
+    room_ids = entry.get('room_ids') or []
+    if not section_ids:
+        summary['error'] = "No section_ids in the config."
+        return summary
+
+    start = time.perf_counter()
+    if not room_ids:
+        # No rooms given: let the planner pick them.
+        plan = plan_rooms(section_ids, spare_margin=entry.get('spare_margin', DEFAULT_SPARE_MARGIN))
+        room_ids = plan['room_ids']
+        if not room_ids:
+            summary['error'] = f"Insufficient capacity for {plan['students']} students."
+            return summary
+
+    for attempt in range(LOCKED_RETRIES):
+        try:
+            # Exams already run in parallel, so a best-of search tries its candidates in this process.
+            result = generate_seat_plan(
+                exam, room_ids, section_ids, allow_clashes=allow_clashes,
+                strategy=entry.get('strategy', strategies.DEFAULT_STRATEGY),
+                candidates=entry.get('strategies'),
+                time_budget=entry.get('time_budget', strategies.DEFAULT_TIME_BUDGET),
+                workers=1,
+            )
+            break
+        except OperationalError as e:
+            if 'locked' not in str(e) or attempt == LOCKED_RETRIES - 1:
+                raise
+            time.sleep(LOCKED_RETRY_DELAY)
+    summary['assigned'] = result['assigned']
+    summary['generate_seconds'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rows = exporting.assignment_rows(exam)
+    base_name = os.path.join(output_dir, f"{exam.id}_{_slug(exam.name)}_{exam.date}")
+    writers = {'xlsx': exporting.write_workbook, 'csv': exporting.write_csv, 'pdf': exporting.write_pdf}
+    for fmt in formats:
+        path = f"{base_name}.{fmt}"
+        with open(path, 'wb') as fh:
+            writers[fmt](rows, fh)
+        summary['files'].append(path)
+    summary['export_seconds'] = time.perf_counter() - start
+    return summary
+
+
+def _run_group(exam_ids, config, output_dir, formats, allow_clashes):
+    """
+    Plans a group of exams one after another. Exams that overlap in time are
+    kept in one group so their clash checks see each other's plans.
+    """
+    from exams.allocation import SeatPlanError
+
+    summaries = []
+    for exam in Exam.objects.filter(id__in=exam_ids).order_by('date', 'start_time'):
+        try:
+            summaries.append(_plan_exam(exam, config[exam.id], output_dir, formats, allow_clashes))
+        except SeatPlanError as e:
+            summaries.append({'exam_id': exam.id, 'exam': str(exam), 'files': [], 'error': str(e)})
+        except Exception as e:
+            summaries.append({'exam_id': exam.id, 'exam': str(exam), 'files': [], 'error': f"Unexpected error: {e}"})
+    return summaries
+
+
+class Command(BaseCommand):
+    help = 'Generates and exports the seat plans of many exams, running independent exams in parallel.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--config', required=True, help=(
+            'JSON file mapping exam ids to their rooms and sections, e.g. '
+            '{"12": {"section_ids": [1, 2], "room_ids": [3, 4]}}. '
+            'Leave out room_ids to let the room planner choose them. An entry may also name the '
+            'allocation "strategy" (and, for "best", the "strategies" to try and a "time_budget").'
+        ))
+        parser.add_argument('--exam-ids', nargs='+', type=int, help='Exams to plan (default: every exam in the config).')
+        parser.add_argument('--date-from', help='Only plan exams on or after this date (YYYY-MM-DD).')
+        parser.add_argument('--date-to', help='Only plan exams on or before this date (YYYY-MM-DD).')
+        parser.add_argument('--output-dir', default='seat_plans', help='Directory the exports are written to.')
+        parser.add_argument('--formats', default='xlsx,csv', help=f'Comma-separated export formats out of {", ".join(EXPORT_FORMATS)}.')
+        parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1), help='Number of worker processes.')
+        parser.add_argument('--allow-clashes', action='store_true', help='Seat students even if they sit another overlapping exam.')
+
+    def handle(self, *args, **options):
+        config = self._load_config(options['config'])
+        formats = [f.strip().lower() for f in options['formats'].split(',') if f.strip()]
+        unknown = set(formats) - set(EXPORT_FORMATS)
+        if unknown:
+            raise CommandError(f"Unknown export formats: {', '.join(sorted(unknown))}")
+        if 'pdf' in formats:
+            try:
+                import reportlab  # noqa: F401
+            except ImportError:
+                raise CommandError("PDF export needs the reportlab package (pip install reportlab).")
+
+        exams = Exam.objects.filter(id__in=options['exam_ids'] or list(config))
+        try:
+            date_from = parse_date(options['date_from'] or '')
+            date_to = parse_date(options['date_to'] or '')
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+        if date_from:
+            exams = exams.filter(date__gte=date_from)
+        if date_to:
+            exams = exams.filter(date__lte=date_to)
+
+        exam_ids = []
+        for exam_id in exams.values_list('id', flat=True):
+            if exam_id in config:
+                exam_ids.append(exam_id)
+            else:
+                self.stdout.write(self.style.WARNING(f"Exam {exam_id} has no entry in the config. Skipping it."))
+        if not exam_ids:
+            raise CommandError("No exams to plan.")
+
+        output_dir = options['output_dir']
+        os.makedirs(output_dir, exist_ok=True)
+
+        # Exams that overlap in time share students' clash checks, so each window of
+        # overlapping exams runs in one worker and separate windows run in parallel.
+        index = ExamIntervalIndex(Exam.objects.filter(id__in=exam_ids).values_list('id', 'date', 'start_time', 'end_time'))
+        groups = [ids for ids, _ in index.windows(min_size=1)]
+        self.stdout.write(f"Planning {len(exam_ids)} exams in {len(groups)} independent groups with {options['workers']} workers...")
+
+        start = time.perf_counter()
+        summaries = []
+        args = (config, output_dir, formats, options['allow_clashes'])
+        if options['workers'] <= 1:
+            for group in groups:
+                summaries.extend(_run_group(group, *args))
+        else:
+            # Forked or spawned workers must open their own database connections.
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+                futures = [pool.submit(_run_group, group, *args) for group in groups]
+                for future in as_completed(futures):
+                    summaries.extend(future.result())
+        total = time.perf_counter() - start
+
+        self._print_summary(sorted(summaries, key=lambda s: s['exam_id']), total)
+
+    def _load_config(self, path):
+        try:
+            with open(path) as fh:
+                raw = json.load(fh)
+        except FileNotFoundError:
+            raise CommandError(f"ERROR: The file at '{path}' was not found.")
+        except json.JSONDecodeError as e:
+            raise CommandError(f"ERROR: '{path}' is not valid JSON: {e}")
+        try:
+            return {int(exam_id): entry for exam_id, entry in raw.items()}
+        except (AttributeError, ValueError):
+            raise CommandError("The config must be an object keyed by exam id.")
+
+    def _print_summary(self, summaries, total):
+        self.stdout.write("")
+        self.stdout.write(f"{'Exam':<40} {'Seated':>7} {'Generate':>9} {'Export':>9}")
+        failed = 0
+        for s in summaries:
+            if 'error' in s:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f"{s['exam'][:40]:<40} FAILED: {s['error']}"))
+                continue
+            self.stdout.write(
+                f"{s['exam'][:40]:<40} {s['assigned']:>7} {s['generate_seconds']:>8.2f}s {s['export_seconds']:>8.2f}s"
+            )
+        style = self.style.WARNING if failed else self.style.SUCCESS
+        self.stdout.write(style(
+            f"\n--- Planned {len(summaries) - failed} of {len(summaries)} exams in {total:.2f}s ---"
+        ))
@@ -1,9 +1,15 @@
 # exams/management/commands/import_rooms.py
 
-import pandas as pd
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
-from exams.models import Room, Seat
+from exams.changes import record_reset
+from exams.grid import invalidate_seat_grid
+from exams.seatmaps import bump_plan_version
+from exams.snapshots import forget_rooms
+from exams.layouts import is_layout_file, read_layout_file, apply_layout, LayoutError
+from exams.models import Room, Seat, SeatAssignment
+from exams.uploads import cached_parse
+from exams.utils import read_layout_workbook, LAYOUT_PARSER_VERSION
 
 # --- THIS IS THE CONFIGURATION MAP ---
 # This map is the single source of truth for which building a room belongs to.
@@ -28,10 +34,10 @@ ROOM_TO_BUILDING_MAP = {
 }
 
 class Command(BaseCommand):
-    help = 'Imports all rooms and seat layouts from a single master Excel file.'
+    help = 'Imports all rooms and seat layouts from a single master Excel or JSON/MessagePack layout file.'
 
     def add_arguments(self, parser):
-        parser.add_argument('file_path', type=str, help='The path to the master Excel file (e.g., "media/Seat Plan.xlsx").')
+        parser.add_argument('file_path', type=str, help='The path to the master Excel file (e.g., "media/Seat Plan.xlsx") or a .json/.msgpack layout file.')
 
     @transaction.atomic
     def handle(self, *args, **options):
@@ -39,14 +45,25 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS(f"--- Starting Import from: {file_path} ---"))
 
         try:
-            xls = pd.ExcelFile(file_path)
+            if is_layout_file(file_path):
+                self._import_layouts(file_path)
+                return
+
+            # A workbook imported before is not parsed again (see exams.uploads).
+            _, seats, meta, cached = cached_parse(
+                file_path, 'room_layout', read_layout_workbook, LAYOUT_PARSER_VERSION
+            )
+            if cached:
+                self.stdout.write("The workbook was parsed before; using its cached seats.")
+            seats_by_sheet = {sheet: rows for sheet, rows in seats.groupby('sheet', sort=False)}
             
             self.stdout.write(self.style.WARNING("Clearing all existing Room and Seat data..."))
+            self._reset_plans()
             Seat.objects.all().delete()
             Room.objects.all().delete()
             self.stdout.write(self.style.SUCCESS("Existing data cleared."))
 
-            for sheet_name in xls.sheet_names:
+            for sheet_name in meta['sheets']:
                 room_name = sheet_name.strip()
 
                 # --- THE DEFINITIVE FIX IS HERE ---
@@ -62,22 +79,24 @@ class Command(BaseCommand):
                 # Create the Room instance with the CORRECT building name from the map.
                 room_instance = Room.objects.create(name=room_name, building=building_name)
                 
-                df = pd.read_excel(xls, sheet_name=sheet_name, header=None)
-                
-                seats_to_create = []
-                for r_idx, row_series in df.iterrows():
-                    for c_idx, cell_value in enumerate(row_series):
-                        if pd.notna(cell_value) and isinstance(cell_value, str) and '-' in cell_value:
-                            seats_to_create.append(Seat(
-                                room=room_instance, seat_number=cell_value.strip(),
-                                row_num=r_idx + 1, col_num=c_idx + 1
-                            ))
+                sheet_seats = seats_by_sheet.get(sheet_name, seats.iloc[:0])
+                seats_to_create = [
+                    Seat(room=room_instance, seat_number=seat_number, row_num=row_num, col_num=col_num)
+                    for seat_number, row_num, col_num in zip(
+                        sheet_seats['seat_number'], sheet_seats['row_num'].tolist(), sheet_seats['col_num'].tolist()
+                    )
+                ]
                 
                 Seat.objects.bulk_create(seats_to_create)
                 
+                # The room's calculated fields, as parse_room_template_and_create_seats sets them.
                 room_instance.capacity = len(seats_to_create)
-                # We only need to update the capacity, so we can use a more efficient save.
-                room_instance.save(update_fields=['capacity'])
+                room_instance.max_rows = max((seat.row_num for seat in seats_to_create), default=0)
+                room_instance.max_columns = max((seat.col_num for seat in seats_to_create), default=0)
+                room_instance.entrance_row, room_instance.entrance_col = meta['entrances'].get(sheet_name) or (None, None)
+                # Only these fields changed, so we can use a more efficient save.
+                room_instance.save(update_fields=['capacity', 'max_rows', 'max_columns', 'entrance_row', 'entrance_col'])
+                invalidate_seat_grid(room_instance.pk)
 
                 self.stdout.write(self.style.SUCCESS(f" -> Successfully created '{room_name}' with {room_instance.capacity} seats."))
 
@@ -85,5 +104,39 @@ class Command(BaseCommand):
 
         except FileNotFoundError:
             raise CommandError(f"ERROR: The file at '{file_path}' was not found.")
+        except LayoutError as e:
+            raise CommandError(f"ERROR: Invalid layout file: {e}")
         except Exception as e:
-            raise CommandError(f"An unexpected error occurred: {e}")
\ No newline at end of file
+            raise CommandError(f"An unexpected error occurred: {e}")
+
+    def _reset_plans(self):
+        """Every seat plan goes with the seats, so mark them all as replaced and drop them."""
+        bump_plan_version()
+        record_reset(SeatAssignment.objects.values_list('exam_id', flat=True).distinct())
+        forget_rooms()
+        SeatAssignment.objects.all().delete()
+
+    def _import_layouts(self, file_path):
+        """Imports every room of a JSON/MessagePack layout file."""
+        layouts = read_layout_file(file_path)
+
+        self.stdout.write(self.style.WARNING("Clearing all existing Room and Seat data..."))
+        self._reset_plans()
+        Seat.objects.all().delete()
+        Room.objects.all().delete()
+        self.stdout.write(self.style.SUCCESS("Existing data cleared."))
+
+        for layout in layouts:
+            room_name = layout['name']
+            # The building in the file wins; fall back to the map for files that don't carry one.
+            building_name = layout['building'] or ROOM_TO_BUILDING_MAP.get(room_name)
+
+            if not room_name or not building_name:
+                self.stdout.write(self.style.WARNING(f"WARNING: Room '{room_name}' has no building in the file or the ROOM_TO_BUILDING_MAP. Skipping it."))
+                continue
+
+            room_instance = Room.objects.create(name=room_name, building=building_name)
+            apply_layout(room_instance, layout)
+            self.stdout.write(self.style.SUCCESS(f" -> Successfully created '{room_name}' with {room_instance.capacity} seats."))
+
+        self.stdout.write(self.style.SUCCESS("\n--- Import process completed successfully! ---"))
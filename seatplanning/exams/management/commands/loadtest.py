@@ -0,0 +1,280 @@
+# exams/management/commands/loadtest.py
+
+import asyncio
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from exams.models import Exam, SeatAssignment
+
+# What each kind of request fetches. {exam} and {roll_no} are filled in per request.
+OPERATIONS = {
+    'lookup': ('GET', '/api/exams/{exam}/seat/{roll_no}/'),
+    'list': ('GET', '/api/seat-assignments/?exam={exam}'),
+    'export_csv': ('GET', '/api/exams/{exam}/export-seats.csv'),
+    'export_xlsx': ('GET', '/api/exams/{exam}/export-seats/'),
+    'bundle': ('GET', '/api/exams/{exam}/room-bundle.zip'),
+}
+DEFAULT_MIX = 'lookup=90,list=4,export_csv=4,bundle=2'
+
+
+def _parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise CommandError(f"Unknown operation '{name}'. Choose from {', '.join(OPERATIONS)}.")
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise CommandError(f"Invalid weight for '{name}': {weight}")
+    if not mix or sum(mix.values()) <= 0:
+        raise CommandError("The mix needs at least one operation with a positive weight.")
+    return mix
+
+
+def _drain(content):
+    for _ in content:
+        pass
+
+
+class Results:
+    """Latencies and failures per operation, shared by every worker."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, operation, seconds, status_code):
+        with self._lock:
+            self.latencies[operation].append(seconds)
+            self.statuses[status_code] += 1
+            if status_code is None or status_code >= 400:
+                self.errors[operation] += 1
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulates exam-morning traffic (seat lookups, listings and exports, optionally with '
+        'a background generation) against one exam and reports throughput and latency percentiles.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int, help='Exam whose seat plan is queried. It must already have a plan.')
+        parser.add_argument('--url', help='Base URL of a running server (e.g. http://127.0.0.1:8000). By default requests go through the Django test client in this process.')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Weighted operations out of {", ".join(OPERATIONS)} (default: {DEFAULT_MIX}).')
+        parser.add_argument('--concurrency', type=int, default=10, help='Number of simulated clients.')
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run for.')
+        parser.add_argument('--requests', type=int, help='Stop after this many requests instead of after --duration.')
+        parser.add_argument('--mode', choices=('threads', 'asyncio'), default='threads', help=(
+            'Run clients as threads, or as asyncio tasks (the async test client in-process, '
+            'or blocking HTTP calls in the default executor with --url).'
+        ))
+        parser.add_argument('--generate-every', type=float, help=(
+            'Also regenerate the plan every N seconds in the background, with the rooms and sections '
+            'of the current plan. This reshuffles the exam\'s seats, so only use it on test data.'
+        ))
+
+    def handle(self, *args, **options):
+        try:
+            self.exam = Exam.objects.get(id=options['exam_id'])
+        except Exam.DoesNotExist:
+            raise CommandError(f"Exam {options['exam_id']} does not exist.")
+        self.roll_nos = list(
+            SeatAssignment.objects.filter(exam=self.exam).values_list('student__roll_no', flat=True)
+        )
+        if not self.roll_nos:
+            raise CommandError("The exam has no seat plan yet. Generate one before load testing.")
+        if options['concurrency'] < 1:
+            raise CommandError("--concurrency must be at least 1.")
+
+        self.url = (options['url'] or '').rstrip('/')
+        mix = _parse_mix(options['mix'])
+        self.operations = list(mix)
+        self.weights = list(mix.values())
+        self.results = Results()
+        self.max_requests = options['requests']
+        self._issued = 0
+        self._issued_lock = threading.Lock()
+        self.deadline = time.monotonic() + (options['duration'] if not self.max_requests else float('inf'))
+
+        self.stdout.write(
+            f"Load testing '{self.exam}' ({len(self.roll_nos)} students) with {options['concurrency']} "
+            f"clients ({options['mode']}) against {self.url or 'the in-process test client'}..."
+        )
+        stop_generation = threading.Event()
+        generator = None
+        if options['generate_every']:
+            generator = threading.Thread(
+                target=self._generate_loop, args=(options['generate_every'], stop_generation), daemon=True
+            )
+            generator.start()
+
+        if not self.url:
+            # Lets the test client's "testserver" host through ALLOWED_HOSTS.
+            setup_test_environment(debug=settings.DEBUG)
+        start = time.perf_counter()
+        try:
+            if options['mode'] == 'asyncio':
+                asyncio.run(self._run_async(options['concurrency']))
+            else:
+                self._run_threads(options['concurrency'])
+        finally:
+            stop_generation.set()
+            if generator:
+                generator.join()
+            if not self.url:
+                teardown_test_environment()
+        elapsed = time.perf_counter() - start
+
+        self._print_report(elapsed)
+
+    # --- Request scheduling ---
+
+    def _next_operation(self):
+        """The next operation to run, or None once the run is over."""
+        if time.monotonic() >= self.deadline:
+            return None
+        with self._issued_lock:
+            if self.max_requests is not None and self._issued >= self.max_requests:
+                return None
+            self._issued += 1
+        return random.choices(self.operations, self.weights)[0]
+
+    def _path(self, operation):
+        return OPERATIONS[operation][1].format(exam=self.exam.id, roll_no=random.choice(self.roll_nos))
+
+    # --- Threads ---
+
+    def _run_threads(self, concurrency):
+        workers = [threading.Thread(target=self._thread_client) for _ in range(concurrency)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def _thread_client(self):
+        from django.test import Client
+        client = None if self.url else Client()
+        try:
+            while (operation := self._next_operation()) is not None:
+                start = time.perf_counter()
+                status_code = self._request(client, operation)
+                self.results.record(operation, time.perf_counter() - start, status_code)
+        finally:
+            connections.close_all()
+
+    def _request(self, client, operation):
+        """Runs one request to completion (including the whole body). Returns the status code."""
+        path = self._path(operation)
+        try:
+            if client is None:
+                return self._http_get(path)
+            response = client.get(path)
+            if response.streaming:
+                _drain(response.streaming_content)
+            return response.status_code
+        except Exception:
+            return None
+
+    def _http_get(self, path):
+        try:
+            with urllib.request.urlopen(self.url + path, timeout=60) as response:
+                while response.read(65536):
+                    pass
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    # --- asyncio ---
+
+    async def _run_async(self, concurrency):
+        await asyncio.gather(*(self._async_client() for _ in range(concurrency)))
+
+    async def _async_client(self):
+        from django.test import AsyncClient
+        client = None if self.url else AsyncClient()
+        while (operation := self._next_operation()) is not None:
+            start = time.perf_counter()
+            status_code = await self._async_request(client, operation)
+            self.results.record(operation, time.perf_counter() - start, status_code)
+
+    async def _async_request(self, client, operation):
+        path = self._path(operation)
+        try:
+            if client is None:
+                return await asyncio.get_running_loop().run_in_executor(None, self._http_get, path)
+            response = await client.get(path)
+            if response.streaming:
+                if response.is_async:
+                    async for _ in response.streaming_content:
+                        pass
+                else:
+                    # Sync bodies query the database, which is not allowed on the event loop.
+                    await sync_to_async(_drain)(response.streaming_content)
+            return response.status_code
+        except Exception:
+            return None
+
+    # --- Background generation ---
+
+    def _generate_loop(self, every, stop):
+        """Regenerates the plan with its current rooms and sections until the run ends."""
+        from exams.allocation import generate_seat_plan, plan_scope
+
+        room_ids, section_ids = plan_scope(self.exam)
+        try:
+            while not stop.wait(every):
+                start = time.perf_counter()
+                try:
+                    generate_seat_plan(self.exam, room_ids, section_ids, allow_clashes=True)
+                    status_code = 201
+                except Exception as e:
+                    self.stderr.write(f"Background generation failed: {e}")
+                    status_code = None
+                self.results.record('generate', time.perf_counter() - start, status_code)
+        finally:
+            connections.close_all()
+
+    # --- Report ---
+
+    def _print_report(self, elapsed):
+        results = self.results
+        total = sum(len(v) for k, v in results.latencies.items() if k != 'generate')
+        errors = sum(v for k, v in results.errors.items() if k != 'generate')
+
+        self.stdout.write("")
+        self.stdout.write(
+            f"{'Operation':<12} {'Requests':>9} {'Errors':>7} {'Req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'Max ms':>8}"
+        )
+        for operation in sorted(results.latencies):
+            latencies = np.array(results.latencies[operation]) * 1000
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            self.stdout.write(
+                f"{operation:<12} {len(latencies):>9} {results.errors[operation]:>7} "
+                f"{len(latencies) / elapsed:>8.1f} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {latencies.max():>8.1f}"
+            )
+
+        statuses = ', '.join(f"{code or 'failed'}: {count}" for code, count in sorted(
+            results.statuses.items(), key=lambda item: item[0] or 0
+        ))
+        self.stdout.write(f"\nStatus codes: {statuses}")
+        error_rate = errors / total if total else 0
+        style = self.style.WARNING if errors else self.style.SUCCESS
+        self.stdout.write(style(
+            f"\n--- {total} requests in {elapsed:.2f}s: {total / elapsed:.1f} req/s, "
+            f"error rate {error_rate:.2%} ---"
+        ))
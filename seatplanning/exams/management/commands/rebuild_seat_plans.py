@@ -0,0 +1,36 @@
+# exams/management/commands/rebuild_seat_plans.py
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from exams.models import Exam
+from exams.seatmaps import bump_plan_version
+from exams.snapshots import rebuild_exams
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds the denormalized seat plan snapshot that exports, seat lookups and seat maps read, '
+        'e.g. after students, rooms or assignments were edited in the admin.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_ids', nargs='*', type=int, help='Exams to rebuild. Rebuilds every exam if omitted.')
+
+    def handle(self, *args, **options):
+        exam_ids = options['exam_ids'] or None
+        if exam_ids:
+            missing = set(exam_ids) - set(Exam.objects.filter(id__in=exam_ids).values_list('id', flat=True))
+            if missing:
+                raise CommandError(f"Exam(s) not found: {', '.join(map(str, sorted(missing)))}")
+
+        start = time.perf_counter()
+        with transaction.atomic():
+            written = rebuild_exams(exam_ids)
+            bump_plan_version(exam_ids)
+        scope = f"{len(exam_ids)} exam(s)" if exam_ids else "every exam"
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {written} seat plan entries for {scope} in {time.perf_counter() - start:.2f}s."
+        ))
@@ -0,0 +1,135 @@
+# exams/management/commands/startup_benchmark.py
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Only the import and export code paths need these, so no process should load them just to start.
+LAZY_MODULES = ('pandas', 'openpyxl', 'tablib', 'reportlab')
+# Reported as well, to see what a cold start pays for.
+WATCHED_MODULES = LAZY_MODULES + ('numpy',)
+DEFAULT_PATHS = ['/api/years/']
+
+# Runs in a fresh interpreter: sets Django up, resolves the paths and prints what it cost as JSON.
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from django.urls import resolve
+for path in json.loads(sys.argv[1]):
+    resolve(path)
+end = time.perf_counter()
+try:
+    import resource
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+except ImportError:
+    rss = None
+print(json.dumps({
+    'setup': setup - start,
+    'resolve': end - setup,
+    'rss': rss,
+    'modules': len(sys.modules),
+    'loaded': [name for name in json.loads(sys.argv[2]) if name in sys.modules],
+}))
+'''
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:.1f}"
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures a cold start: django.setup() and URL resolution in fresh interpreters, '
+        'with their time, peak memory and the heavy modules they load.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help=f'URL paths to resolve after setup (default: {" ".join(DEFAULT_PATHS)}).')
+        parser.add_argument('--runs', type=int, default=5, help='Number of fresh interpreters to start.')
+        parser.add_argument('--max-seconds', type=float, help='Fail if the median start (setup and resolution) takes longer.')
+        parser.add_argument('--strict', action='store_true', help=(
+            f'Fail if a start loads any of {", ".join(LAZY_MODULES)}, which should only be '
+            f'imported by the code paths that use them.'
+        ))
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError("--runs must be at least 1.")
+        paths = options['paths'] or DEFAULT_PATHS
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'seatplanning.settings')}
+
+        runs = []
+        for _ in range(options['runs']):
+            started = time.perf_counter()
+            completed = subprocess.run(
+                [sys.executable, '-c', PROBE, json.dumps(paths), json.dumps(WATCHED_MODULES)],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+            )
+            if completed.returncode:
+                raise CommandError(f"The probe failed:\n{completed.stderr}")
+            run = json.loads(completed.stdout.strip().splitlines()[-1])
+            # The wall time includes starting the interpreter itself.
+            run['process'] = time.perf_counter() - started
+            run['total'] = run['setup'] + run['resolve']
+            runs.append(run)
+
+        summary = {
+            key: {
+                'median': statistics.median(run[key] for run in runs),
+                'min': min(run[key] for run in runs),
+                'max': max(run[key] for run in runs),
+            }
+            for key in ('setup', 'resolve', 'total', 'process')
+        }
+        rss = [run['rss'] for run in runs if run['rss'] is not None]
+        loaded = sorted({name for run in runs for name in run['loaded']})
+        result = {
+            'paths': paths,
+            'runs': len(runs),
+            'seconds': summary,
+            'peak_rss_bytes': max(rss) if rss else None,
+            'modules': max(run['modules'] for run in runs),
+            'loaded': loaded,
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+        else:
+            self._print_report(result)
+
+        failures = []
+        if options['strict'] and set(loaded) & set(LAZY_MODULES):
+            failures.append(f"Starting up loads {', '.join(sorted(set(loaded) & set(LAZY_MODULES)))}.")
+        if options['max_seconds'] is not None and summary['total']['median'] > options['max_seconds']:
+            failures.append(
+                f"The median start took {summary['total']['median']:.3f}s, over the {options['max_seconds']}s allowed."
+            )
+        if failures:
+            raise CommandError(' '.join(failures))
+
+    def _print_report(self, result):
+        self.stdout.write(f"Cold start over {result['runs']} runs, resolving {', '.join(result['paths'])}:")
+        self.stdout.write("")
+        self.stdout.write(f"{'Stage':<12} {'Median ms':>10} {'Min ms':>8} {'Max ms':>8}")
+        # 'process' is the whole run of the interpreter, as seen from here.
+        for key, stats in result['seconds'].items():
+            self.stdout.write(f"{key:<12} {_ms(stats['median']):>10} {_ms(stats['min']):>8} {_ms(stats['max']):>8}")
+
+        self.stdout.write("")
+        if result['peak_rss_bytes'] is not None:
+            self.stdout.write(f"Peak RSS: {result['peak_rss_bytes'] / 2 ** 20:.1f} MB")
+        self.stdout.write(f"Modules loaded: {result['modules']}")
+        lazy = [name for name in result['loaded'] if name in LAZY_MODULES]
+        style = self.style.WARNING if lazy else self.style.SUCCESS
+        self.stdout.write(style(f"Heavy modules loaded: {', '.join(result['loaded']) or 'none'}"))
@@ -0,0 +1,246 @@
+"""
+In-process metrics for the import, generation and export pipelines,
+exposed in the Prometheus text format at /api/metrics.
+
+Every worker process keeps its own numbers; scrape each worker separately
+(or run a single worker) to get complete figures.
+"""
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds (in seconds) of the stage duration histogram buckets.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(label_names, values, extra=()):
+    pairs = list(zip(label_names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count, one per combination of label values."""
+    kind = 'counter'
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            yield self.name, _format_labels(self.label_names, label_values), value
+
+
+class Histogram:
+    """Observations sorted into cumulative buckets, one set per combination of label values."""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            counts, total = self._values.get(label_values, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[label_values] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((k, (list(c), t)) for k, (c, t) in self._values.items())
+        for label_values, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.label_names, label_values, [('le', _format_value(bound))])
+                yield f'{self.name}_bucket', labels, cumulative
+            labels = _format_labels(self.label_names, label_values)
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, cumulative
+
+
+class Registry:
+    """Holds every metric of the process and renders them for scraping."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help_text, label_names=()):
+        metric = Counter(name, help_text, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help_text}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'seatplanning_stage_duration_seconds',
+    'Time spent in each named stage of the import, generation and export pipelines.',
+    ('pipeline', 'stage'),
+)
+STAGE_ERRORS = REGISTRY.counter(
+    'seatplanning_stage_errors_total',
+    'Stages that ended with an exception.',
+    ('pipeline', 'stage'),
+)
+ROWS = REGISTRY.counter(
+    'seatplanning_rows_total',
+    'Rows processed by each pipeline (students imported, seats assigned, rows exported).',
+    ('pipeline',),
+)
+UPLOAD_CACHE = REGISTRY.counter(
+    'seatplanning_upload_cache_total',
+    'Parsed uploads served from the upload cache (hit) or parsed afresh (miss), by kind.',
+    ('kind', 'result'),
+)
+VIEW_ERRORS = REGISTRY.counter(
+    'seatplanning_view_errors_total',
+    'Requests that ended in an unexpected error, by view.',
+    ('view',),
+)
+
+
+@contextmanager
+def stage(pipeline, name):
+    """Times the enclosed block as one stage of a pipeline."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(pipeline, name)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, pipeline, name)
+
+
+class Measurement:
+    """
+    Wall time and memory of a block, filled in by measure():
+    `peak_rss_bytes` is the peak resident memory of the whole process so far
+    (not of the block), `peak_memory_bytes` the peak Python memory allocated
+    in the block, or None when it wasn't traced.
+    """
+    seconds = 0.0
+    peak_rss_bytes = None
+    peak_memory_bytes = None
+
+    def as_dict(self):
+        return {
+            'seconds': round(self.seconds, 4),
+            'peak_rss_bytes': self.peak_rss_bytes,
+            'peak_memory_bytes': self.peak_memory_bytes,
+        }
+
+
+def max_rss():
+    """The peak resident set size of this process in bytes, or None where the platform doesn't report it."""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_owns_tracing = False
+
+
+@contextmanager
+def measure(trace=None):
+    """
+    Measures the wall time of the block and reads the process's peak
+    resident memory after it, which costs nothing while the block runs. That
+    peak is the process's high-water mark since it started, so it only says
+    how much the block used if the block is the largest thing the process
+    ever ran.
+
+    With `trace` (by default the MEASURE_PYTHON_MEMORY setting) the peak
+    memory allocated by Python in the block itself is measured with
+    tracemalloc as well. That slows down every allocation in the process
+    while it runs and blocks measured at the same time add to each other's
+    peak, so only benchmarks should turn it on.
+    """
+    if trace is None:
+        from django.conf import settings
+        trace = getattr(settings, 'MEASURE_PYTHON_MEMORY', False)
+    if not trace:
+        result = Measurement()
+        start = time.perf_counter()
+        try:
+            yield result
+        finally:
+            result.seconds = time.perf_counter() - start
+            result.peak_rss_bytes = max_rss()
+        return
+
+    global _tracing_users, _owns_tracing
+    result = Measurement()
+    with _tracing_lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _owns_tracing = True
+        else:
+            tracemalloc.reset_peak()
+        _tracing_users += 1
+        baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result.seconds = time.perf_counter() - start
+        result.peak_rss_bytes = max_rss()
+        with _tracing_lock:
+            result.peak_memory_bytes = max(tracemalloc.get_traced_memory()[1] - baseline, 0)
+            _tracing_users -= 1
+            if _tracing_users == 0 and _owns_tracing:
+                tracemalloc.stop()
+                _owns_tracing = False
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exams", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="room",
+            name="aisles",
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name="room",
+            name="entrance_col",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="room",
+            name="entrance_row",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exams", "0003_generation_lock_idempotency"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="exam",
+            name="plan_version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exams", "0004_exam_plan_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SeatAssignmentChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "op",
+                    models.CharField(
+                        choices=[
+                            ("insert", "Insert"),
+                            ("update", "Update"),
+                            ("delete", "Delete"),
+                            ("reset", "Reset"),
+                        ],
+                        max_length=6,
+                    ),
+                ),
+                ("assignment_id", models.BigIntegerField(blank=True, null=True)),
+                ("student_id", models.BigIntegerField(blank=True, null=True)),
+                ("roll_no", models.CharField(blank=True, max_length=20)),
+                ("seat_id", models.BigIntegerField(blank=True, null=True)),
+                ("seat_number", models.CharField(blank=True, max_length=20)),
+                ("room_id", models.BigIntegerField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "exam",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="assignment_changes",
+                        to="exams.exam",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["exam", "id"], name="exams_change_cursor_idx")
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,115 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_entries(apps, schema_editor):
+    """Snapshots the plans that exist already."""
+    SeatAssignment = apps.get_model("exams", "SeatAssignment")
+    SeatPlanEntry = apps.get_model("exams", "SeatPlanEntry")
+
+    def class_str(c):
+        return f"{c.name} - {c.faculty.name} ({c.year.year_value})"
+
+    assignments = SeatAssignment.objects.select_related(
+        "seat__room",
+        "student__year",
+        "student__faculty",
+        "student__class_name__faculty",
+        "student__class_name__year",
+        "student__section__class_name__faculty",
+        "student__section__class_name__year",
+    )
+    batch = []
+    for a in assignments.iterator(chunk_size=2000):
+        student, seat = a.student, a.seat
+        batch.append(
+            SeatPlanEntry(
+                exam_id=a.exam_id,
+                assignment_id=a.id,
+                student_id=student.id,
+                seat_id=seat.id,
+                room_id=seat.room_id,
+                building=seat.room.building,
+                room_name=seat.room.name,
+                seat_number=seat.seat_number,
+                row_num=seat.row_num,
+                col_num=seat.col_num,
+                roll_no=student.roll_no,
+                student_name=student.name,
+                section=f"{class_str(student.section.class_name)} - {student.section.name}",
+                class_name=class_str(student.class_name),
+                year=str(student.year.year_value),
+                faculty=student.faculty.name,
+            )
+        )
+        if len(batch) >= 2000:
+            SeatPlanEntry.objects.bulk_create(batch)
+            batch = []
+    SeatPlanEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exams", "0005_seat_assignment_change"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SeatPlanEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("assignment_id", models.BigIntegerField(unique=True)),
+                ("student_id", models.BigIntegerField()),
+                ("seat_id", models.BigIntegerField()),
+                ("room_id", models.BigIntegerField()),
+                ("building", models.CharField(max_length=100)),
+                ("room_name", models.CharField(max_length=100)),
+                ("seat_number", models.CharField(max_length=20)),
+                ("row_num", models.IntegerField()),
+                ("col_num", models.IntegerField()),
+                ("roll_no", models.CharField(max_length=20)),
+                ("student_name", models.CharField(max_length=100)),
+                ("section", models.CharField(max_length=255)),
+                ("class_name", models.CharField(max_length=255)),
+                ("year", models.CharField(max_length=20)),
+                ("faculty", models.CharField(max_length=100)),
+                (
+                    "exam",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="plan_entries",
+                        to="exams.exam",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["exam", "roll_no"], name="exams_plan_entry_lookup_idx"
+                    ),
+                    models.Index(
+                        fields=["exam", "room_name", "row_num", "col_num"],
+                        name="exams_plan_entry_seat_idx",
+                    ),
+                    models.Index(
+                        fields=["exam", "room_id"], name="exams_plan_entry_room_idx"
+                    ),
+                    models.Index(
+                        fields=["student_id"], name="exams_plan_entry_student_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(build_entries, migrations.RunPython.noop),
+    ]
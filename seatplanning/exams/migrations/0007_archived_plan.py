@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exams", "0006_seat_plan_entry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedPlan",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("file", models.FileField(upload_to="seat_plan_archives/")),
+                ("row_count", models.IntegerField()),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "exam",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_plan",
+                        to="exams.exam",
+                    ),
+                ),
+            ],
+        ),
+    ]
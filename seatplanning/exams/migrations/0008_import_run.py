@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exams", "0007_archived_plan"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("digest", models.CharField(db_index=True, max_length=64)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("running", "Running"),
+                            ("failed", "Failed"),
+                            ("completed", "Completed"),
+                        ],
+                        default="running",
+                        max_length=9,
+                    ),
+                ),
+                ("chunk_size", models.PositiveIntegerField()),
+                ("sheet_index", models.PositiveIntegerField(default=0)),
+                ("sheet_name", models.CharField(blank=True, max_length=100)),
+                ("row_offset", models.PositiveIntegerField(default=0)),
+                ("total_rows", models.PositiveIntegerField()),
+                ("rows_done", models.PositiveIntegerField(default=0)),
+                ("created_count", models.PositiveIntegerField(default=0)),
+                ("error", models.TextField(blank=True)),
+                ("started_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
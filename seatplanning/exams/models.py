@@ -57,6 +57,8 @@ class Exam(models.Model):
     date = models.DateField()
     start_time = models.TimeField()
     end_time = models.TimeField()
+    # Bumped whenever the seat plan changes, so cached views of the plan can be keyed by it.
+    plan_version = models.PositiveIntegerField(default=0, editable=False)
     
     def __str__(self):
         return f"{self.name} on {self.date}"
@@ -72,6 +74,11 @@ class Room(models.Model):
     max_columns = models.IntegerField(default=0, editable=False)
     is_available = models.BooleanField(default=True)
     template_file = models.FileField(upload_to='room_templates/', null=True, blank=True)
+    # Position of the door in the seat grid (1-based), when the template marks it.
+    entrance_row = models.IntegerField(null=True, blank=True, editable=False)
+    entrance_col = models.IntegerField(null=True, blank=True, editable=False)
+    # Column numbers of the walkways between seat blocks.
+    aisles = models.JSONField(default=list, blank=True, editable=False)
 
     def __str__(self):
         return f"{self.name} ({self.building})"
@@ -125,3 +132,148 @@ class SeatAssignment(models.Model):
         # Updated to reflect the new structure
         return f"{self.student} at {self.seat} for {self.exam}"
 
+
+class SeatAssignmentChange(models.Model):
+    """
+    One write to an exam's seat assignments. The auto-increment id is the
+    cursor polling clients pass back to get only newer changes. A 'reset'
+    entry means the whole plan was replaced (e.g. regenerated) and clients
+    must fetch it again; entries older than it are pruned.
+    """
+    INSERT, UPDATE, DELETE, RESET = 'insert', 'update', 'delete', 'reset'
+    OPERATIONS = [(INSERT, 'Insert'), (UPDATE, 'Update'), (DELETE, 'Delete'), (RESET, 'Reset')]
+
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='assignment_changes')
+    op = models.CharField(max_length=6, choices=OPERATIONS)
+    # The assignment as it is after the change (before it, for a delete).
+    # Plain values rather than foreign keys, so history survives deletions.
+    assignment_id = models.BigIntegerField(null=True, blank=True)
+    student_id = models.BigIntegerField(null=True, blank=True)
+    roll_no = models.CharField(max_length=20, blank=True)
+    seat_id = models.BigIntegerField(null=True, blank=True)
+    seat_number = models.CharField(max_length=20, blank=True)
+    room_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['exam', 'id'], name='exams_change_cursor_idx')]
+
+    def __str__(self):
+        return f"#{self.pk} {self.op} for exam {self.exam_id}"
+
+
+class SeatPlanEntry(models.Model):
+    """
+    One seated student of an exam's plan, denormalized with everything that
+    exports, seat lookups and seat maps show, so they read a single table
+    without joins. Rebuilt in bulk when a plan is generated and refreshed
+    by the edits that touch it (see exams.snapshots).
+    """
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='plan_entries')
+    # Plain ids rather than foreign keys, so deleting a plan doesn't have to
+    # collect its entries row by row; the snapshot code clears them itself.
+    assignment_id = models.BigIntegerField(unique=True)
+    student_id = models.BigIntegerField()
+    seat_id = models.BigIntegerField()
+    room_id = models.BigIntegerField()
+    building = models.CharField(max_length=100)
+    room_name = models.CharField(max_length=100)
+    seat_number = models.CharField(max_length=20)
+    row_num = models.IntegerField()
+    col_num = models.IntegerField()
+    roll_no = models.CharField(max_length=20)
+    student_name = models.CharField(max_length=100)
+    # As Section, Class, Year and Faculty print themselves.
+    section = models.CharField(max_length=255)
+    class_name = models.CharField(max_length=255)
+    year = models.CharField(max_length=20)
+    faculty = models.CharField(max_length=100)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['exam', 'roll_no'], name='exams_plan_entry_lookup_idx'),
+            models.Index(fields=['exam', 'room_name', 'row_num', 'col_num'], name='exams_plan_entry_seat_idx'),
+            models.Index(fields=['exam', 'room_id'], name='exams_plan_entry_room_idx'),
+            models.Index(fields=['student_id'], name='exams_plan_entry_student_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.roll_no} at {self.seat_number} in {self.room_name} for exam {self.exam_id}"
+
+
+class ArchivedPlan(models.Model):
+    """
+    The seat plan of a past exam, moved out of SeatAssignment and
+    SeatPlanEntry into a gzip-compressed NDJSON file (one snapshot entry per
+    line) in media storage. Exports read it back transparently.
+    """
+    exam = models.OneToOneField(Exam, on_delete=models.CASCADE, related_name='archived_plan')
+    file = models.FileField(upload_to='seat_plan_archives/')
+    row_count = models.IntegerField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived plan of {self.exam} ({self.row_count} seats)"
+
+
+class GenerationLock(models.Model):
+    """
+    Held while a seat plan is generated for an exam. A row per exam works as
+    a mutex on every database backend, SQLite included, so two generations
+    of the same exam cannot interleave while different exams run in parallel.
+    """
+    exam = models.OneToOneField(Exam, on_delete=models.CASCADE, primary_key=True)
+    owner = models.CharField(max_length=32)
+    acquired_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Generation lock on {self.exam_id} held by {self.owner}"
+
+
+class IdempotencyRecord(models.Model):
+    """
+    The outcome of a request sent with an Idempotency-Key header, so a
+    duplicate submission gets the same response instead of running again.
+    `status_code` stays empty while the first request is still running.
+    """
+    key = models.CharField(max_length=255, unique=True)
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.IntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.key} ({self.status_code or 'in progress'})"
+
+
+class ImportRun(models.Model):
+    """
+    A student import that commits in chunks (see
+    importing.import_student_sheets_chunked). The checkpoint, the sheet and
+    the row in it that the next chunk starts at, is saved in the same
+    transaction as each chunk, so a failed run resumes exactly where its
+    last commit left off.
+    """
+    RUNNING, FAILED, COMPLETED = 'running', 'failed', 'completed'
+    STATUSES = [(RUNNING, 'Running'), (FAILED, 'Failed'), (COMPLETED, 'Completed')]
+
+    # SHA-256 of the workbook (see exams.uploads); a run only resumes with the same workbook.
+    digest = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=9, choices=STATUSES, default=RUNNING)
+    chunk_size = models.PositiveIntegerField()
+    # Checkpoint: index of the sheet among the workbook's student sheets, and rows of it committed.
+    sheet_index = models.PositiveIntegerField(default=0)
+    sheet_name = models.CharField(max_length=100, blank=True)
+    row_offset = models.PositiveIntegerField(default=0)
+    total_rows = models.PositiveIntegerField()
+    rows_done = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Import run #{self.pk} ({self.status}, {self.rows_done}/{self.total_rows} rows)"
+
@@ -0,0 +1,129 @@
+import math
+from bisect import bisect_left
+from collections import defaultdict
+
+from .models import Room, Student
+
+# Fraction of extra seats kept free on top of the student count (e.g. for late registrations).
+DEFAULT_SPARE_MARGIN = 0.05
+
+
+def required_seats(student_count, spare_margin=DEFAULT_SPARE_MARGIN):
+    """Number of seats needed for the students plus the spare margin."""
+    return math.ceil(student_count * (1 + spare_margin))
+
+
+def _pick_rooms(rooms, required):
+    """
+    Picks the fewest rooms whose capacities add up to `required`.
+
+    `rooms` is a list of (id, name, building, capacity) tuples. Taking the
+    largest rooms first gives the minimum room count; each picked room is
+    then swapped for the smallest unused room that still covers the total,
+    which trims the number of empty seats. Returns None if the rooms cannot
+    hold `required` students.
+    """
+    ordered = sorted(rooms, key=lambda r: r[3], reverse=True)
+    chosen, total = [], 0
+    for room in ordered:
+        if total >= required:
+            break
+        chosen.append(room)
+        total += room[3]
+    if total < required:
+        return None
+
+    # Unused rooms sorted by capacity so the best swap can be found with a bisect.
+    unused = sorted(ordered[len(chosen):], key=lambda r: r[3])
+    unused_caps = [r[3] for r in unused]
+    for i in range(len(chosen) - 1, -1, -1):
+        slack = total - required
+        if slack == 0:
+            break
+        idx = bisect_left(unused_caps, chosen[i][3] - slack)
+        if idx < len(unused) and unused_caps[idx] < chosen[i][3]:
+            replacement = unused.pop(idx)
+            unused_caps.pop(idx)
+            total += replacement[3] - chosen[i][3]
+            chosen[i] = replacement
+    return chosen
+
+
+def _cost(picked):
+    """Ranks a candidate selection: fewer rooms first, then fewer empty seats."""
+    return (len(picked), sum(r[3] for r in picked))
+
+
+def select_rooms(student_count, rooms, spare_margin=DEFAULT_SPARE_MARGIN):
+    """
+    Chooses the rooms for `student_count` students out of `rooms`.
+
+    The selection uses as few buildings as possible and, within those
+    buildings, as few rooms as possible. Returns a list of the chosen
+    (id, name, building, capacity) tuples or None if capacity is short.
+    """
+    required = required_seats(student_count, spare_margin)
+    if required == 0:
+        return []
+
+    by_building = defaultdict(list)
+    for room in rooms:
+        by_building[room[2]].append(room)
+    building_caps = {b: sum(r[3] for r in rs) for b, rs in by_building.items()}
+
+    # Fewest buildings: take the largest buildings until the seats are covered.
+    ordered = sorted(building_caps, key=building_caps.get, reverse=True)
+    base, total = [], 0
+    for building in ordered:
+        if total >= required:
+            break
+        base.append(building)
+        total += building_caps[building]
+    if total < required:
+        return None
+
+    # Any building outside the base may replace the last one if it still covers the seats,
+    # so try each of them and keep the selection with the fewest rooms and empty seats.
+    candidates = [base]
+    head, tail_cap = base[:-1], total - building_caps[base[-1]]
+    for building in ordered[len(base):]:
+        if tail_cap + building_caps[building] >= required:
+            candidates.append(head + [building])
+
+    best = None
+    for buildings in candidates:
+        picked = _pick_rooms([r for b in buildings for r in by_building[b]], required)
+        if picked is not None and (best is None or _cost(picked) < _cost(best)):
+            best = picked
+    return best
+
+
+def plan_rooms(section_ids, spare_margin=DEFAULT_SPARE_MARGIN, room_ids=None, buildings=None):
+    """
+    Builds a room plan for the students of the given sections from the
+    available rooms. Returns a dict describing the plan; `room_ids` is empty
+    when the available rooms cannot hold every student.
+    """
+    student_count = Student.objects.filter(section__id__in=section_ids).count()
+
+    rooms_qs = Room.objects.filter(is_available=True, capacity__gt=0)
+    if room_ids:
+        rooms_qs = rooms_qs.filter(id__in=room_ids)
+    if buildings:
+        rooms_qs = rooms_qs.filter(building__in=buildings)
+    rooms = list(rooms_qs.values_list('id', 'name', 'building', 'capacity'))
+
+    picked = select_rooms(student_count, rooms, spare_margin) or []
+    total_capacity = sum(r[3] for r in picked)
+    return {
+        'students': student_count,
+        'required_seats': required_seats(student_count, spare_margin),
+        'total_capacity': total_capacity,
+        'spare_seats': total_capacity - student_count if picked else 0,
+        'room_ids': [r[0] for r in picked],
+        'rooms': [
+            {'id': r[0], 'name': r[1], 'building': r[2], 'capacity': r[3]}
+            for r in picked
+        ],
+        'buildings': sorted({r[2] for r in picked}),
+    }
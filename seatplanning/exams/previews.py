@@ -0,0 +1,64 @@
+"""
+Previews of seat plans that are not written yet.
+
+A preview holds a generated plan in the cache under a random token for
+PREVIEW_TIMEOUT seconds, so officers can look at it through the assignment
+list, seat map and export endpoints (?preview=<token>) without the exam's
+assignments being deleted and inserted again for every try. Confirming a
+preview writes it as the exam's plan (see allocation.commit_preview).
+
+The preview may be read by another worker than the one that made it, so
+the cache must be shared between them (see CACHES in settings and the
+exams.E001 check). Set SEAT_PLAN_PREVIEWS = False to turn previews off.
+"""
+import secrets
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .snapshots import planned_entries
+
+PREVIEW_TIMEOUT = 15 * 60
+
+
+def previews_enabled():
+    return getattr(settings, 'SEAT_PLAN_PREVIEWS', True)
+
+
+def _cache_key(token):
+    return f"seat-plan-preview:{token}"
+
+
+def save_preview(exam, student_ids, seat_ids, room_ids, section_ids, allow_clashes, stats):
+    """
+    Caches the plan seating student_ids[i] at seat_ids[i], with its entries
+    ready for the readers, and returns its token.
+    """
+    token = secrets.token_urlsafe(16)
+    cache.set(_cache_key(token), {
+        'exam_id': exam.id,
+        'student_ids': np.asarray(student_ids, dtype=np.int64),
+        'seat_ids': np.asarray(seat_ids, dtype=np.int64),
+        'room_ids': list(room_ids),
+        'section_ids': list(section_ids),
+        'allow_clashes': allow_clashes,
+        'stats': stats,
+        'entries': planned_entries(student_ids, seat_ids),
+    }, PREVIEW_TIMEOUT)
+    return token
+
+
+def load_preview(token, exam_id=None):
+    """
+    The preview with this token, or None if it expired or (when `exam_id`
+    is given) belongs to another exam.
+    """
+    preview = cache.get(_cache_key(token)) if token else None
+    if preview is None or (exam_id is not None and preview['exam_id'] != int(exam_id)):
+        return None
+    return preview
+
+
+def discard_preview(token):
+    cache.delete(_cache_key(token))
@@ -0,0 +1,142 @@
+"""
+Progress of long-running imports and generations, published to the cache so
+the server-sent events view can stream it to the browser.
+
+The client picks a progress id (e.g. a UUID), sends it with the long request
+as an X-Progress-Id header (or ?progress_id=) and subscribes to
+/api/progress/<id>/events at the same time. Both requests may reach
+different workers: the default file cache is shared by the workers of one
+server and Redis by several (see CACHES in settings; the exams checks flag
+a process-local cache). Not the database cache: its writes would sit in
+the job's transaction until it commits.
+"""
+import re
+import time
+
+from django.core.cache import cache
+
+PROGRESS_TIMEOUT = 60 * 60
+# Progress is written at most this often, except on stage changes and at the end.
+PUBLISH_INTERVAL = 0.25
+
+PROGRESS_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+RUNNING, DONE, FAILED = 'running', 'done', 'failed'
+
+
+def _cache_key(progress_id):
+    return f"progress:{progress_id}"
+
+
+def progress_id_from(request):
+    """The progress id sent with a request, or None. Raises ValueError if it is malformed."""
+    progress_id = request.headers.get('X-Progress-Id') or request.GET.get('progress_id')
+    if progress_id is None:
+        return None
+    if not PROGRESS_ID_PATTERN.match(progress_id):
+        raise ValueError("The progress id may only contain letters, digits, '-' and '_' (at most 64).")
+    return progress_id
+
+
+def read(progress_id):
+    return cache.get(_cache_key(progress_id))
+
+
+async def aread(progress_id):
+    return await cache.aget(_cache_key(progress_id))
+
+
+class Progress:
+    """Publishes the stage, the rows done and an ETA of one running job."""
+
+    def __init__(self, progress_id, kind):
+        self.progress_id = progress_id
+        self.kind = kind
+        self.started = time.monotonic()
+        self.seq = 0
+        self.stage_name = None
+        self.stage_started = self.started
+        self.done = 0
+        self.total = None
+        self.status = RUNNING
+        self.message = None
+        self._published = 0.0
+        self._publish()
+
+    def stage(self, name, total=None):
+        """Starts a new stage with `total` rows to process (None if unknown)."""
+        self.stage_name = name
+        self.stage_started = time.monotonic()
+        self.done = 0
+        self.total = total
+        self._publish()
+
+    def advance(self, amount=1):
+        self.done += amount
+        if time.monotonic() - self._published >= PUBLISH_INTERVAL:
+            self._publish()
+
+    def finish(self, message=None):
+        self.status = DONE
+        self.message = message
+        self._publish()
+
+    def fail(self, message):
+        self.status = FAILED
+        self.message = message
+        self._publish()
+
+    def _eta(self):
+        """Seconds left in the current stage, from its rate so far."""
+        if not self.total or not self.done or self.status != RUNNING:
+            return None
+        rate = self.done / max(time.monotonic() - self.stage_started, 1e-6)
+        return round(max(self.total - self.done, 0) / rate, 1)
+
+    def _publish(self):
+        self.seq += 1
+        self._published = time.monotonic()
+        cache.set(_cache_key(self.progress_id), {
+            'id': self.progress_id,
+            'kind': self.kind,
+            'seq': self.seq,
+            'status': self.status,
+            'stage': self.stage_name,
+            'done': self.done,
+            'total': self.total,
+            'eta_seconds': self._eta(),
+            'elapsed_seconds': round(self._published - self.started, 1),
+            'message': self.message,
+        }, PROGRESS_TIMEOUT)
+
+
+class _NoProgress:
+    """Stands in for Progress when nobody is listening."""
+
+    def stage(self, name, total=None):
+        pass
+
+    def advance(self, amount=1):
+        pass
+
+    def finish(self, message=None):
+        pass
+
+    def fail(self, message):
+        pass
+
+
+NO_PROGRESS = _NoProgress()
+
+
+def tracker(progress_id, kind):
+    """A Progress for the id, or a no-op stand-in when there is none."""
+    return Progress(progress_id, kind) if progress_id else NO_PROGRESS
+
+
+def report(progress, status_code, data):
+    """Ends the progress with the outcome of an API response."""
+    if status_code < 400:
+        progress.finish(data.get('message'))
+    else:
+        progress.fail(data.get('error') or 'The request failed.')
@@ -0,0 +1,177 @@
+"""
+Quality scores of seat plans, to compare plans and to catch bad ones before
+they are printed.
+
+A plan is laid over the seat grid of its rooms (see grid.SeatGrid) as
+per-seat class and section arrays, -1 for an empty seat, and every metric
+is computed on those arrays with NumPy: neighbouring students of the same
+class or section, how evenly each room mixes classes, how full each room and
+building is, and how far students sit from the room's entrance. Scores are
+cached per exam plan version, like seat maps.
+"""
+import numpy as np
+from django.core.cache import cache
+
+from .archiving import archived_plan, iter_archived_entries
+from .grid import SeatGrid, ORTHOGONAL
+from .models import SeatPlanEntry
+from .strategies import DIAGONAL_WEIGHT
+
+QUALITY_CACHE_TIMEOUT = 60 * 60
+
+
+def _cache_key(exam_id, plan_version):
+    return f"plan-quality:{exam_id}:{plan_version}"
+
+
+def _codes(values):
+    """Numbers equal values alike, in order of first appearance."""
+    codes = {}
+    return np.fromiter((codes.setdefault(value, len(codes)) for value in values), dtype=np.int64, count=len(values))
+
+
+def _occupants(exam):
+    """The exam's (room ids, seat ids, class names, section names), from the snapshot or the archive."""
+    plan = archived_plan(exam)
+    if plan is None:
+        rows = list(SeatPlanEntry.objects.filter(exam=exam).values_list('room_id', 'seat_id', 'class_name', 'section'))
+    else:
+        rows = [(e['room_id'], e['seat_id'], e['class_name'], e['section']) for e in iter_archived_entries(plan)]
+    if not rows:
+        return np.empty(0, np.int64), np.empty(0, np.int64), (), ()
+    room_ids, seat_ids, class_names, sections = zip(*rows)
+    return np.array(room_ids, dtype=np.int64), np.array(seat_ids, dtype=np.int64), class_names, sections
+
+
+def _same_pairs(grid, groups, columns):
+    """
+    Per seat, how many of its neighbours in the given NEIGHBOR_OFFSETS
+    columns are in the same group, counting each pair once (on its lower seat).
+    """
+    neighbors = grid.neighbors[:, columns]
+    index = np.arange(len(grid))[:, None]
+    other = np.where(neighbors > index, neighbors, 0)
+    same = (neighbors > index) & (groups[:, None] >= 0) & (groups[other] == groups[:, None])
+    return same.sum(axis=1)
+
+
+def _pair_counts(grid, groups, room_index, room_count):
+    """Orthogonal and diagonal same-group pairs: totals and per room."""
+    orthogonal = _same_pairs(grid, groups, slice(0, ORTHOGONAL))
+    diagonal = _same_pairs(grid, groups, slice(ORTHOGONAL, None))
+    return {
+        'orthogonal': int(orthogonal.sum()),
+        'diagonal': int(diagonal.sum()),
+        'per_room': np.bincount(room_index, weights=orthogonal + diagonal, minlength=room_count).astype(np.int64),
+    }
+
+
+def _entropy(room_index, groups, room_count):
+    """Shannon entropy (bits) of the group mix of each room, and the number of groups in it."""
+    occupied = groups >= 0
+    group_count = int(groups.max()) + 1 if occupied.any() else 1
+    counts = np.bincount(
+        room_index[occupied] * group_count + groups[occupied], minlength=room_count * group_count
+    ).reshape(room_count, group_count).astype(float)
+    totals = counts.sum(axis=1, keepdims=True)
+    shares = np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
+    logs = np.log2(shares, out=np.zeros_like(shares), where=shares > 0)
+    return -(shares * logs).sum(axis=1), (counts > 0).sum(axis=1)
+
+
+def _distance_stats(distances):
+    if not len(distances):
+        return None
+    return {'mean': round(float(distances.mean()), 2), 'max': round(float(distances.max()), 2)}
+
+
+def score_plan(exam):
+    """
+    Scores the exam's plan. Returns a dict with the pairs of neighbours that
+    share a class or a section (orthogonal and diagonal), the plan's penalty
+    as the allocation strategies count it, and per room the class mix
+    entropy, utilisation and the distance of its students from the entrance
+    (in seats), plus the utilisation of each building. Rooms are those the
+    plan seats students in.
+    """
+    room_ids, seat_ids, class_names, sections = _occupants(exam)
+    grid = SeatGrid.for_rooms(np.unique(room_ids).tolist())
+    rooms = grid.rooms
+
+    # Lay the plan over the grid; seats deleted since an archive was written are left out.
+    order = np.argsort(grid.seat_ids)
+    position = np.searchsorted(grid.seat_ids, seat_ids, sorter=order).clip(max=max(len(grid) - 1, 0))
+    found = grid.seat_ids[order[position]] == seat_ids if len(grid) else np.zeros(len(seat_ids), bool)
+    seat_index = order[position[found]]
+    seat_class = np.full(len(grid), -1, dtype=np.int64)
+    seat_class[seat_index] = _codes(class_names)[found]
+    seat_section = np.full(len(grid), -1, dtype=np.int64)
+    seat_section[seat_index] = _codes(sections)[found]
+    occupied = seat_class >= 0
+
+    room_order = list(grid.room_slices)
+    room_index = np.repeat(
+        np.arange(len(room_order)), [grid.room_slices[r].stop - grid.room_slices[r].start for r in room_order]
+    )
+    same_class = _pair_counts(grid, seat_class, room_index, len(room_order))
+    same_section = _pair_counts(grid, seat_section, room_index, len(room_order))
+    entropy, class_counts = _entropy(room_index, seat_class, len(room_order))
+    room_seats = np.bincount(room_index, minlength=len(room_order))
+    room_students = np.bincount(room_index, weights=occupied, minlength=len(room_order)).astype(np.int64)
+
+    # Distance of every seat from its room's entrance, NaN in rooms without one.
+    entrance_rows = np.array([rooms[r]['entrance_row'] if rooms[r]['entrance_row'] is not None else np.nan
+                              for r in room_order])
+    entrance_cols = np.array([rooms[r]['entrance_col'] if rooms[r]['entrance_col'] is not None else np.nan
+                              for r in room_order])
+    distance = np.hypot(grid.rows - entrance_rows[room_index], grid.cols - entrance_cols[room_index])
+
+    room_scores = []
+    for i, room_id in enumerate(room_order):
+        part = grid.room_slices[room_id]
+        room_distances = distance[part][occupied[part]]
+        room_scores.append({
+            'id': room_id,
+            'name': rooms[room_id]['name'],
+            'building': rooms[room_id]['building'],
+            'seats': int(room_seats[i]),
+            'students': int(room_students[i]),
+            'utilization': round(float(room_students[i] / room_seats[i]), 4),
+            'same_class_pairs': int(same_class['per_room'][i]),
+            'same_section_pairs': int(same_section['per_room'][i]),
+            'classes': int(class_counts[i]),
+            'class_entropy': round(float(entropy[i]), 4),
+            'entrance_distance': None if np.isnan(entrance_rows[i]) else _distance_stats(room_distances),
+        })
+
+    buildings = {}
+    for room in room_scores:
+        building = buildings.setdefault(room['building'], {'building': room['building'], 'seats': 0, 'students': 0})
+        building['seats'] += room['seats']
+        building['students'] += room['students']
+    for building in buildings.values():
+        building['utilization'] = round(building['students'] / building['seats'], 4)
+
+    with_entrance = occupied & ~np.isnan(distance)
+    return {
+        'students': int(occupied.sum()),
+        'seats': len(grid),
+        'utilization': round(float(occupied.sum()) / len(grid), 4) if len(grid) else None,
+        'same_class_pairs': {key: same_class[key] for key in ('orthogonal', 'diagonal')},
+        'same_section_pairs': {key: same_section[key] for key in ('orthogonal', 'diagonal')},
+        # As strategies.penalty counts it: same-class pairs, diagonal ones weighted down.
+        'penalty': same_class['orthogonal'] + DIAGONAL_WEIGHT * same_class['diagonal'],
+        'entrance_distance': _distance_stats(distance[with_entrance]),
+        'rooms': room_scores,
+        'buildings': sorted(buildings.values(), key=lambda b: b['building']),
+    }
+
+
+def plan_quality(exam):
+    """The scores of the exam's current plan, from the cache when possible."""
+    key = _cache_key(exam.id, exam.plan_version)
+    result = cache.get(key)
+    if result is None:
+        result = {'exam_id': exam.id, 'plan_version': exam.plan_version, **score_plan(exam)}
+        cache.set(key, result, QUALITY_CACHE_TIMEOUT)
+    return result
@@ -0,0 +1,110 @@
+"""
+Routes reads to an optional read replica (the 'replica' database alias).
+
+Reads use the primary unless the current request opted in to the replica:
+ReplicaRoutingMiddleware does so for GET/HEAD requests, so list, lookup and
+export endpoints read from the replica while writes (and reads made while
+handling a write) stay on the primary. After an exam's plan changes, reads
+about that exam stay on the primary for REPLICA_STICKY_SECONDS.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+REPLICA_ALIAS = 'replica'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_read_from_replica = ContextVar('read_from_replica', default=False)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def _sticky_key(exam_id):
+    return f'replica:sticky:exam:{exam_id}'
+
+
+def mark_exam_written(exam_id):
+    """Keeps reads about the exam on the primary for the sticky window."""
+    cache.set(_sticky_key(exam_id), True, getattr(settings, 'REPLICA_STICKY_SECONDS', 30))
+
+
+def exam_is_sticky(exam_id):
+    return cache.get(_sticky_key(exam_id), False)
+
+
+@contextmanager
+def use_primary():
+    """Sends every read in the block to the primary."""
+    token = _read_from_replica.set(False)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+class ReplicaRouter:
+    """Reads go to the replica when the request allows it; writes always go to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if _read_from_replica.get() and replica_configured():
+            return REPLICA_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Lets `migrate --database replica` build the schema of a local SQLite replica.
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets safe requests read from the replica, unless they are about an
+    exam whose plan changed within the sticky window.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _read_from_replica.set(request.method in SAFE_METHODS and replica_configured())
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_from_replica.reset(token)
+
+        if getattr(response, 'streaming', False) and not getattr(response, 'is_async', False):
+            # Streamed bodies query the database after this method returns.
+            response.streaming_content = self._routed(
+                response.streaming_content, getattr(request, '_reads_from_replica', False)
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        exam_id = view_kwargs.get('exam_id')
+        if exam_id is not None and _read_from_replica.get() and exam_is_sticky(exam_id):
+            _read_from_replica.set(False)
+        request._reads_from_replica = _read_from_replica.get()
+        return None
+
+    @staticmethod
+    def _routed(content, replica):
+        iterator = iter(content)
+        while True:
+            token = _read_from_replica.set(replica)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _read_from_replica.reset(token)
+            yield chunk
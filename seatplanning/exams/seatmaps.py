@@ -0,0 +1,109 @@
+"""
+Compact seat maps: one room's grid for one exam, in columnar form.
+
+Every seat of the room is listed once, as parallel arrays, with the index of
+its occupant in a separate student table (or null for an empty seat), so
+room and student details are not repeated per seat. Maps are cached per
+exam plan version; anything that changes a plan bumps Exam.plan_version.
+"""
+from django.core.cache import cache
+from django.db.models import F
+
+from .changes import record_reset
+from .grid import SeatGrid
+from .models import Exam, SeatAssignment, SeatPlanEntry
+from .snapshots import forget_rooms
+
+SEAT_MAP_CACHE_TIMEOUT = 60 * 60
+
+
+def bump_plan_version(exam_ids=None):
+    """Marks the plans of the given exams (or of every exam) as changed."""
+    exams = Exam.objects.all() if exam_ids is None else Exam.objects.filter(id__in=exam_ids)
+    exams.update(plan_version=F('plan_version') + 1)
+
+
+def bump_room_plans(room_id):
+    """
+    Marks the plans of every exam seated in a room as replaced and drops
+    their assignments there, before the room's seats are deleted: the reset
+    covers them, so the seats' delete finds none to log one by one.
+    """
+    assignments = SeatAssignment.objects.filter(seat__room_id=room_id)
+    exam_ids = list(assignments.values_list('exam_id', flat=True).distinct())
+    bump_plan_version(exam_ids)
+    record_reset(exam_ids)
+    forget_rooms([room_id])
+    assignments.delete()
+
+
+def _cache_key(exam_id, room_id, plan_version):
+    return f"seat-map:{exam_id}:{room_id}:{plan_version}"
+
+
+# Snapshot fields of a seat's occupant, in the order of a map's student table.
+OCCUPANT_FIELDS = ('student_id', 'roll_no', 'student_name', 'class_name', 'section')
+
+
+def build_seat_map(exam_id, room_id, entries=None):
+    """
+    Builds the room's map from its cached seat grid, which also holds the
+    room's details, and the exam's plan snapshot in that room, which is a
+    single indexed scan with no joins, or from the given entries (e.g. a
+    preview's). Returns None if the room has no seats.
+    """
+    grid = SeatGrid.for_rooms([room_id])
+    if not len(grid):
+        return None
+    room = grid.rooms[room_id]
+    if entries is None:
+        occupants = {
+            seat_id: rest
+            for seat_id, *rest in SeatPlanEntry.objects.filter(exam_id=exam_id, room_id=room_id).values_list(
+                'seat_id', *OCCUPANT_FIELDS
+            )
+        }
+    else:
+        occupants = {
+            e['seat_id']: [e[field] for field in OCCUPANT_FIELDS] for e in entries if e['room_id'] == room_id
+        }
+
+    seats = {'row': grid.rows.tolist(), 'col': grid.cols.tolist(), 'label': grid.labels.tolist(), 'student': []}
+    students = {'id': [], 'roll_no': [], 'name': [], 'class': [], 'section': []}
+    for seat_id in grid.seat_ids.tolist():
+        occupant = occupants.get(seat_id)
+        if occupant is None:
+            seats['student'].append(None)
+            continue
+        seats['student'].append(len(students['id']))
+        for column, value in zip(students.values(), occupant):
+            column.append(value)
+
+    return {
+        'room': {
+            'id': room_id,
+            'name': room['name'],
+            'building': room['building'],
+            # From the seats themselves: rooms imported before import_rooms set them have 0 stored.
+            'max_rows': int(grid.rows.max()),
+            'max_columns': int(grid.cols.max()),
+            'entrance': [room['entrance_row'], room['entrance_col']] if room['entrance_row'] is not None else None,
+            'aisles': room['aisles'] or [],
+        },
+        'seats': seats,
+        'students': students,
+        'occupied': len(students['id']),
+    }
+
+
+def seat_map(exam, room_id):
+    """The seat map of a room for the exam's current plan, from the cache when possible."""
+    key = _cache_key(exam.id, room_id, exam.plan_version)
+    result = cache.get(key)
+    if result is None:
+        result = build_seat_map(exam.id, room_id)
+        if result is None:
+            return None
+        result = {'exam_id': exam.id, 'plan_version': exam.plan_version, **result}
+        cache.set(key, result, SEAT_MAP_CACHE_TIMEOUT)
+    return result
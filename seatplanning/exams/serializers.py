@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Faculty, Year, Class, Section, Student, Exam, SeatAssignment, Room, Seat
+from .importing import IMPORT_CHUNK_SIZE, MAX_IMPORT_CHUNK_SIZE
+from .models import Faculty, Year, Class, Section, Student, Exam, SeatAssignment, Room, Seat, ImportRun
 
 class FacultySerializer(serializers.ModelSerializer):
     class Meta:
@@ -57,12 +58,26 @@ class ExamSerializer(serializers.ModelSerializer):
 class ExcelUploadSerializer(serializers.Serializer):
     """Serializer for Excel file upload"""
     file = serializers.FileField()
+    # Only validate the workbook and return the report, without importing anything
+    dry_run = serializers.BooleanField(required=False, default=False)
+    # Commit every chunk_size rows separately, with a checkpoint to resume a failed import from
+    chunked = serializers.BooleanField(required=False, default=False)
+    chunk_size = serializers.IntegerField(
+        required=False, default=IMPORT_CHUNK_SIZE, min_value=1, max_value=MAX_IMPORT_CHUNK_SIZE
+    )
+    # Carries on with this failed chunked import from its checkpoint; upload the same file
+    resume = serializers.IntegerField(required=False, min_value=1)
     
     def validate_file(self, value):
         if not value.name.endswith('.xlsx'):
             raise serializers.ValidationError("Only Excel (.xlsx) files are allowed")
         return value
 
+class ImportRunSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportRun
+        fields = '__all__'
+
 class RoomSerializer(serializers.ModelSerializer):
     class Meta:
         model = Room
@@ -79,7 +94,10 @@ class SeatSerializer(serializers.ModelSerializer):
 class SeatAssignmentSerializer(serializers.ModelSerializer):
     student = StudentSerializer(read_only=True)
     seat = SeatSerializer(read_only=True)
+    # Write-only ids, so single assignments can be created or moved by hand.
+    student_id = serializers.PrimaryKeyRelatedField(source='student', queryset=Student.objects.all(), write_only=True)
+    seat_id = serializers.PrimaryKeyRelatedField(source='seat', queryset=Seat.objects.all(), write_only=True)
     
     class Meta:
         model = SeatAssignment
-        fields = ['id', 'student', 'exam', 'seat']     
\ No newline at end of file
+        fields = ['id', 'student', 'exam', 'seat', 'student_id', 'seat_id']     
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""
+Keeps seat plans in step with every save or delete of the rows they show,
+whichever path makes it (the API, the admin or a shell): students and their
+sections, classes, years and faculties, rooms and seats.
+
+A change refreshes the plan snapshot of the students, room or seat
+concerned and bumps the plans' versions. Deleting a student or seat, or a
+row whose students go with it, also logs the assignments the cascade takes
+as deleted in the change log; a deleted room resets the plans seated in it.
+The students concerned are selected with subqueries, so a faculty with any
+number of students is refreshed in a few statements.
+
+Bulk writes (bulk_create, QuerySet.update, raw SQL) send no signals: the
+code that makes them (seat plan generation, imports, room layouts) keeps
+the plans up to date itself. Seat assignments are not handled here for the
+same reason, their writers record their own changes.
+"""
+from django.db import transaction
+from django.db.models import Q, QuerySet
+from django.db.models.signals import post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .changes import record_changes
+from .grid import invalidate_seat_grid
+from .models import Faculty, Year, Class, Section, Student, Room, Seat, SeatAssignment, SeatAssignmentChange, SeatPlanEntry
+from .seatmaps import bump_plan_version, bump_room_plans
+from .snapshots import refresh_room, refresh_seats, refresh_students
+
+# Lookups from Student to a row of each model, through every relation the snapshot shows it by.
+STUDENT_LOOKUPS = {
+    Student: ('pk',),
+    Section: ('section',),
+    Class: ('class_name', 'section__class_name'),
+    Year: ('year', 'class_name__year', 'section__year', 'section__class_name__year'),
+    Faculty: ('faculty', 'class_name__faculty', 'section__faculty', 'section__class_name__faculty'),
+}
+
+
+def _students(model, pks):
+    """The ids of the students that show the rows, as a subquery."""
+    condition = Q()
+    for lookup in STUDENT_LOOKUPS[model]:
+        condition |= Q(**{f'{lookup}__in': pks})
+    return Student.objects.filter(condition).values('id')
+
+
+def _deleted_rows(instance, origin):
+    """
+    The pks of the rows a delete() removes when the instance is the first of
+    them to be signalled, or None: when it was deleted along with another
+    model's row by a cascade (which that row's handler takes care of), or
+    when the rest of its queryset was handled with the first one.
+    """
+    if isinstance(origin, QuerySet):
+        if origin.model is not type(instance) or getattr(origin, '_seat_plans_handled', False):
+            return None
+        origin._seat_plans_handled = True
+        return origin.values('pk')
+    return [instance.pk] if origin is instance else None
+
+
+# --- Students and the rows they are shown by ---
+
+def _refresh_students(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    with transaction.atomic():
+        bump_plan_version(refresh_students(_students(sender, [instance.pk])))
+
+
+def _forget_assignments(assignments, entries):
+    """Logs the assignments as deleted and drops their entries, before a cascade deletes them."""
+    exam_ids = list(assignments.values_list('exam_id', flat=True).distinct())
+    if not exam_ids:
+        return
+    record_changes(SeatAssignmentChange.DELETE, assignments.values('id'))
+    entries.delete()
+    bump_plan_version(exam_ids)
+
+
+def _forget_students(sender, instance, origin=None, **kwargs):
+    # Sent inside the delete's transaction, while the students' assignments are still there to log.
+    pks = _deleted_rows(instance, origin)
+    if pks is None:
+        return
+    students = _students(sender, pks)
+    _forget_assignments(
+        SeatAssignment.objects.filter(student_id__in=students),
+        SeatPlanEntry.objects.filter(student_id__in=students),
+    )
+
+
+for model in STUDENT_LOOKUPS:
+    post_save.connect(_refresh_students, sender=model, dispatch_uid=f'exams.refresh_students.{model.__name__}')
+    pre_delete.connect(_forget_students, sender=model, dispatch_uid=f'exams.forget_students.{model.__name__}')
+
+
+# --- Rooms and seats ---
+
+@receiver(post_save, sender=Room, dispatch_uid='exams.refresh_room')
+def _refresh_room(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    # Seat grids cache the room's name, building, entrance and aisles.
+    invalidate_seat_grid(instance.pk)
+    with transaction.atomic():
+        bump_plan_version(refresh_room(instance.pk))
+
+
+@receiver(pre_delete, sender=Room, dispatch_uid='exams.forget_room')
+def _forget_room(sender, instance, origin=None, **kwargs):
+    room_id = instance.pk
+    bump_room_plans(room_id)
+    transaction.on_commit(lambda: invalidate_seat_grid(room_id))
+
+
+@receiver(pre_save, sender=Seat, dispatch_uid='exams.remember_seat_room')
+def _remember_seat_room(sender, instance, raw=False, **kwargs):
+    instance._previous_room_id = None
+    if instance.pk is not None and not raw:
+        instance._previous_room_id = Seat.objects.filter(pk=instance.pk).values_list('room_id', flat=True).first()
+
+
+@receiver(pre_delete, sender=Seat, dispatch_uid='exams.forget_seats')
+def _forget_seats(sender, instance, origin=None, **kwargs):
+    # Seats deleted with their room are covered by its reset.
+    pks = _deleted_rows(instance, origin)
+    if pks is None:
+        return
+    room_ids = list(Seat.objects.filter(pk__in=pks).values_list('room_id', flat=True).distinct())
+    _forget_assignments(
+        SeatAssignment.objects.filter(seat_id__in=pks),
+        SeatPlanEntry.objects.filter(seat_id__in=pks),
+    )
+    transaction.on_commit(lambda: [invalidate_seat_grid(room_id) for room_id in room_ids])
+
+
+@receiver(post_save, sender=Seat, dispatch_uid='exams.refresh_seat')
+def _refresh_seat(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    for room_id in {instance.room_id, getattr(instance, '_previous_room_id', None)} - {None}:
+        invalidate_seat_grid(room_id)
+    if not created:
+        with transaction.atomic():
+            bump_plan_version(refresh_seats([instance.pk]))
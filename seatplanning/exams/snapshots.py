@@ -0,0 +1,188 @@
+"""
+The denormalized snapshot of seat plans (SeatPlanEntry), which exports, seat
+lookups and seat maps read instead of joining assignments to students,
+sections, classes, years, faculties, seats and rooms.
+
+Entries are written with a single INSERT ... SELECT over the joined tables,
+so the database builds them without the rows passing through Python. Every
+change to a plan refreshes the entries it touches, and so does every save
+or delete of a row whose name a plan shows (see exams.signals);
+`manage.py rebuild_seat_plans` rebuilds them all after bulk updates or raw
+SQL, which send no signals. Previews of plans that are not written yet get
+the same entries from `planned_entries`.
+"""
+from django.db import connection
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Cast, Concat
+
+from .models import Seat, SeatAssignment, SeatPlanEntry, Student
+
+
+def _text(*parts):
+    return Concat(*parts, output_field=CharField())
+
+
+def _year(path):
+    return Cast(f'{path}__year_value', output_field=CharField())
+
+
+def _class(path):
+    """Class.__str__ of the class at `path`: "<name> - <faculty> (<year>)"."""
+    return _text(
+        f'{path}__name', Value(' - '), f'{path}__faculty__name', Value(' ('), _year(f'{path}__year'), Value(')')
+    )
+
+
+def _seat_columns(seat):
+    """Entry columns of the seat at `seat` (a lookup path ending in '__', or '' for Seat itself)."""
+    return {
+        'room_id': F(f'{seat}room_id'),
+        'building': F(f'{seat}room__building'),
+        'room_name': F(f'{seat}room__name'),
+        'seat_number': F(f'{seat}seat_number'),
+        'row_num': F(f'{seat}row_num'),
+        'col_num': F(f'{seat}col_num'),
+    }
+
+
+def _student_columns(student):
+    """Entry columns of the student at `student` (a lookup path ending in '__', or '' for Student itself)."""
+    return {
+        'roll_no': F(f'{student}roll_no'),
+        'student_name': F(f'{student}name'),
+        # Section.__str__: "<class> - <name>"
+        'section': _text(_class(f'{student}section__class_name'), Value(' - '), f'{student}section__name'),
+        'class_name': _class(f'{student}class_name'),
+        'year': _year(f'{student}year'),
+        'faculty': F(f'{student}faculty__name'),
+    }
+
+
+# Entry column -> the expression over SeatAssignment that fills it.
+ENTRY_COLUMNS = {
+    'exam_id': F('exam_id'),
+    'assignment_id': F('id'),
+    'student_id': F('student_id'),
+    'seat_id': F('seat_id'),
+    **_seat_columns('seat__'),
+    **_student_columns('student__'),
+}
+
+
+def _insert_entries(assignments):
+    """Adds an entry for every assignment in the queryset, in one INSERT ... SELECT."""
+    aliases = {f'entry_{column}': expression for column, expression in ENTRY_COLUMNS.items()}
+    select = assignments.order_by().annotate(**aliases).values_list(*aliases)
+    sql, params = select.query.get_compiler(connection=connection).as_sql()
+
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(SeatPlanEntry._meta.get_field(column).column) for column in ENTRY_COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {qn(SeatPlanEntry._meta.db_table)} ({columns}) {sql}", params)
+        return cursor.rowcount
+
+
+def _rows_by_id(model, columns, ids):
+    """{id: {column: value}} for the given ids, queried in batches the backend accepts."""
+    aliases = {f'entry_{column}': expression for column, expression in columns.items()}
+    batch_size = connection.features.max_query_params or len(ids) or 1
+    rows = {}
+    for start in range(0, len(ids), batch_size):
+        for row in model.objects.filter(id__in=ids[start:start + batch_size]).values('id', **aliases):
+            rows[row['id']] = {column: row[f'entry_{column}'] for column in columns}
+    return rows
+
+
+def planned_entries(student_ids, seat_ids):
+    """
+    The entries a plan seating student_ids[i] at seat_ids[i] would have,
+    without writing anything (assignment_id is None), in seat order. Two
+    queries, with the same expressions the snapshot is built with.
+    """
+    student_ids, seat_ids = [int(i) for i in student_ids], [int(i) for i in seat_ids]
+    students = _rows_by_id(Student, _student_columns(''), student_ids)
+    seats = _rows_by_id(Seat, _seat_columns(''), seat_ids)
+    entries = [
+        {'assignment_id': None, 'student_id': student_id, 'seat_id': seat_id, **seats[seat_id], **students[student_id]}
+        for student_id, seat_id in zip(student_ids, seat_ids)
+    ]
+    entries.sort(key=lambda e: (e['room_name'], e['row_num'], e['col_num']))
+    return entries
+
+
+def rebuild_exams(exam_ids=None):
+    """
+    Replaces the entries of the given exams (or of every exam) with their
+    current plans. Returns the number of entries written.
+    """
+    if exam_ids is None:
+        SeatPlanEntry.objects.all().delete()
+        return _insert_entries(SeatAssignment.objects.all())
+    exam_ids = list(exam_ids)
+    SeatPlanEntry.objects.filter(exam_id__in=exam_ids).delete()
+    return _insert_entries(SeatAssignment.objects.filter(exam_id__in=exam_ids))
+
+
+def _refresh(entries, assignments):
+    """Replaces the entries with those of the assignments. Returns the ids of the exams concerned."""
+    exam_ids = set(entries.values_list('exam_id', flat=True).distinct())
+    entries.delete()
+    _insert_entries(assignments)
+    exam_ids.update(assignments.values_list('exam_id', flat=True).distinct())
+    return exam_ids
+
+
+def refresh_assignments(assignment_ids):
+    """
+    Brings the entries of the given assignments up to date after they were
+    created, changed or deleted.
+    """
+    assignment_ids = list(assignment_ids)
+    _refresh(
+        SeatPlanEntry.objects.filter(assignment_id__in=assignment_ids),
+        SeatAssignment.objects.filter(id__in=assignment_ids),
+    )
+
+
+def refresh_students(student_ids):
+    """
+    Refreshes the entries of the given students (ids, or a values('id')
+    queryset) after their details, or those of their section, class, year or
+    faculty, changed or they were deleted. Returns the ids of the exams
+    whose plans show them.
+    """
+    return _refresh(
+        SeatPlanEntry.objects.filter(student_id__in=student_ids),
+        SeatAssignment.objects.filter(student_id__in=student_ids),
+    )
+
+
+def refresh_room(room_id):
+    """
+    Refreshes the entries of every plan seated in a room after the room was
+    renamed or moved. Returns the ids of the exams seated there.
+    """
+    return _refresh(
+        SeatPlanEntry.objects.filter(room_id=room_id),
+        SeatAssignment.objects.filter(seat__room_id=room_id),
+    )
+
+
+def refresh_seats(seat_ids):
+    """
+    Refreshes the entries of the students seated at the given seats after
+    the seats were renumbered or moved. Returns the ids of the exams concerned.
+    """
+    return _refresh(
+        SeatPlanEntry.objects.filter(seat_id__in=seat_ids),
+        SeatAssignment.objects.filter(seat_id__in=seat_ids),
+    )
+
+
+def forget_rooms(room_ids=None):
+    """
+    Drops the entries in the given rooms (or in every room) before their
+    seats, and with them the assignments there, are deleted.
+    """
+    entries = SeatPlanEntry.objects.all() if room_ids is None else SeatPlanEntry.objects.filter(room_id__in=room_ids)
+    entries.delete()
@@ -0,0 +1,378 @@
+"""
+Allocation strategies: how the students of a plan are placed on the seats.
+
+Every strategy takes the seats and the students as NumPy arrays and returns,
+for each student, the index of the seat they get. They are pure functions of
+their inputs and a random generator, with no database access, so the
+best-of search can run them in worker processes.
+
+Register a new strategy with the @strategy decorator. Strategies that loop
+in Python should call check_deadline() now and then, so a search can stop
+them once its time budget is spent.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextvars import ContextVar
+from typing import NamedTuple
+
+import numpy as np
+
+# The first ORTHOGONAL columns of a seat's neighbours are side by side or front and back
+# (see grid.NEIGHBOR_OFFSETS); the rest are diagonal, and count for DIAGONAL_WEIGHT of a pair.
+ORTHOGONAL = 4
+DIAGONAL_WEIGHT = 0.5
+
+DEFAULT_STRATEGY = 'random'
+BEST_OF = 'best'
+
+DEFAULT_TIME_BUDGET = 5.0
+MAX_TIME_BUDGET = 60.0
+# Size of the process pool that every search of a server process shares.
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+# Randomised strategies are restarted with new seeds at most this many times in a search.
+MAX_RESTARTS = 64
+
+
+class Seats(NamedTuple):
+    """
+    The seats of a plan in fill order (room name, row, column). `neighbors[i]`
+    holds the indexes of seat i's eight neighbours, -1 where there is none.
+    """
+    rows: np.ndarray
+    cols: np.ndarray
+    room_ids: np.ndarray
+    neighbors: np.ndarray
+
+    @classmethod
+    def from_grid(cls, grid):
+        return cls(grid.rows, grid.cols, grid.room_ids, grid.neighbors)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class Students(NamedTuple):
+    """The students of a plan in roll number order."""
+    ids: np.ndarray
+    class_ids: np.ndarray
+    section_ids: np.ndarray
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class Strategy(NamedTuple):
+    name: str
+    function: object
+    description: str
+    # Whether runs with different seeds give different plans, so restarts can help.
+    randomized: bool
+
+
+STRATEGIES = {}
+
+
+def strategy(name, randomized=True):
+    """Registers a function fn(seats, students, rng) -> seat index per student."""
+    def register(function):
+        description = ' '.join((function.__doc__ or '').split())
+        STRATEGIES[name] = Strategy(name, function, description, randomized)
+        return function
+    return register
+
+
+class CandidateExpired(Exception):
+    """Raised by check_deadline() in a candidate that ran past its search's time budget."""
+
+
+# The wall-clock time (time.time(), comparable across processes) the running candidate must finish by.
+_deadline = ContextVar('candidate_deadline', default=None)
+
+
+def check_deadline():
+    """Raises CandidateExpired if the running candidate is out of time."""
+    deadline = _deadline.get()
+    if deadline is not None and time.time() >= deadline:
+        raise CandidateExpired()
+
+
+def get_strategy(name):
+    """The registered strategy, or ValueError for an unknown name."""
+    try:
+        return STRATEGIES[name]
+    except (KeyError, TypeError):
+        raise ValueError(f"Unknown strategy '{name}'. Choose from {', '.join(STRATEGIES)} or '{BEST_OF}'.")
+
+
+# --- Strategies ---
+
+@strategy('sequential', randomized=False)
+def sequential_fill(seats, students, rng):
+    """Seats students in roll number order, filling the seats in order."""
+    return np.arange(len(students), dtype=np.int64)
+
+
+@strategy('random')
+def random_fill(seats, students, rng):
+    """Shuffles the students and fills the seats in order."""
+    return rng.permutation(len(students)).astype(np.int64)
+
+
+@strategy('interleave')
+def interleave_by_class(seats, students, rng):
+    """
+    Gives each class one colour of a pattern over the rows and columns of
+    the seats, in which no two neighbouring seats share a colour with four
+    classes or more (with fewer, only diagonal neighbours can), then deals
+    the students that their colour has no room for out class by class on
+    the seats left.
+    """
+    n = len(students)
+    classes, class_index = np.unique(students.class_ids, return_inverse=True)
+    k = len(classes)
+    # Seat (row, column) gets colour (step * row + column) mod k: neighbours' colours differ by
+    # 1 side by side, step front and back and step +/- 1 diagonally, none a multiple of k for k >= 4.
+    step = 2 if k >= 4 else 1
+    colour = (step * seats.rows[:n] + seats.cols[:n]) % max(k, 1)
+    by_colour = np.argsort(colour, kind='stable')
+    colour_sizes = np.bincount(colour, minlength=k)
+    colour_starts = np.cumsum(colour_sizes) - colour_sizes
+
+    # Shuffle within each class, then number every student within their class.
+    shuffled = rng.permutation(n)
+    by_class = shuffled[np.argsort(class_index[shuffled], kind='stable')]
+    starts = np.searchsorted(class_index[by_class], np.arange(k))
+    rank = np.empty(n, dtype=np.int64)
+    rank[by_class] = np.arange(n) - starts[class_index[by_class]]
+
+    # The i-th student of a class takes the i-th seat of its colour, in fill order, while there is one.
+    class_colour = rng.permutation(k)[class_index]
+    fits = rank < colour_sizes[class_colour]
+    seat_indexes = np.empty(n, dtype=np.int64)
+    seat_indexes[fits] = by_colour[colour_starts[class_colour[fits]] + rank[fits]]
+
+    # The rest take the seats left over, every class taking a turn per round.
+    free = np.ones(n, dtype=bool)
+    free[seat_indexes[fits]] = False
+    rest = np.flatnonzero(~fits)
+    seat_indexes[rest[np.lexsort((class_colour[rest], rank[rest]))]] = np.flatnonzero(free)
+    return seat_indexes
+
+
+@strategy('anti_adjacency')
+def anti_adjacency(seats, students, rng):
+    """
+    Greedily gives each seat a student of the class that its already seated
+    neighbours share least (diagonal neighbours counting for
+    DIAGONAL_WEIGHT), taking the class with the most students left on a tie.
+    With at least twice as many seats as students, every other seat is left
+    empty.
+    """
+    n = len(students)
+    order = np.arange(len(seats))
+    if len(seats) >= 2 * n:
+        # A checkerboard: no two chosen seats share an edge.
+        spaced = (seats.rows + seats.cols) % 2 == 0
+        order = np.concatenate([order[spaced], order[~spaced]])
+    chosen = order[:n]
+
+    classes, class_index = np.unique(students.class_ids, return_inverse=True)
+    pools = [list(rng.permutation(np.flatnonzero(class_index == c))) for c in range(len(classes))]
+    remaining = [len(pool) for pool in pools]
+    # Ties between classes are broken in a random order, which varies between restarts.
+    tie_break = rng.permutation(len(classes)).tolist()
+    seat_class = [-1] * len(seats)
+    neighbors = seats.neighbors.tolist()
+    weights = [1.0] * ORTHOGONAL + [DIAGONAL_WEIGHT] * (seats.neighbors.shape[1] - ORTHOGONAL)
+
+    seat_indexes = np.empty(n, dtype=np.int64)
+    for i, seat in enumerate(chosen.tolist()):
+        if i % 1024 == 0:
+            check_deadline()
+        conflicts = {}
+        for other, weight in zip(neighbors[seat], weights):
+            if other >= 0 and seat_class[other] >= 0:
+                conflicts[seat_class[other]] = conflicts.get(seat_class[other], 0.0) + weight
+        best = min(
+            (c for c in tie_break if remaining[c]),
+            key=lambda c: (conflicts.get(c, 0.0), -remaining[c]),
+        )
+        remaining[best] -= 1
+        seat_indexes[pools[best].pop()] = seat
+        seat_class[seat] = best
+    return seat_indexes
+
+
+# --- Scoring ---
+
+def penalty(seats, students, seat_indexes):
+    """
+    How many neighbouring students share a class, counting diagonal
+    neighbours as DIAGONAL_WEIGHT of a side-by-side pair. Lower is better.
+    """
+    seat_class = np.full(len(seats), -1, dtype=np.int64)
+    seat_class[seat_indexes] = students.class_ids
+    index = np.arange(len(seats))
+    total = 0.0
+    for k in range(seats.neighbors.shape[1]):
+        other = seats.neighbors[:, k]
+        # Each pair once, from its lower index.
+        same = (other > index) & (seat_class >= 0)
+        same[same] = seat_class[same] == seat_class[other[same]]
+        total += same.sum() * (1.0 if k < ORTHOGONAL else DIAGONAL_WEIGHT)
+    return float(total)
+
+
+def run_candidate(name, seed, seats, students, deadline=None):
+    """
+    Runs one strategy and scores it. Returns (name, seed, seat indexes,
+    penalty), or None if the wall-clock `deadline` passed first.
+    """
+    if deadline is not None and time.time() >= deadline:
+        return None
+    token = _deadline.set(deadline)
+    try:
+        seat_indexes = STRATEGIES[name].function(seats, students, np.random.default_rng(seed))
+    except CandidateExpired:
+        return None
+    finally:
+        _deadline.reset(token)
+    return name, seed, seat_indexes, penalty(seats, students, seat_indexes)
+
+
+# --- Worker processes ---
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _shared_pool():
+    """
+    The process pool of this server process, started on first use and
+    shared by every search, so concurrent requests never run more than
+    DEFAULT_WORKERS candidates at once between them.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Workers are spawned rather than forked: they only need NumPy and this
+            # module, not a copy of a threaded server and its database connections.
+            _pool = ProcessPoolExecutor(max_workers=DEFAULT_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _discard_pool(pool):
+    """Drops a pool whose worker died, so the next search starts a new one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+@atexit.register
+def _shutdown_pool():
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+# --- Best-of search ---
+
+def _candidates(names, seed):
+    """(strategy, seed) pairs to try: every strategy once, then restarts of the randomised ones."""
+    for name in names:
+        yield name, seed
+    restartable = [name for name in names if STRATEGIES[name].randomized]
+    for restart in range(1, MAX_RESTARTS + 1 if restartable else 1):
+        for name in restartable:
+            yield name, seed + restart
+
+
+def best_of(seats, students, names=None, time_budget=DEFAULT_TIME_BUDGET, workers=None, seed=None, progress=None):
+    """
+    Runs the given strategies (all by default), then random restarts of the
+    randomised ones, on up to `workers` processes of the shared pool (in
+    this process with workers=1) until the time budget is spent, and returns
+    the candidate with the lowest penalty along with a summary of every
+    candidate scored. The first candidate is always finished, even if it
+    takes longer than the budget; the others stop at the deadline. The
+    search also stops early once a plan without any same-class neighbours
+    is found.
+    """
+    names = list(names or STRATEGIES)
+    for name in names:
+        get_strategy(name)
+    seed = int(np.random.SeedSequence(seed).generate_state(1)[0])
+    workers = min(workers or DEFAULT_WORKERS, DEFAULT_WORKERS)
+    deadline = time.monotonic() + time_budget
+    wall_deadline = time.time() + time_budget
+    candidates = _candidates(names, seed)
+    best, scored = None, []
+    started = 0
+
+    def candidate_deadline():
+        # Every candidate but the first may be stopped at the deadline.
+        nonlocal started
+        started += 1
+        return None if started == 1 else wall_deadline
+
+    def keep(result):
+        nonlocal best
+        if result is None:
+            return
+        name, candidate_seed, _, score = result
+        scored.append({'strategy': name, 'seed': candidate_seed, 'penalty': score})
+        if best is None or score < best[3]:
+            best = result
+        if progress is not None:
+            progress.advance()
+
+    def finished():
+        return best is not None and (best[3] == 0 or time.monotonic() >= deadline)
+
+    def run_here():
+        for name, candidate_seed in candidates:
+            if finished():
+                break
+            # Until one has finished, a candidate runs to the end.
+            keep(run_candidate(name, candidate_seed, seats, students, None if best is None else wall_deadline))
+        return best, scored
+
+    if workers <= 1:
+        return run_here()
+
+    pool = _shared_pool()
+    pending = set()
+    try:
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < workers and time.monotonic() < deadline:
+                try:
+                    name, candidate_seed = next(candidates)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.add(pool.submit(run_candidate, name, candidate_seed, seats, students, candidate_deadline()))
+            if not pending:
+                break
+            # Past the deadline, only wait if nothing has finished yet.
+            timeout = None if best is None else max(deadline - time.monotonic(), 0)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                keep(future.result())
+            if finished():
+                break
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for its memory): finish the search here.
+        _discard_pool(pool)
+        return run_here()
+    finally:
+        # Candidates still queued are dropped; running ones stop at the deadline.
+        for future in pending:
+            future.cancel()
+    return best, scored
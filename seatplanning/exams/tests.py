@@ -1,3 +1,1104 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import os
+import tempfile
+import zipfile
+from functools import partial
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import allocation, locking, metrics, progress, strategies, uploads
+from .allocation import generate_seat_plan
+from .exporting import XLSX_CONTENT_TYPE
+from .grid import SeatGrid
+from .importing import import_student_sheets
+from .layouts import LayoutError, normalize_room, normalize_rooms
+from .models import Faculty, Year, Class, Section, Student, Exam, Room, Seat, SeatAssignment, SeatAssignmentChange, IdempotencyRecord, ImportRun
+from .planner import select_rooms
+from .routers import ReplicaRouter, ReplicaRoutingMiddleware, mark_exam_written, use_primary
+
+MEDIA_ROOT = tempfile.mkdtemp()
+# Every test gets a private cache: the default one is shared with running servers.
+TEST_SETTINGS = dict(
+    MEDIA_ROOT=MEDIA_ROOT,
+    UPLOAD_CACHE_DIR=os.path.join(MEDIA_ROOT, 'upload_cache'),
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+
+
+def make_exam(date=datetime.date(2026, 1, 5), start=datetime.time(9), end=datetime.time(12), name="Maths"):
+    return Exam.objects.create(name=name, date=date, start_time=start, end_time=end)
+
+
+def make_room(name, building, rows, columns):
+    room = Room.objects.create(name=name, building=building, capacity=rows * columns, max_rows=rows, max_columns=columns)
+    Seat.objects.bulk_create(
+        Seat(room=room, seat_number=f"{chr(65 + r)}-{c + 1:02d}", row_num=r + 1, col_num=c + 1)
+        for r in range(rows) for c in range(columns)
+    )
+    return room
+
+
+def make_world(n_students=40, rooms=(("R1", "B1", 5, 6), ("R2", "B1", 4, 5)), classes=3):
+    """An exam, `classes` sections (one per class) sharing n_students, and rooms of rows x columns seats."""
+    faculty = Faculty.objects.create(name="Computing")
+    year = Year.objects.create(year_value=1)
+    sections = []
+    for i in range(classes):
+        class_ = Class.objects.create(name=f"C{i}", year=year, faculty=faculty)
+        sections.append(Section.objects.create(name="A", class_name=class_, year=year, faculty=faculty))
+    Student.objects.bulk_create(
+        Student(
+            name=f"Student {i}", roll_no=f"{1000 + i}", section=sections[i % classes],
+            class_name=sections[i % classes].class_name, year=year, faculty=faculty,
+        )
+        for i in range(n_students)
+    )
+    return make_exam(), sections, [make_room(*room) for room in rooms]
+
+
+def workbook(sheets):
+    """
+    An .xlsx student workbook; `sheets` maps sheet names to (first roll
+    number, count, group), or to the sheet's columns as a dict.
+    """
+    import pandas as pd
+
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        for name, sheet in sheets.items():
+            if not isinstance(sheet, dict):
+                start, count, group = sheet
+                sheet = {
+                    'University ID': range(start, start + count),
+                    'Student Name': [f'Student {i}' for i in range(count)],
+                    'Group': [group] * count,
+                    'Course': ['BIT'] * count,
+                }
+            pd.DataFrame(sheet).to_excel(writer, sheet_name=name, index=False)
+    return buffer.getvalue()
+
+
+def content(response):
+    """The body of a response, streamed or not."""
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+async def acontent(response):
+    if response.streaming:
+        return b''.join([chunk async for chunk in response.streaming_content])
+    return response.content
+
+
+def assignments(exam):
+    return list(SeatAssignment.objects.filter(exam=exam).order_by('id').values_list('id', 'student_id', 'seat_id'))
+
+
+@override_settings(**TEST_SETTINGS)
+class WorldTestCase(TestCase):
+    """A test case with the exam, sections and rooms of make_world, and a clean cache."""
+    rooms = (("R1", "B1", 5, 6), ("R2", "B1", 4, 5))
+
+    def setUp(self):
+        cache.clear()
+        self.exam, self.sections, self.rooms = make_world(rooms=self.rooms)
+        self.room_ids = [room.id for room in self.rooms]
+        self.section_ids = [section.id for section in self.sections]
+
+    def generate(self, **kwargs):
+        return generate_seat_plan(self.exam, self.room_ids, self.section_ids, **kwargs)
+
+
+class RoomPlannerTests(WorldTestCase):
+    rooms = (("R1", "B1", 5, 6), ("R2", "B1", 4, 5), ("R3", "B2", 8, 6))
+
+    def test_select_rooms_prefers_fewer_buildings_then_fewer_rooms(self):
+        rooms = [(1, 'a', 'B1', 30), (2, 'b', 'B1', 20), (3, 'c', 'B2', 48), (4, 'd', 'B3', 10)]
+        self.assertEqual([room[0] for room in select_rooms(40, rooms, 0.05)], [3])
+        self.assertEqual(select_rooms(0, rooms), [])
+        self.assertIsNone(select_rooms(200, rooms))
+
+    def test_plan_and_generate(self):
+        url = f'/api/exams/{self.exam.id}/plan-rooms/'
+        response = self.client.post(url, {'section_ids': self.section_ids}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['room_ids'], [self.rooms[2].id])
+        self.assertEqual(response.json()['required_seats'], 42)
+
+        response = self.client.post(
+            url, {'section_ids': self.section_ids, 'generate': True}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(SeatAssignment.objects.filter(exam=self.exam, seat__room=self.rooms[2]).count(), 40)
+
+    def test_bad_requests(self):
+        url = f'/api/exams/{self.exam.id}/plan-rooms/'
+        for payload in ({}, {'section_ids': self.section_ids, 'spare_margin': -1},
+                        {'section_ids': self.section_ids, 'spare_margin': 'x'},
+                        {'section_ids': self.section_ids, 'buildings': ['B1'], 'spare_margin': 1}):
+            response = self.client.post(url, payload, content_type='application/json')
+            self.assertEqual(response.status_code, 400, payload)
+        response = self.client.post('/api/exams/999/plan-rooms/', {'section_ids': self.section_ids}, content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+
+class ExamClashTests(WorldTestCase):
+    def setUp(self):
+        super().setUp()
+        self.generate()
+        self.overlapping = make_exam(start=datetime.time(11), end=datetime.time(13), name="Physics")
+
+    def test_clashing_exam_is_refused(self):
+        url = f'/api/exams/{self.overlapping.id}/generate-seats/'
+        payload = {'room_ids': self.room_ids, 'section_ids': self.section_ids}
+        response = self.client.post(url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(len(response.json()['clashes']), 40)
+        self.assertFalse(SeatAssignment.objects.filter(exam=self.overlapping).exists())
+
+        response = self.client.post(url, {**payload, 'allow_clashes': True}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_clash_report(self):
+        generate_seat_plan(self.overlapping, self.room_ids, self.section_ids[:1], allow_clashes=True)
+        # The next day's exam overlaps neither.
+        generate_seat_plan(make_exam(date=datetime.date(2026, 1, 6)), self.room_ids, self.section_ids)
+
+        response = self.client.get('/api/exam-clashes/', {'date_from': '2026-01-05', 'date_to': '2026-01-06'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 14)
+        self.assertEqual({tuple(clash['exams']) for clash in response.json()['clashes']}, {(self.exam.id, self.overlapping.id)})
+        # The index reaches back a day for exams past midnight, but pairs before the range are left out.
+        response = self.client.get('/api/exam-clashes/', {'date_from': '2026-01-06'})
+        self.assertEqual(response.json()['count'], 0)
+
+    def test_clash_written_during_the_search_is_refused(self):
+        place = allocation._place
+
+        def place_while_another_plan_is_written(*args, **kwargs):
+            # Another worker commits a plan of the overlapping exam meanwhile.
+            with mock.patch('exams.allocation._place', place):
+                generate_seat_plan(self.overlapping, self.room_ids, self.section_ids[:1], allow_clashes=True)
+            return place(*args, **kwargs)
+
+        SeatAssignment.objects.filter(exam=self.exam).delete()
+        plan = assignments(self.exam)
+        with mock.patch('exams.allocation._place', side_effect=place_while_another_plan_is_written):
+            with self.assertRaises(allocation.ExamClashError) as caught:
+                self.generate()
+        self.assertEqual(len(caught.exception.clashes), 14)
+        self.assertEqual(assignments(self.exam), plan)
+
+    def test_clash_report_rejects_bad_dates(self):
+        for date in ('2026-13-01', '05/01/2026', 'soon'):
+            response = self.client.get('/api/exam-clashes/', {'date_from': date})
+            self.assertEqual(response.status_code, 400, date)
+
+
+class SeatGridTests(WorldTestCase):
+    def test_layout_and_neighbours(self):
+        grid = SeatGrid.for_rooms(self.room_ids)
+        self.assertEqual(len(grid), 50)
+        self.assertEqual(grid.room_names, {self.rooms[0].id: 'R1', self.rooms[1].id: 'R2'})
+        # R1 is 5 x 6: its first seat has three neighbours, a middle one eight.
+        self.assertEqual((grid.rows[0], grid.cols[0], grid.labels[0]), (1, 1, 'A-01'))
+        self.assertEqual(sorted(grid.labels[grid.neighbors_of(0)].tolist()), ['A-02', 'B-01', 'B-02'])
+        self.assertEqual(len(grid.neighbors_of(7)), 8)
+        self.assertEqual(len(grid.neighbors_of(7, diagonal=False)), 4)
+        # Neighbours never cross into another room.
+        r2 = grid.room_slices[self.rooms[1].id]
+        self.assertTrue((grid.neighbors[r2][grid.neighbors[r2] >= 0] >= r2.start).all())
+
+        a, b = grid.adjacent_pairs(diagonal=False)
+        self.assertEqual(len(a), (5 * 5 + 4 * 6) + (4 * 4 + 3 * 5))
+        grid.occupy([0, 1])
+        self.assertEqual(grid.free_indexes()[0], 2)
+        self.assertEqual(grid.occupancy_map(self.rooms[0].id).shape, (5, 6))
+        self.assertTrue(grid.occupancy_map(self.rooms[0].id)[0, :2].all())
+
+    def test_cached_until_invalidated(self):
+        SeatGrid.for_rooms(self.room_ids)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(SeatGrid.for_rooms(self.room_ids)), 50)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/rooms/{self.rooms[1].id}/')
+        self.assertEqual(len(SeatGrid.for_rooms(self.room_ids)), 30)
+
+    def test_unknown_and_empty_rooms_have_no_seats(self):
+        empty = Room.objects.create(name="Empty", building="B1")
+        self.assertEqual(len(SeatGrid.for_rooms([999, empty.id])), 0)
+
+
+class AsyncViewTests(WorldTestCase):
+    async def test_exports_match_the_sync_ones(self):
+        await sync_to_async(self.generate)()
+        csv_url = f'/api/exams/{self.exam.id}/export-seats.csv'
+        expected = await sync_to_async(lambda: content(self.client.get(csv_url)))()
+        response = await self.async_client.get(f'/api/async{csv_url[4:]}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await acontent(response), expected)
+
+        response = await self.async_client.get(f'/api/async/exams/{self.exam.id}/export-seats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], XLSX_CONTENT_TYPE)
+
+    async def test_exports_of_missing_exams_and_plans(self):
+        self.assertEqual((await self.async_client.get('/api/async/exams/999/export-seats.csv')).status_code, 404)
+        self.assertEqual((await self.async_client.get(f'/api/async/exams/{self.exam.id}/export-seats/')).status_code, 404)
+
+    async def test_upload(self):
+        upload = SimpleUploadedFile('students.xlsx', workbook({'Year 1': (5000, 12, 'G1')}))
+        response = await self.async_client.post('/api/async/upload-excel/', {'file': upload})
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(await Student.objects.filter(roll_no__startswith='50').acount(), 12)
+
+        response = await self.async_client.post('/api/async/upload-excel/', {})
+        self.assertEqual(response.status_code, 400)
+        bad = SimpleUploadedFile('students.xlsx', b'not a workbook')
+        response = await self.async_client.post('/api/async/upload-excel/', {'file': bad})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_access_checks_match_the_sync_views(self):
+        upload = SimpleUploadedFile('students.xlsx', workbook({'Year 1': (5000, 12, 'G1')}))
+        response = await self.async_client.post(
+            '/api/async/upload-excel/', {'file': upload}, headers={'Authorization': 'Bearer not-a-token'})
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+        self.assertFalse(await Student.objects.filter(roll_no__startswith='50').aexists())
+
+        response = await self.async_client.get(
+            f'/api/async/exams/{self.exam.id}/export-seats.csv', headers={'Authorization': 'Bearer not-a-token'})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_preview_exports(self):
+        def preview():
+            response = self.client.post(
+                f'/api/exams/{self.exam.id}/generate-seats/',
+                {'room_ids': self.room_ids, 'section_ids': self.section_ids, 'preview': True},
+                content_type='application/json'
+            )
+            return response.json()['preview']
+
+        token = await sync_to_async(preview)()
+        csv_url = f'/api/exams/{self.exam.id}/export-seats.csv'
+        expected = await sync_to_async(lambda: content(self.client.get(csv_url, {'preview': token})))()
+        response = await self.async_client.get(f'/api/async{csv_url[4:]}', {'preview': token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await acontent(response), expected)
+        # Nothing was saved, so only the preview can be exported.
+        response = await self.async_client.get(f'/api/async/exams/{self.exam.id}/export-seats/', {'preview': token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((await self.async_client.get(f'/api/async/exams/{self.exam.id}/export-seats/')).status_code, 404)
+
+        for url in (f'/api/async{csv_url[4:]}', f'/api/async/exams/{self.exam.id}/export-seats/'):
+            response = await self.async_client.get(url, {'preview': 'expired'})
+            self.assertEqual(response.status_code, 404)
+            self.assertIn('expired', response.json()['error'])
+
+
+class MetricsTests(WorldTestCase):
+    def test_registry_renders_prometheus_text(self):
+        registry = metrics.Registry()
+        counter = registry.counter('jobs_total', 'Jobs.', ('kind',))
+        histogram = registry.histogram('job_seconds', 'Job time.', buckets=(0.1, 1.0))
+        counter.inc('a "quoted"\nname', amount=2)
+        histogram.observe(0.5)
+        lines = registry.render().splitlines()
+        self.assertIn('# TYPE jobs_total counter', lines)
+        self.assertIn('jobs_total{kind="a \\"quoted\\"\\nname"} 2', lines)
+        self.assertIn('job_seconds_bucket{le="0.1"} 0', lines)
+        self.assertIn('job_seconds_bucket{le="1.0"} 1', lines)
+        self.assertIn('job_seconds_bucket{le="+Inf"} 1', lines)
+        self.assertIn('job_seconds_count 1', lines)
+
+    def test_failed_stages_are_counted(self):
+        before = dict(metrics.STAGE_ERRORS._values).get(('test', 'boom'), 0)
+        with self.assertRaises(RuntimeError), metrics.stage('test', 'boom'):
+            raise RuntimeError
+        self.assertEqual(metrics.STAGE_ERRORS._values[('test', 'boom')], before + 1)
+
+    def test_measure(self):
+        with metrics.measure(trace=False) as untraced:
+            block = bytearray(4 * 2 ** 20)
+        self.assertIsNone(untraced.peak_memory_bytes)
+        if metrics.max_rss() is not None:
+            # The process's own peak, not what the block added to it.
+            self.assertGreaterEqual(untraced.peak_rss_bytes, len(block))
+
+        with metrics.measure(trace=True) as traced:
+            block = bytearray(4 * 2 ** 20)
+            del block
+        self.assertGreaterEqual(traced.peak_memory_bytes, 4 * 2 ** 20)
+        self.assertLess(traced.peak_memory_bytes, 8 * 2 ** 20)
+        self.assertEqual(set(traced.as_dict()), {'seconds', 'peak_rss_bytes', 'peak_memory_bytes'})
+
+    def test_endpoint(self):
+        self.generate()
+        content(self.client.get(f'/api/exams/{self.exam.id}/export-seats.csv'))
+        response = self.client.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn('seatplanning_stage_duration_seconds_count{pipeline="generate"', text)
+        self.assertIn('seatplanning_rows_total{pipeline="generate"}', text)
+
+
+class GenerateSeatPlansCommandTests(WorldTestCase):
+    def setUp(self):
+        super().setUp()
+        self.output_dir = tempfile.mkdtemp()
+        self.other = make_exam(date=datetime.date(2026, 1, 6), name="Physics")
+
+    def run_command(self, config, *args):
+        path = os.path.join(self.output_dir, 'config.json')
+        with open(path, 'w') as fh:
+            json.dump(config, fh)
+        out = io.StringIO()
+        call_command('generate_seat_plans', '--config', path, '--output-dir', self.output_dir, '--workers', '1', *args, stdout=out)
+        return out.getvalue()
+
+    def test_plans_and_exports(self):
+        output = self.run_command({
+            str(self.exam.id): {'section_ids': self.section_ids, 'room_ids': self.room_ids},
+            # No rooms: the planner picks them.
+            str(self.other.id): {'section_ids': self.section_ids[:1], 'strategy': 'interleave'},
+        }, '--formats', 'csv')
+        self.assertIn('Planned 2 of 2 exams', output)
+        self.assertEqual(SeatAssignment.objects.filter(exam=self.exam).count(), 40)
+        self.assertEqual(SeatAssignment.objects.filter(exam=self.other).count(), 14)
+        exports = sorted(name for name in os.listdir(self.output_dir) if name.endswith('.csv'))
+        self.assertEqual(exports, [f'{self.exam.id}_Maths_2026-01-05.csv', f'{self.other.id}_Physics_2026-01-06.csv'])
+
+    def test_failures(self):
+        output = self.run_command({str(self.exam.id): {'room_ids': self.room_ids}}, '--formats', 'csv')
+        self.assertIn('FAILED: No section_ids in the config.', output)
+        self.assertIn('Planned 0 of 1 exams', output)
+        with self.assertRaisesMessage(CommandError, 'Unknown export formats: doc'):
+            self.run_command({str(self.exam.id): {'section_ids': self.section_ids}}, '--formats', 'doc')
+        with self.assertRaisesMessage(CommandError, 'No exams to plan.'):
+            self.run_command({'999': {'section_ids': self.section_ids}})
+        with self.assertRaisesMessage(CommandError, 'was not found'):
+            call_command('generate_seat_plans', '--config', os.path.join(self.output_dir, 'missing.json'))
+
+
+class RoomBundleTests(WorldTestCase):
+    rooms = (("Lab 1", "B1", 5, 6), ("Lab_1", "B1", 4, 5))
+
+    def test_one_folder_per_room(self):
+        self.generate()
+        response = self.client.get(f'/api/exams/{self.exam.id}/room-bundle.zip')
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(io.BytesIO(content(response)))
+        # Both room names make the same safe name: the second room's folder gets a suffix.
+        self.assertEqual(sorted(archive.namelist()), [
+            'B1_Lab_1/desk_labels.csv', 'B1_Lab_1/door_list.csv', 'B1_Lab_1_2/desk_labels.csv', 'B1_Lab_1_2/door_list.csv',
+        ])
+        door_lists = [archive.read(name).decode().splitlines() for name in sorted(archive.namelist()) if 'door' in name]
+        self.assertEqual(door_lists[0][0], 'Seat Number,Roll No,Student Name')
+        self.assertEqual(sorted(len(lines) - 1 for lines in door_lists), [10, 30])
+        labels = archive.read('B1_Lab_1/desk_labels.csv').decode().splitlines()
+        self.assertTrue(labels[1].endswith(',Maths,2026-01-05'))
+
+    def test_missing_exam_or_plan(self):
+        self.assertEqual(self.client.get(f'/api/exams/{self.exam.id}/room-bundle.zip').status_code, 404)
+        self.assertEqual(self.client.get('/api/exams/999/room-bundle.zip').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/exams/{self.exam.id}/room-bundle.zip', {'preview': 'nope'}).status_code, 404)
+
+
+class RoomLayoutTests(WorldTestCase):
+    layout = {
+        'format': 'seat-layout/1', 'name': 'Fewa', 'building': 'Nepal Block', 'entrance': [1, 3], 'aisles': [2],
+        'seats': [['A-01', 1, 1], ['A-03', 1, 3], ['B-01', 2, 1], ['B-02', 2, 2]],
+    }
+
+    def test_normalize(self):
+        room = normalize_room(self.layout)
+        self.assertEqual(room['seats'][1], ('A-03', 1, 3))
+        self.assertEqual((room['entrance'], room['aisles']), ([1, 3], [2]))
+        # The old per-sheet script output: seats keyed by number with 0-based coordinates.
+        legacy = normalize_rooms({'Fewa': {'seats': {'A-01': {'x': 0, 'y': 0}, 'A-02': {'x': 0, 'y': 1}}}})
+        self.assertEqual(legacy[0]['name'], 'Fewa')
+        self.assertEqual(legacy[0]['seats'], [('A-01', 1, 1), ('A-02', 1, 2)])
+
+    def test_invalid_layouts(self):
+        for seats, message in (
+            ([['A-01', 1, 1], ['A-01', 1, 2]], 'unique'),
+            ([['A-01', 1, 1], ['A-02', 1, 1]], 'share the same row and column'),
+            ([['A-01', 0, 1]], '1 or more'),
+            ([['A-01', 'x', 1]], 'must be an integer'),
+            ([['A-01', 1]], 'must be [seat number, row, column]'),
+            (None, 'needs a list of seats'),
+        ):
+            with self.assertRaisesMessage(LayoutError, message):
+                normalize_room({'seats': seats})
+
+    def test_apply_and_read_back(self):
+        self.generate()
+        room = self.rooms[0]
+        url = f'/api/rooms/{room.id}/layout/'
+        response = self.client.post(url, self.layout, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['seats'], [['A-01', 1, 1], ['A-03', 1, 3], ['B-01', 2, 1], ['B-02', 2, 2]])
+        room.refresh_from_db()
+        self.assertEqual((room.capacity, room.max_rows, room.max_columns), (4, 2, 3))
+        self.assertEqual((room.entrance_row, room.entrance_col, room.aisles), (1, 3, [2]))
+        # The room's old seats and the assignments on them are gone, and the grid follows.
+        self.assertFalse(SeatAssignment.objects.filter(seat__room=room).exists())
+        self.assertEqual(len(SeatGrid.for_rooms([room.id])), 4)
+
+        upload = SimpleUploadedFile('fewa.json', json.dumps(self.layout).encode())
+        self.assertEqual(self.client.post(url, {'file': upload}).status_code, 201)
+        self.assertEqual(self.client.get(url).json(), response.json())
+
+    def test_rejected_layouts_change_nothing(self):
+        url = f'/api/rooms/{self.rooms[0].id}/layout/'
+        response = self.client.post(url, {'seats': [['A-01', 1, 1], ['A-01', 1, 2]]}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        two_rooms = SimpleUploadedFile('rooms.json', json.dumps({'rooms': [self.layout, self.layout]}).encode())
+        self.assertEqual(self.client.post(url, {'file': two_rooms}).status_code, 400)
+        broken = SimpleUploadedFile('room.json', b'{"seats": [')
+        self.assertEqual(self.client.post(url, {'file': broken}).status_code, 400)
+        self.assertEqual(Seat.objects.filter(room=self.rooms[0]).count(), 30)
+
+
+class GenerationLockTests(WorldTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/exams/{self.exam.id}/generate-seats/'
+        self.payload = {'room_ids': self.room_ids, 'section_ids': self.section_ids}
+
+    def post(self, payload=None, key='generate-maths-1'):
+        return self.client.post(self.url, payload or self.payload, content_type='application/json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_locked_exam_is_refused(self):
+        with locking.exam_lock(self.exam.pk), \
+                mock.patch('exams.allocation.exam_lock', partial(locking.exam_lock, wait=0)):
+            response = self.client.post(self.url, self.payload, content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(SeatAssignment.objects.count(), 0)
+        self.assertEqual(self.client.post(self.url, self.payload, content_type='application/json').status_code, 201)
+
+    def test_idempotent_replay(self):
+        first = self.post()
+        self.assertEqual(first.status_code, 201)
+        plan = assignments(self.exam)
+
+        replay = self.post()
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(assignments(self.exam), plan)
+        # The same key for another request is refused.
+        self.assertEqual(self.post({**self.payload, 'strategy': 'sequential'}).status_code, 422)
+
+    def test_abandoned_request_is_taken_over(self):
+        # A worker died while generating: its record never got a response.
+        IdempotencyRecord.objects.create(key='generate-maths-1', exam=self.exam, request_hash=locking.request_hash(self.payload))
+        with mock.patch('exams.locking.run_idempotent.__defaults__', (0,)):
+            self.assertEqual(self.post().status_code, 409)
+
+        IdempotencyRecord.objects.update(created_at=timezone.now() - datetime.timedelta(seconds=locking.STALE_LOCK_SECONDS + 1))
+        response = self.post()
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(SeatAssignment.objects.filter(exam=self.exam).count(), 40)
+
+    def test_expired_responses_are_pruned_and_not_replayed(self):
+        self.post()
+        IdempotencyRecord.objects.update(created_at=timezone.now() - locking.IDEMPOTENCY_TTL - datetime.timedelta(minutes=1))
+        self.assertFalse(self.post().has_header('Idempotent-Replayed'))
+        IdempotencyRecord.objects.update(created_at=timezone.now() - locking.IDEMPOTENCY_TTL - datetime.timedelta(minutes=1))
+        self.assertEqual(locking.prune_idempotency_records(), 1)
+        self.assertFalse(IdempotencyRecord.objects.exists())
+
+
+@override_settings(**TEST_SETTINGS)
+@mock.patch('exams.routers.replica_configured', return_value=True)
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+
+    def handle(self, request, view, **kwargs):
+        """Runs the view through the middleware like Django's request handler does."""
+        def get_response(request):
+            return middleware.process_view(request, view, (), kwargs) or view(request, **kwargs)
+        middleware = ReplicaRoutingMiddleware(get_response)
+        return middleware(request)
+
+    def route(self, method, **kwargs):
+        """The database a read made while handling the request would use."""
+        used = []
+
+        def view(request, **kwargs):
+            used.append(self.router.db_for_read(Student))
+            return HttpResponse()
+
+        self.handle(getattr(self.factory, method)('/api/'), view, **kwargs)
+        return used[0]
+
+    def test_safe_requests_read_from_the_replica(self, configured):
+        self.assertEqual(self.route('get'), 'replica')
+        self.assertEqual(self.route('post'), 'default')
+        self.assertEqual(self.router.db_for_write(Student), 'default')
+        # Outside a request reads stay on the primary.
+        self.assertEqual(self.router.db_for_read(Student), 'default')
+
+    def test_written_exam_sticks_to_the_primary(self, configured):
+        mark_exam_written(7)
+        self.assertEqual(self.route('get', exam_id=7), 'default')
+        self.assertEqual(self.route('get', exam_id=8), 'replica')
+
+    def test_streamed_body_reads_from_the_replica(self, configured):
+        def rows():
+            yield self.router.db_for_read(Student)
+            with use_primary():
+                yield self.router.db_for_read(Student)
+
+        response = self.handle(self.factory.get('/api/'), lambda request: StreamingHttpResponse(rows()))
+        self.assertEqual(b','.join(response.streaming_content), b'replica,default')
+
+    def test_without_a_replica_everything_reads_from_the_primary(self, configured):
+        configured.return_value = False
+        self.assertEqual(self.route('get'), 'default')
+
+
+class SeatMapTests(WorldTestCase):
+    def setUp(self):
+        super().setUp()
+        self.generate()
+        self.room = self.rooms[0]
+        self.url = f'/api/exams/{self.exam.id}/rooms/{self.room.id}/map'
+
+    def test_map_of_a_room(self):
+        # The grid (with the room's details) is cached by the generation: the exam and the snapshot are read.
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(result['room'], {
+            'id': self.room.id, 'name': 'R1', 'building': 'B1', 'max_rows': 5, 'max_columns': 6,
+            'entrance': None, 'aisles': [],
+        })
+        self.assertEqual(len(result['seats']['row']), 30)
+        seated = SeatAssignment.objects.filter(exam=self.exam, seat__room=self.room)
+        self.assertEqual(result['occupied'], seated.count())
+        first = seated.order_by('seat__row_num', 'seat__col_num').select_related('seat', 'student').first()
+        index = result['seats']['label'].index(first.seat.seat_number)
+        self.assertEqual(result['students']['roll_no'][result['seats']['student'][index]], first.student.roll_no)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).json(), result)
+
+    def test_renamed_room_is_mapped_again(self):
+        self.client.get(self.url)
+        self.room.name = 'Hall 1'
+        self.room.save()
+        self.assertEqual(self.client.get(self.url).json()['room']['name'], 'Hall 1')
+
+    def test_unknown_room_and_exam(self):
+        self.assertEqual(self.client.get(f'/api/exams/{self.exam.id}/rooms/999/map').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/exams/999/rooms/{self.room.id}/map').status_code, 404)
+
+
+class ChangeFeedTests(WorldTestCase):
+    def setUp(self):
+        super().setUp()
+        self.generate()
+        self.feed = f'/api/exams/{self.exam.id}/changes'
+        self.cursor = self.client.get(self.feed).json()['cursor']
+
+    def changes(self, since=None):
+        return self.client.get(self.feed, {'since': self.cursor if since is None else since}).json()
+
+    def test_change_feed_across_reset(self):
+        self.assertTrue(self.client.get(self.feed).json()['reset'])
+        self.client.post(
+            f'/api/exams/{self.exam.id}/swap-seats/', {'roll_nos': ['1000', '1001']}, content_type='application/json'
+        )
+        changes = self.changes()
+        self.assertFalse(changes['reset'])
+        self.assertEqual([change['op'] for change in changes['changes']], ['update', 'update'])
+
+        # Regenerating replaces the plan: a client behind it must refetch, and only sees what followed.
+        self.generate()
+        Student.objects.get(roll_no='1002').delete()
+        changes = self.changes()
+        self.assertTrue(changes['reset'])
+        self.assertEqual([(change['op'], change['roll_no']) for change in changes['changes']], [('delete', '1002')])
+        self.assertEqual(self.changes(changes['cursor']), {
+            'cursor': changes['cursor'], 'reset': False, 'has_more': False, 'changes': [],
+        })
+
+    def test_deleted_seat_is_logged(self):
+        seat_id = SeatAssignment.objects.filter(exam=self.exam).values_list('seat_id', flat=True).first()
+        Seat.objects.get(pk=seat_id).delete()
+        changes = self.changes()
+        self.assertFalse(changes['reset'])
+        self.assertEqual([(change['op'], change['seat_id']) for change in changes['changes']], [('delete', seat_id)])
+
+    def test_replaced_room_is_one_reset(self):
+        room = self.rooms[0]
+        elsewhere = set(SeatAssignment.objects.filter(seat__room=self.rooms[1]).values_list('id', flat=True))
+        layout = {'seats': [['A-01', 1, 1], ['A-02', 1, 2]]}
+        self.assertEqual(self.client.post(f'/api/rooms/{room.id}/layout/', layout, content_type='application/json').status_code, 201)
+        changes = self.changes()
+        self.assertTrue(changes['reset'])
+        self.assertEqual(changes['changes'], [])
+        self.assertFalse(SeatAssignmentChange.objects.filter(exam=self.exam, op=SeatAssignmentChange.DELETE).exists())
+        self.assertFalse(SeatAssignment.objects.filter(seat__room=room).exists())
+        self.assertEqual(set(SeatAssignment.objects.filter(exam=self.exam).values_list('id', flat=True)), elsewhere)
+
+
+class ProgressEventsTests(WorldTestCase):
+    async def stream(self, progress_id):
+        """The events of a progress stream, as dicts of their fields."""
+        response = await self.async_client.get(f'/api/progress/{progress_id}/events')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return [
+            dict(line.split(': ', 1) for line in event.split('\n'))
+            for event in (await acontent(response)).decode().strip().split('\n\n')
+        ]
+
+    async def test_events_of_a_generation(self):
+        response = await sync_to_async(self.client.post)(
+            f'/api/exams/{self.exam.id}/generate-seats/',
+            {'room_ids': self.room_ids, 'section_ids': self.section_ids},
+            content_type='application/json', HTTP_X_PROGRESS_ID='gen-1',
+        )
+        self.assertEqual(response.status_code, 201)
+        retry, event = await self.stream('gen-1')
+        self.assertEqual(retry, {'retry': '1000'})
+        self.assertEqual(event['event'], 'progress')
+        state = json.loads(event['data'])
+        self.assertEqual((state['kind'], state['status'], state['id']), ('generate', progress.DONE, 'gen-1'))
+        self.assertEqual(event['id'], str(state['seq']))
+
+    async def test_failed_job_ends_the_stream(self):
+        await sync_to_async(progress.tracker('import-1', 'import').fail)("Bad workbook")
+        state = json.loads((await self.stream('import-1'))[-1]['data'])
+        self.assertEqual((state['status'], state['message']), (progress.FAILED, "Bad workbook"))
+
+    async def test_unknown_and_invalid_ids(self):
+        with mock.patch('exams.async_views.ProgressEvents.wait_for_start', 0), \
+                mock.patch('exams.async_views.ProgressEvents.poll_interval', 0):
+            event = (await self.stream('nobody'))[-1]
+        self.assertEqual((event['event'], json.loads(event['data'])), ('error', {'error': 'Unknown progress id.'}))
+        response = await self.async_client.get('/api/progress/not%20valid/events')
+        self.assertEqual(response.status_code, 400)
+        response = await sync_to_async(self.client.post)(
+            f'/api/exams/{self.exam.id}/generate-seats/', {}, content_type='application/json', HTTP_X_PROGRESS_ID='a' * 65,
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class WorkbookValidationTests(WorldTestCase):
+    def upload(self, sheets, **data):
+        upload = SimpleUploadedFile('students.xlsx', workbook(sheets))
+        return self.client.post('/api/upload-excel/', {'file': upload, **data})
+
+    def issues(self, report, kind):
+        return [(issue['sheet'], issue['row'], issue['code']) for issue in report[kind]]
+
+    def test_import_queries_do_not_grow_with_rows(self):
+        def rows(start, count):
+            return [
+                {'University ID': str(start + i), 'Student Name': f'Student {i}', 'Group': f'G{i % 3}', 'Course': 'BIT'}
+                for i in range(count)
+            ]
+
+        # The first import also creates the groups' classes and sections.
+        queries = []
+        for start, count in ((4000, 3), (5000, 9), (6000, 90)):
+            with CaptureQueriesContext(connection) as context:
+                # One existing student is skipped in each.
+                created = import_student_sheets([(1, rows(start, count) + rows(1000, 1))])
+            self.assertEqual(created, count)
+            queries.append(len(context.captured_queries))
+        self.assertEqual(queries[1], queries[2])
+
+    def test_dry_run_reports_without_importing(self):
+        response = self.upload({
+            'Year 1': (5000, 12, 'G1'), 'Year 2': (1038, 4, 'G2'), 'Notes': {'Remark': ['Exam week']},
+        }, dry_run='true')
+        self.assertEqual(response.status_code, 200)
+        report = response.json()['report']
+        self.assertTrue(report['valid'])
+        self.assertEqual(report['summary'], {
+            'sheets': 3, 'student_sheets': 2, 'rows': 16, 'existing_students': 2, 'new_students': 14,
+            'errors': 0, 'warnings': 3,
+        })
+        self.assertEqual(report['skipped_sheets'], [{'sheet': 'Notes', 'reason': 'The sheet name is not in the format "Year N".'}])
+        self.assertEqual(self.issues(report, 'warnings'), [
+            ('Year 2', 2, 'existing_student'), ('Year 2', 3, 'existing_student'), ('Year 1', 2, 'unknown_course'),
+        ])
+        self.assertEqual(Student.objects.count(), 40)
+
+    def test_errors_block_the_import(self):
+        response = self.upload({
+            'Year 1': {
+                'University ID': ['7001', '7002', '70 03', '7004'],
+                'Student Name': ['Asha', None, 'Bina', 'x' * 101],
+                'Group': ['G1'] * 4,
+                'Course': ['BIT'] * 4,
+            },
+            'Year 2': {'University ID': ['7001'], 'Student Name': ['Asha'], 'Group': ['G1'], 'Course': ['BIT']},
+        })
+        self.assertEqual(response.status_code, 400)
+        report = response.json()['report']
+        self.assertFalse(report['valid'])
+        self.assertEqual(self.issues(report, 'errors'), [
+            ('Year 1', 3, 'missing'), ('Year 1', 5, 'too_long'), ('Year 1', 4, 'malformed_id'), ('Year 2', 2, 'duplicate_id'),
+        ])
+        self.assertEqual(report['errors'][-1]['message'], "University ID also appears in Year 1 row 2.")
+        self.assertFalse(Student.objects.filter(roll_no__startswith='70').exists())
+
+    def test_workbook_without_student_sheets(self):
+        response = self.upload({'Notes': {'Remark': ['Exam week']}})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.issues(response.json()['report'], 'errors'), [(None, None, 'no_students')])
+
+
+class ArchiveTests(WorldTestCase):
+    url = '/api/archive-exams/'
+
+    def test_archived_plan_reads_back(self):
+        self.generate()
+        csv_url = f'/api/exams/{self.exam.id}/export-seats.csv'
+        before = content(self.client.get(csv_url))
+
+        response = self.client.post(self.url, {'before': '2026-02-01', 'dry_run': True}, content_type='application/json')
+        self.assertEqual([e['exam_id'] for e in response.json()['exams']], [self.exam.id])
+        self.assertTrue(SeatAssignment.objects.filter(exam=self.exam).exists())
+
+        response = self.client.post(self.url, {'before': '2026-02-01'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['archived'][0]['rows'], 40)
+        self.assertFalse(SeatAssignment.objects.filter(exam=self.exam).exists())
+        self.assertEqual(content(self.client.get(csv_url)), before)
+
+        # An archived plan can no longer be changed.
+        response = self.client.post(
+            f'/api/exams/{self.exam.id}/generate-seats/',
+            {'room_ids': self.room_ids, 'section_ids': self.section_ids}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('archived', response.json()['error'])
+
+    def test_invalid_date(self):
+        for before in ('', 'last year', '2026-13-01'):
+            response = self.client.post(self.url, {'before': before}, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+
+class AdminTests(WorldTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_changelists_do_not_query_per_row(self):
+        self.generate()
+        url = '/admin/exams/seatassignment/'
+        many = self.changelist_queries(url)
+        SeatAssignment.objects.filter(pk__in=SeatAssignment.objects.values('pk')[:35]).delete()
+        self.assertEqual(self.changelist_queries(url), many)
+        few = self.changelist_queries('/admin/exams/student/')
+        section = self.sections[0]
+        Student.objects.bulk_create(
+            Student(name=f"Extra {i}", roll_no=f"{2000 + i}", section=section, class_name=section.class_name,
+                    year=section.year, faculty=section.faculty)
+            for i in range(30)
+        )
+        self.assertEqual(self.changelist_queries('/admin/exams/student/'), few)
+
+        response = self.client.get('/admin/exams/student/', {'q': '100'})
+        self.assertEqual([student.roll_no for student in response.context['cl'].result_list], [f'{1000 + i}' for i in range(10)])
+
+    def test_big_tables_show_an_estimated_count(self):
+        with mock.patch('exams.admin._estimated_rows', return_value=250000):
+            response = self.client.get('/admin/exams/student/')
+            self.assertEqual(response.context['cl'].result_count, 250000)
+            # A search is counted exactly.
+            self.assertEqual(self.client.get('/admin/exams/student/', {'q': '1001'}).context['cl'].result_count, 1)
+
+    def test_exam_actions(self):
+        url = '/admin/exams/exam/'
+        response = self.client.post(url, {'action': 'regenerate_plans', '_selected_action': [self.exam.pk]}, follow=True)
+        self.assertIn(f"{self.exam} has no seat plan to regenerate.", [str(m) for m in response.context['messages']])
+
+        self.generate()
+        response = self.client.post(url, {'action': 'export_plans', '_selected_action': [self.exam.pk]})
+        self.assertEqual(response['Content-Type'], XLSX_CONTENT_TYPE)
+        response = self.client.post(url, {'action': 'regenerate_plans', '_selected_action': [self.exam.pk]}, follow=True)
+        self.assertIn('seated 40 students', ' '.join(str(m) for m in response.context['messages']))
+
+    def test_deleting_assignments_logs_them(self):
+        self.generate()
+        pks = list(SeatAssignment.objects.values_list('pk', flat=True)[:2])
+        self.client.post('/admin/exams/seatassignment/', {'action': 'delete_selected', '_selected_action': pks, 'post': 'yes'})
+        self.assertEqual(SeatAssignment.objects.filter(exam=self.exam).count(), 38)
+        deleted = SeatAssignmentChange.objects.filter(exam=self.exam, op=SeatAssignmentChange.DELETE)
+        self.assertEqual(sorted(deleted.values_list('assignment_id', flat=True)), sorted(pks))
+
+
+class StrategyTests(SimpleTestCase):
+    """Every strategy on a full 12 x 10 room of 120 students in 4 classes."""
+
+    def setUp(self):
+        import numpy as np
+
+        rows, cols = np.divmod(np.arange(120), 10)
+        index = {(r, c): i for i, (r, c) in enumerate(zip(rows.tolist(), cols.tolist()))}
+        offsets = [(0, -1), (0, 1), (-1, 0), (1, 0), (-1, -1), (-1, 1), (1, -1), (1, 1)]
+        neighbors = np.array([
+            [index.get((r + dr, c + dc), -1) for dr, dc in offsets] for r, c in zip(rows.tolist(), cols.tolist())
+        ])
+        self.seats = strategies.Seats(rows + 1, cols + 1, np.zeros(120, dtype=np.int64), neighbors)
+        # Roll number order keeps classmates together, as imports do.
+        class_ids = np.repeat(np.arange(4), 30)
+        self.students = strategies.Students(np.arange(120), class_ids, class_ids)
+
+    def penalty(self, name, seed=0):
+        _, _, seat_indexes, score = strategies.run_candidate(name, seed, self.seats, self.students)
+        self.assertEqual(sorted(seat_indexes.tolist()), list(range(120)))
+        return score
+
+    def test_strategies(self):
+        # Blocks of three rows per class: only the rows where two classes meet have mixed pairs.
+        self.assertEqual(self.penalty('sequential'), (12 * 9 + 11 * 10 + 0.5 * 2 * 11 * 9) - 3 * (10 + 0.5 * 2 * 9))
+        self.assertLess(self.penalty('random'), self.penalty('sequential'))
+        # Four classes colour a full room without any classmates side by side, front to back or diagonally.
+        self.assertEqual(self.penalty('interleave'), 0)
+        self.assertLess(self.penalty('anti_adjacency'), self.penalty('random'))
+
+    def test_best_of_keeps_the_lowest(self):
+        best, scored = strategies.best_of(self.seats, self.students, time_budget=1, workers=1, seed=0)
+        self.assertEqual(best[3], min(candidate['penalty'] for candidate in scored))
+        self.assertEqual(best[3], 0)
+        with self.assertRaisesMessage(ValueError, "Unknown strategy 'zigzag'"):
+            strategies.best_of(self.seats, self.students, ['zigzag'])
+
+    def test_candidates_stop_at_their_deadline(self):
+        self.assertIsNone(strategies.run_candidate('random', 0, self.seats, self.students, deadline=0))
+        with mock.patch('exams.strategies.time.time', side_effect=[0, 10]):
+            # Out of time by the time the greedy loop checks.
+            self.assertIsNone(strategies.run_candidate('anti_adjacency', 0, self.seats, self.students, deadline=5))
+        # With no time left the first candidate still finishes, and is the only one.
+        best, scored = strategies.best_of(self.seats, self.students, ['random', 'anti_adjacency'], time_budget=0, workers=1)
+        self.assertEqual([candidate['strategy'] for candidate in scored], ['random'])
+
+    @mock.patch('exams.strategies.DEFAULT_WORKERS', 2)
+    @mock.patch('exams.strategies._pool', None)
+    def test_searches_share_one_pool(self):
+        for _ in range(2):
+            best, scored = strategies.best_of(self.seats, self.students, ['sequential', 'interleave'], time_budget=30, seed=0)
+            self.assertEqual((best[0], best[3]), ('interleave', 0))
+        pool = strategies._shared_pool()
+        self.addCleanup(pool.shutdown)
+        self.assertIs(strategies._shared_pool(), pool)
+        self.assertEqual(pool._max_workers, 2)
+
+
+class PlanQualityTests(WorldTestCase):
+    def quality(self):
+        response = self.client.get(f'/api/exams/{self.exam.id}/quality')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_scores_of_a_plan(self):
+        Room.objects.filter(pk=self.rooms[0].pk).update(entrance_row=1, entrance_col=1)
+        result = self.generate(strategy='sequential')
+        quality = self.quality()
+        self.assertEqual((quality['students'], quality['seats'], quality['utilization']), (40, 50, 0.8))
+        # The allocation scores plans the same way.
+        self.assertEqual(quality['penalty'], result['penalty'])
+        r1, r2 = quality['rooms']
+        self.assertEqual((r1['name'], r1['students'], r1['utilization'], r1['classes']), ('R1', 30, 1.0, 3))
+        self.assertEqual((r2['name'], r2['students']), ('R2', 10))
+        self.assertGreater(r1['entrance_distance']['mean'], 0)
+        self.assertIsNone(r2['entrance_distance'])
+        self.assertEqual(quality['buildings'], [{'building': 'B1', 'seats': 50, 'students': 40, 'utilization': 0.8}])
+        self.assertEqual(sum(room['same_class_pairs'] for room in quality['rooms']),
+                         quality['same_class_pairs']['orthogonal'] + quality['same_class_pairs']['diagonal'])
+
+        # Cached until the plan changes.
+        with self.assertNumQueries(1):
+            self.assertEqual(self.quality(), quality)
+        self.generate(strategy='interleave')
+        self.assertLess(self.quality()['penalty'], quality['penalty'])
+
+    def test_exam_without_a_plan(self):
+        quality = self.quality()
+        self.assertEqual((quality['students'], quality['seats'], quality['utilization'], quality['rooms']), (0, 0, None, []))
+        self.assertEqual(self.client.get('/api/exams/999/quality').status_code, 404)
+
+
+class PlanPreviewTests(WorldTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/exams/{self.exam.id}/generate-seats/'
+        self.payload = {'room_ids': self.room_ids, 'section_ids': self.section_ids}
+        self.csv_url = f'/api/exams/{self.exam.id}/export-seats.csv'
+
+    def preview(self):
+        response = self.client.post(self.url, {**self.payload, 'preview': True}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['preview']
+
+    def commit(self, token):
+        return self.client.post(self.url, {'preview_token': token}, content_type='application/json')
+
+    def test_preview_and_commit(self):
+        self.generate(strategy='sequential')
+        plan = assignments(self.exam)
+
+        token = self.preview()
+        self.assertEqual(assignments(self.exam), plan)
+        previewed = content(self.client.get(self.csv_url, {'preview': token}))
+        self.assertNotEqual(previewed, content(self.client.get(self.csv_url)))
+
+        self.assertEqual(self.commit(token).status_code, 201)
+        self.assertEqual(content(self.client.get(self.csv_url)), previewed)
+        # A preview is saved once.
+        self.assertEqual(self.commit(token).status_code, 400)
+
+    def test_expired_and_stale_previews(self):
+        with mock.patch('exams.previews.PREVIEW_TIMEOUT', 0):
+            token = self.preview()
+        self.assertEqual(self.client.get(self.csv_url, {'preview': token}).status_code, 404)
+        response = self.commit(token)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('expired', response.json()['error'])
+
+        token = self.preview()
+        Student.objects.get(roll_no='1005').delete()
+        response = self.commit(token)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('students of the selected sections changed', response.json()['error'])
+        self.assertFalse(SeatAssignment.objects.filter(exam=self.exam).exists())
+
+
+class UploadCacheTests(SimpleTestCase):
+    def setUp(self):
+        import pandas as pd
+
+        directory = tempfile.mkdtemp()
+        settings = override_settings(UPLOAD_CACHE_DIR=directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.directory = directory
+        self.frame = pd.DataFrame({
+            'University ID': pd.array(['1001', None], dtype='string'),
+            'Student Name': ['Asha', None],
+            '_row': [2, 3],
+        })
+        self.parsed = []
+
+    def parse(self, path):
+        self.parsed.append(path)
+        return self.frame, {'sheets': ['Year 1']}
+
+    def cached_parse(self, data=b'workbook', version=1):
+        return uploads.cached_parse(io.BytesIO(data), 'students', self.parse, version)
+
+    def test_parsed_once_per_content_and_version(self):
+        from pandas.testing import assert_frame_equal
+
+        digest, frame, meta, cached = self.cached_parse()
+        self.assertFalse(cached)
+        digest_again, frame, meta, cached = self.cached_parse()
+        self.assertEqual((digest_again, cached, meta, len(self.parsed)), (digest, True, {'sheets': ['Year 1']}, 1))
+        # Missing values and dtypes survive the round trip.
+        assert_frame_equal(frame, self.frame)
+
+        self.assertFalse(self.cached_parse(version=2)[3])
+        self.assertFalse(self.cached_parse(b'another workbook')[3])
+        self.assertEqual(len(self.parsed), 3)
+        self.assertFalse(any(name.endswith('.pkl') for name in os.listdir(self.directory)))
+
+    def test_unreadable_frame_is_parsed_again(self):
+        digest = self.cached_parse()[0]
+        with open(uploads._frame_path(digest, 'students', 1), 'wb') as fh:
+            fh.write(b'\x80 not a frame')
+        self.assertFalse(self.cached_parse()[3])
+        self.assertTrue(self.cached_parse()[3])
+
+    def test_unused_uploads_expire(self):
+        self.cached_parse()
+        long_ago = datetime.datetime.now().timestamp() - uploads.DEFAULT_TTL - 60
+        for name in os.listdir(self.directory):
+            os.utime(os.path.join(self.directory, name), (long_ago, long_ago))
+        uploads.trim()
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertFalse(self.cached_parse()[3])
+
+
+@override_settings(**TEST_SETTINGS)
+class ChunkedImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.data = workbook({'Year 1': (1000, 25, 'G1'), 'Year 2': (2000, 18, 'G2')})
+
+    def upload(self, data=None, **fields):
+        return self.client.post('/api/upload-excel/', {
+            'file': SimpleUploadedFile('students.xlsx', data or self.data), **fields,
+        })
+
+    def failed_run(self):
+        bulk_create = Student.objects.bulk_create
+        chunks = []
+
+        def fail_fourth_chunk(objs, *args, **kwargs):
+            chunks.append(len(objs))
+            if len(chunks) == 4:
+                raise RuntimeError("disk full")
+            return bulk_create(objs, *args, **kwargs)
+
+        with mock.patch.object(Student.objects, 'bulk_create', side_effect=fail_fourth_chunk):
+            response = self.upload(chunked='true', chunk_size=10)
+        self.assertEqual(response.status_code, 400)
+        return response.json()['import_run']
+
+    def test_resume_from_checkpoint(self):
+        run = self.failed_run()
+        # The first sheet's three chunks were committed before the second sheet failed.
+        self.assertEqual(run['status'], ImportRun.FAILED)
+        self.assertEqual((run['sheet_index'], run['row_offset'], run['rows_done']), (0, 25, 25))
+        self.assertEqual(Student.objects.count(), 25)
+
+        response = self.upload(resume=run['id'])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['import_run']['status'], ImportRun.COMPLETED)
+        self.assertEqual(Student.objects.count(), 43)
+        self.assertEqual(Student.objects.values('roll_no').distinct().count(), 43)
+
+        # A finished run cannot be resumed again.
+        self.assertEqual(self.upload(resume=run['id']).status_code, 409)
+
+    def test_resume_needs_the_same_workbook(self):
+        run = self.failed_run()
+        response = self.upload(workbook({'Year 1': (1000, 30, 'G1')}), resume=run['id'])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('another workbook', response.json()['error'])
+        self.assertEqual(self.upload(resume=9999).status_code, 404)
+        self.assertEqual(Student.objects.count(), 25)
@@ -0,0 +1,213 @@
+"""
+Content-addressed cache of uploaded workbooks and the rows parsed from them.
+
+Every upload is stored under the SHA-256 of its content, with the
+normalised DataFrame parsed from it (and a little JSON metadata) next to it,
+so re-uploading the same workbook, which registrars do after a failed or
+uncertain attempt, skips openpyxl entirely. Frames are written as Parquet
+when pyarrow (or fastparquet) is installed and as JSON with their column
+dtypes otherwise. Parsed frames are keyed by the parser's version as well,
+so a parser that changes what it returns doesn't get old frames back, and
+a file that can't be read for any reason is parsed again.
+
+Workbooks hold student data, so uploads not used for UPLOAD_CACHE_TTL
+seconds are deleted (with everything parsed from them) before the next
+upload is looked up. The cache is also trimmed to UPLOAD_CACHE_MAX_BYTES
+after every write, dropping the uploads used least recently first.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+from . import metrics
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_TTL = 24 * 60 * 60
+CHUNK_SIZE = 1024 * 1024
+
+
+def _cache_dir():
+    return Path(getattr(settings, 'UPLOAD_CACHE_DIR', Path(settings.MEDIA_ROOT) / 'upload_cache'))
+
+
+def _parquet_available():
+    for engine in ('pyarrow', 'fastparquet'):
+        try:
+            __import__(engine)
+            return True
+        except ImportError:
+            pass
+    return False
+
+
+FRAME_SUFFIX = '.parquet' if _parquet_available() else '.frame.json'
+
+
+def _chunks(file):
+    """The content of a path or a (Django) file object, in chunks."""
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'rb') as fh:
+            while chunk := fh.read(CHUNK_SIZE):
+                yield chunk
+        return
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    if hasattr(file, 'chunks'):
+        yield from file.chunks(CHUNK_SIZE)
+    else:
+        while chunk := file.read(CHUNK_SIZE):
+            yield chunk
+    if hasattr(file, 'seek'):
+        file.seek(0)
+
+
+def store_upload(file):
+    """
+    Stores the content of a path or file object under its SHA-256, in one
+    pass, unless it is there already. Returns (digest, path of the copy).
+    """
+    directory = _cache_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    sha = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=directory, prefix='.upload-', delete=False) as tmp:
+        for chunk in _chunks(file):
+            sha.update(chunk)
+            tmp.write(chunk)
+    digest = sha.hexdigest()
+    path = directory / f"{digest}.upload"
+    if path.exists():
+        os.unlink(tmp.name)
+        _touch(path)
+    else:
+        os.replace(tmp.name, path)
+        trim()
+    return digest, path
+
+
+def _touch(path):
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+def _frame_path(digest, kind, version):
+    return _cache_dir() / f"{digest}.{kind}.v{version}{FRAME_SUFFIX}"
+
+
+def _meta_path(digest, kind, version):
+    return _cache_dir() / f"{digest}.{kind}.v{version}.json"
+
+
+def _read_frame(path):
+    import pandas as pd
+
+    if FRAME_SUFFIX == '.parquet':
+        return pd.read_parquet(path)
+    stored = json.loads(path.read_text())
+    return pd.DataFrame(stored['data'], columns=stored['columns']).astype(stored['dtypes'])
+
+
+def _write_frame(frame, fh):
+    if FRAME_SUFFIX == '.parquet':
+        frame.to_parquet(fh, index=False)
+        return
+    fh.write(json.dumps({
+        'columns': frame.columns.tolist(),
+        'dtypes': {column: str(dtype) for column, dtype in frame.dtypes.items()},
+        'data': json.loads(frame.to_json(orient='values')),
+    }).encode())
+
+
+def load_frame(digest, kind, version=1):
+    """The frame of `kind` parsed from the upload, with its metadata, or (None, None)."""
+    frame_path, meta_path = _frame_path(digest, kind, version), _meta_path(digest, kind, version)
+    try:
+        frame = _read_frame(frame_path)
+        meta = json.loads(meta_path.read_text())
+    except Exception:
+        # Missing, truncated or written by another version of pandas: parse the upload again.
+        return None, None
+    for path in (frame_path, meta_path, _cache_dir() / f"{digest}.upload"):
+        _touch(path)
+    return frame, meta
+
+
+def _write_atomically(path, write):
+    """Writes a file through a temporary file next to it, so readers never see it half written."""
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f".{path.name}-", delete=False) as tmp:
+        try:
+            write(tmp)
+        except BaseException:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+    os.replace(tmp.name, path)
+
+
+def save_frame(digest, kind, frame, meta, version=1):
+    """Stores a frame parsed from the upload and its JSON metadata."""
+    _write_atomically(_frame_path(digest, kind, version), lambda fh: _write_frame(frame, fh))
+    # The frame is only used once its metadata exists, so write that last.
+    _write_atomically(
+        _meta_path(digest, kind, version), lambda fh: fh.write(json.dumps(meta, default=str).encode())
+    )
+    trim()
+
+
+def cached_parse(file, kind, parse, version=1):
+    """
+    The result of parse(path) -> (frame, meta) for the content of `file`
+    (a path or file object), computed once per content, kind and parser
+    version. Bump the version whenever the parser's output changes.
+    Returns (digest, frame, meta, cached).
+    """
+    trim()
+    with metrics.stage('upload_cache', 'hash'):
+        digest, path = store_upload(file)
+    frame, meta = load_frame(digest, kind, version)
+    if frame is not None:
+        metrics.UPLOAD_CACHE.inc(kind, 'hit')
+        return digest, frame, meta, True
+    metrics.UPLOAD_CACHE.inc(kind, 'miss')
+    frame, meta = parse(path)
+    save_frame(digest, kind, frame, meta, version)
+    return digest, frame, meta, False
+
+
+def trim(max_bytes=None, ttl=None):
+    """
+    Deletes the uploads not used for `ttl` seconds (UPLOAD_CACHE_TTL by
+    default), then the ones used least recently until the cache holds at
+    most `max_bytes` (UPLOAD_CACHE_MAX_BYTES by default), with their frames.
+    """
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'UPLOAD_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+    if ttl is None:
+        ttl = getattr(settings, 'UPLOAD_CACHE_TTL', DEFAULT_TTL)
+    directory = _cache_dir()
+    if not directory.exists():
+        return
+    # Files are grouped by the digest their name starts with; temporary files start with a dot.
+    groups = {}
+    for entry in os.scandir(directory):
+        if entry.is_file() and not entry.name.startswith('.'):
+            groups.setdefault(entry.name.split('.', 1)[0], []).append((entry.path, entry.stat()))
+
+    total = sum(stat.st_size for files in groups.values() for _, stat in files)
+    by_last_use = sorted(groups.values(), key=lambda files: max(stat.st_mtime for _, stat in files))
+    expired_before = time.time() - ttl
+    for files in by_last_use:
+        if total <= max_bytes and max(stat.st_mtime for _, stat in files) >= expired_before:
+            break
+        for path, stat in files:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= stat.st_size
@@ -4,7 +4,13 @@ from . import views
 from .views import (
     FacultyViewSet, YearViewSet, ClassViewSet, SectionViewSet,
     StudentViewSet, ExamViewSet, SeatAssignmentViewSet,
-    ExcelUploadView, SeatAssignmentGenerator, ExportSeatAssignments, RoomViewSet
+    ExcelUploadView, SeatAssignmentGenerator, ExportSeatAssignments, RoomViewSet,
+    RoomPlanner, ExamClashReport, ExportSeatAssignmentsCSV, MetricsView,
+    ExportRoomBundle, SeatLookup, RoomSeatMap, SeatAssignmentChanges, SwapSeats, ArchiveExams,
+    PlanQuality, ImportRunDetail
+)
+from .async_views import (
+    AsyncExcelUploadView, AsyncExportSeatAssignments, AsyncExportSeatAssignmentsCSV, ProgressEvents
 )
 
 router = DefaultRouter()
@@ -20,6 +26,24 @@ router.register(r'rooms', RoomViewSet)
 urlpatterns = [
     path('', include(router.urls)),
     path('upload-excel/', ExcelUploadView.as_view(), name='excel-upload'),
+    path('import-runs/<int:run_id>/', ImportRunDetail.as_view(), name='import-run'),
     path('exams/<int:exam_id>/generate-seats/', SeatAssignmentGenerator.as_view(), name='generate-seats'),
     path('exams/<int:exam_id>/export-seats/', ExportSeatAssignments.as_view(), name='export-seats'),  
+    path('exams/<int:exam_id>/plan-rooms/', RoomPlanner.as_view(), name='plan-rooms'),
+    path('exam-clashes/', ExamClashReport.as_view(), name='exam-clashes'),
+    path('archive-exams/', ArchiveExams.as_view(), name='archive-exams'),
+    path('exams/<int:exam_id>/export-seats.csv', ExportSeatAssignmentsCSV.as_view(), name='export-seats-csv'),
+    path('exams/<int:exam_id>/room-bundle.zip', ExportRoomBundle.as_view(), name='room-bundle'),
+    path('exams/<int:exam_id>/seat/<str:roll_no>/', SeatLookup.as_view(), name='seat-lookup'),
+    path('exams/<int:exam_id>/rooms/<int:room_id>/map', RoomSeatMap.as_view(), name='room-seat-map'),
+    path('exams/<int:exam_id>/quality', PlanQuality.as_view(), name='plan-quality'),
+    path('exams/<int:exam_id>/changes', SeatAssignmentChanges.as_view(), name='seat-assignment-changes'),
+    path('exams/<int:exam_id>/swap-seats/', SwapSeats.as_view(), name='swap-seats'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
+
+    # Async variants of the I/O heavy views, meant to be served through asgi.py
+    path('async/upload-excel/', AsyncExcelUploadView.as_view(), name='async-excel-upload'),
+    path('async/exams/<int:exam_id>/export-seats/', AsyncExportSeatAssignments.as_view(), name='async-export-seats'),
+    path('async/exams/<int:exam_id>/export-seats.csv', AsyncExportSeatAssignmentsCSV.as_view(), name='async-export-seats-csv'),
+    path('progress/<str:progress_id>/events', ProgressEvents.as_view(), name='progress-events'),
 ]
\ No newline at end of file
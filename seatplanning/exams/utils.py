@@ -1,63 +1,127 @@
-import pandas as pd
+import logging
+
+from . import metrics
+from .grid import invalidate_seat_grid
+from .layouts import is_layout_file, read_layout_file, apply_layout
 from .models import Seat
+from .seatmaps import bump_room_plans
+from .uploads import cached_parse
+
+logger = logging.getLogger(__name__)
+
+# Version of read_layout_workbook's output in the upload cache; bump it when the output changes.
+LAYOUT_PARSER_VERSION = 1
+
+
+def read_layout_workbook(path):
+    """
+    Reads the seat layout of every sheet of an Excel workbook: cells that
+    hold text with a '-' are seats and a cell reading "Entrance" marks the
+    door, at 1-based row and column numbers. Returns a DataFrame with the
+    sheet, seat_number, row_num and col_num of every seat, and metadata with
+    the sheet names in order and the entrance of each sheet that has one.
+    """
+    # Imported here rather than at the top: Room.save imports this module.
+    import pandas as pd
+
+    frames = []
+    entrances = {}
+    sheets = pd.read_excel(path, sheet_name=None, header=None, dtype=object)
+    for sheet_name, df in sheets.items():
+        # stack() walks the non-empty cells row by row, like reading the sheet.
+        cells = df.stack()
+        text = cells[cells.map(lambda value: isinstance(value, str))].astype(str)
+        entrance = text[text.str.strip().str.lower() == 'entrance']
+        if len(entrance):
+            r_idx, c_idx = entrance.index[-1]
+            entrances[sheet_name] = [int(r_idx) + 1, int(c_idx) + 1]
+        seats = text[text.str.contains('-', regex=False)]
+        frames.append(pd.DataFrame({
+            'sheet': sheet_name,
+            'seat_number': seats.str.strip().to_numpy(),
+            # r_idx and c_idx are 0-based, so add 1 for human-readable row/col numbers
+            'row_num': seats.index.get_level_values(0).to_numpy(dtype='int64') + 1,
+            'col_num': seats.index.get_level_values(1).to_numpy(dtype='int64') + 1,
+        }))
+    frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        {'sheet': [], 'seat_number': [], 'row_num': [], 'col_num': []}
+    )
+    return frame, {'sheets': list(sheets), 'entrances': entrances}
+
 
 def parse_room_template_and_create_seats(room_instance):
     """
-    Reads an Excel template file, parses the seat layout,
-    and creates/updates the Seat objects for the given Room.
+    Reads an Excel or JSON/MessagePack layout template, parses the seat
+    layout, and creates/updates the Seat objects for the given Room.
+    Excel templates are parsed once per content (see exams.uploads), and a
+    template whose seats match the room's current ones leaves the seats,
+    and the seat plans in the room, alone.
     """
     if not room_instance.template_file:
-        print(f"No template file for room: {room_instance.name}")
+        logger.info("No template file for room: %s", room_instance.name)
+        return
+
+    if is_layout_file(room_instance.template_file.name):
+        _apply_layout_template(room_instance)
         return
 
     try:
-        # Clear any existing seats for this room to ensure a fresh import
-        room_instance.seats.all().delete()
-
-        # Use pandas to read the specific sheet; openpyxl is used under the hood
-        # We assume the layout is on the first sheet of the Excel file
-        df = pd.read_excel(room_instance.template_file.path, header=None)
-        
-        seats_to_create = []
-        max_row, max_col = 0, 0
-
-        # Iterate through each cell of the DataFrame
-        for r_idx, row_series in df.iterrows():
-            for c_idx, cell_value in enumerate(row_series):
-                # Check if the cell is not empty and looks like a seat number (contains a '-')
-                if pd.notna(cell_value) and isinstance(cell_value, str) and '-' in cell_value:
-                    seat_number = cell_value.strip()
-                    # r_idx and c_idx are 0-based, so add 1 for human-readable row/col numbers
-                    row_num = r_idx + 1
-                    col_num = c_idx + 1
-                    
-                    seats_to_create.append(
-                        Seat(
-                            room=room_instance,
-                            seat_number=seat_number,
-                            row_num=row_num,
-                            col_num=col_num
-                        )
-                    )
-                    
-                    if row_num > max_row: max_row = row_num
-                    if col_num > max_col: max_col = col_num
-
-        # Create all seats in a single, efficient database query
-        Seat.objects.bulk_create(seats_to_create)
-        
+        with metrics.stage('room_import', 'parse'):
+            # We assume the layout is on the first sheet of the Excel file
+            _, seats, meta, _ = cached_parse(
+                room_instance.template_file.path, 'room_layout', read_layout_workbook, LAYOUT_PARSER_VERSION
+            )
+            sheet = meta['sheets'][0] if meta['sheets'] else None
+            seats = seats[seats['sheet'] == sheet]
+            entrance_row, entrance_col = meta['entrances'].get(sheet) or (None, None)
+            layout = list(zip(seats['seat_number'], seats['row_num'].tolist(), seats['col_num'].tolist()))
+
+        if set(layout) == set(room_instance.seats.values_list('seat_number', 'row_num', 'col_num')) \
+                and len(layout) == room_instance.capacity:
+            logger.info("The template of '%s' has not changed its %d seats.", room_instance.name, len(layout))
+        else:
+            # Clear any existing seats for this room to ensure a fresh import
+            bump_room_plans(room_instance.pk)
+            room_instance.seats.all().delete()
+            with metrics.stage('room_import', 'insert'):
+                # Create all seats in a single, efficient database query
+                Seat.objects.bulk_create([
+                    Seat(room=room_instance, seat_number=seat_number, row_num=row_num, col_num=col_num)
+                    for seat_number, row_num, col_num in layout
+                ])
+
         # Update the parent Room's calculated fields and save it
-        room_instance.capacity = len(seats_to_create)
-        room_instance.max_rows = max_row
-        room_instance.max_columns = max_col
+        room_instance.capacity = len(layout)
+        room_instance.max_rows = max((row_num for _, row_num, _ in layout), default=0)
+        room_instance.max_columns = max((col_num for _, _, col_num in layout), default=0)
+        room_instance.entrance_row, room_instance.entrance_col = entrance_row, entrance_col
         # We need to save without triggering this function again to avoid a loop
         # so we use ._base_manager.update() which bypasses the save() method
         type(room_instance)._base_manager.filter(pk=room_instance.pk).update(
             capacity=room_instance.capacity,
             max_rows=room_instance.max_rows,
-            max_columns=room_instance.max_columns
+            max_columns=room_instance.max_columns,
+            entrance_row=entrance_row,
+            entrance_col=entrance_col
         )
-        print(f"Successfully parsed template for '{room_instance.name}'. Found {room_instance.capacity} seats.")
+        invalidate_seat_grid(room_instance.pk)
+        logger.info("Successfully parsed template for '%s'. Found %d seats.", room_instance.name, room_instance.capacity)
+
+    except Exception as e:
+        logger.exception("ERROR parsing template for room '%s': %s", room_instance.name, e)
+
+
+def _apply_layout_template(room_instance):
+    """Loads the seats of a room from a JSON/MessagePack layout template."""
+    try:
+        with metrics.stage('room_import', 'parse'):
+            layouts = read_layout_file(room_instance.template_file.path)
+        if len(layouts) != 1:
+            raise ValueError(f"A room template must describe exactly one room, found {len(layouts)}.")
+
+        with metrics.stage('room_import', 'insert'):
+            apply_layout(room_instance, layouts[0])
+        logger.info("Successfully parsed template for '%s'. Found %d seats.", room_instance.name, room_instance.capacity)
 
     except Exception as e:
-        print(f"ERROR parsing template for room '{room_instance.name}': {e}")
\ No newline at end of file
+        logger.exception("ERROR parsing template for room '%s': %s", room_instance.name, e)
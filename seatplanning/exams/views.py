@@ -1,23 +1,68 @@
+import logging
+
 from django.shortcuts import render
-import pandas as pd
-import random
 from rest_framework import viewsets, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django.db import transaction
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views import View
+from django.utils.dateparse import parse_date
 from rest_framework import generics
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 
 from .models import Student
 from .serializers import StudentSerializer
-from .models import Faculty, Year, Class, Section, Student, Exam, SeatAssignment, Room, Seat
+from .models import (
+    Faculty, Year, Class, Section, Student, Exam, SeatAssignment, Room, Seat, SeatAssignmentChange, SeatPlanEntry,
+    ImportRun
+)
 from .serializers import (
     FacultySerializer, YearSerializer, ClassSerializer, 
     SectionSerializer, StudentSerializer, ExamSerializer, 
-    SeatAssignmentSerializer, ExcelUploadSerializer, RoomSerializer, SeatSerializer
+    SeatAssignmentSerializer, ExcelUploadSerializer, RoomSerializer, SeatSerializer, ImportRunSerializer
+)
+from . import locking, metrics, progress, strategies
+from .allocation import commit_preview, generate_seat_plan, swap_seats, SeatPlanError, ExamClashError
+from .archiving import archivable_exams, archive_exam
+from .bundles import iter_room_bundle
+from .changes import changes_since, record_changes, DEFAULT_CHANGES_LIMIT, MAX_CHANGES_LIMIT
+from .clashes import find_clashes
+from .exporting import assignment_rows, has_plan, write_workbook, iter_csv, XLSX_CONTENT_TYPE
+from .importing import (
+    validate_student_workbook, import_student_sheets, import_student_sheets_chunked,
+    start_import_run, claim_import_run, ImportRunError, ImportRunBusy
 )
+from .layouts import (
+    read_layout_file, normalize_room, apply_layout, dump_room,
+    encode as encode_layout, LayoutError
+)
+from .planner import plan_rooms, DEFAULT_SPARE_MARGIN
+from .previews import load_preview
+from .quality import plan_quality
+from .seatmaps import build_seat_map, bump_plan_version, seat_map
+from .snapshots import refresh_assignments
+
+logger = logging.getLogger(__name__)
+
+
+def requested_preview(request, exam_id=None):
+    """
+    The plan preview named by ?preview=<token>, as (preview, None); (None,
+    None) without one and (None, a 404 response) if it has expired.
+    """
+    token = request.query_params.get('preview')
+    if not token:
+        return None, None
+    preview = load_preview(token, exam_id)
+    if preview is None:
+        return None, Response(
+            {"error": "This preview has expired or belongs to another exam. Generate it again."},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    return preview, None
+
 
 # --- NO CHANGES TO ANY OF THESE VIEWSETS ---
 class StudentList(generics.ListCreateAPIView):
@@ -71,12 +116,12 @@ class ClassViewSet(viewsets.ModelViewSet):
 class SectionViewSet(viewsets.ModelViewSet):
     queryset = Section.objects.all()
     serializer_class = SectionSerializer
-    filter_fields = ['class_name', 'year', 'faculty']
+    filterset_fields = ['class_name', 'year', 'faculty']
 
 class StudentViewSet(viewsets.ModelViewSet):
     queryset = Student.objects.all()
     serializer_class = StudentSerializer
-    filter_fields = ['section', 'class_name', 'year', 'faculty']
+    filterset_fields = ['section', 'class_name', 'year', 'faculty']
 
 class ExamViewSet(viewsets.ModelViewSet):
     queryset = Exam.objects.all()
@@ -85,217 +130,628 @@ class ExamViewSet(viewsets.ModelViewSet):
 class SeatAssignmentViewSet(viewsets.ModelViewSet):
     queryset = SeatAssignment.objects.all()
     serializer_class = SeatAssignmentSerializer
-    filter_fields = ['exam', 'student']
+    filterset_fields = ['exam', 'student']
+
+    def list(self, request, *args, **kwargs):
+        # ?preview=<token> lists a generated plan that is not written yet (ids are null).
+        preview, error = requested_preview(request)
+        if error:
+            return error
+        if preview is None:
+            return super().list(request, *args, **kwargs)
+        students = Student.objects.select_related(
+            'section__class_name__faculty', 'section__class_name__year',
+            'class_name__faculty', 'class_name__year', 'year', 'faculty',
+        ).in_bulk(preview['student_ids'].tolist())
+        seats = Seat.objects.select_related('room').in_bulk(preview['seat_ids'].tolist())
+        assignments = [
+            SeatAssignment(exam_id=preview['exam_id'], student=students[student_id], seat=seats[seat_id])
+            for student_id, seat_id in zip(preview['student_ids'].tolist(), preview['seat_ids'].tolist())
+        ]
+        return Response(self.get_serializer(assignments, many=True).data)
+
+    # Manual edits change the plan: its snapshot must be refreshed, cached
+    # seat maps of the exam rebuilt and polling clients told through the change log.
+    @transaction.atomic
+    def perform_create(self, serializer):
+        serializer.save()
+        bump_plan_version([serializer.instance.exam_id])
+        refresh_assignments([serializer.instance.id])
+        record_changes(SeatAssignmentChange.INSERT, [serializer.instance.id])
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        old_exam_id = serializer.instance.exam_id
+        if old_exam_id != serializer.validated_data.get('exam', serializer.instance.exam).id:
+            # Moving an assignment to another exam deletes it from the old one.
+            record_changes(SeatAssignmentChange.DELETE, [serializer.instance.id])
+            serializer.save()
+            refresh_assignments([serializer.instance.id])
+            record_changes(SeatAssignmentChange.INSERT, [serializer.instance.id])
+        else:
+            serializer.save()
+            refresh_assignments([serializer.instance.id])
+            record_changes(SeatAssignmentChange.UPDATE, [serializer.instance.id])
+        bump_plan_version({old_exam_id, serializer.instance.exam_id})
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        record_changes(SeatAssignmentChange.DELETE, [instance.id])
+        exam_id, assignment_id = instance.exam_id, instance.id
+        instance.delete()
+        refresh_assignments([assignment_id])
+        bump_plan_version([exam_id])
 
 # --- THIS IS THE ONLY SECTION THAT HAS BEEN MODIFIED ---
 class ExcelUploadView(APIView):
     """
     Handles the bulk import of student data from a multi-sheet Excel file.
+
+    With "chunked" the students are committed chunk_size rows at a time
+    under an import run that records a checkpoint after every chunk; if the
+    import fails, upload the same file with "resume": <run id> to carry on
+    from the checkpoint.
     """
     parser_classes = (MultiPartParser, FormParser)
 
-    @transaction.atomic
     def post(self, request, *args, **kwargs):
         serializer = ExcelUploadSerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         file = serializer.validated_data['file']
+
+        # Progress is streamed from /api/progress/<id>/events when the client sends an id
+        try:
+            tracker = progress.tracker(progress.progress_id_from(request), 'import')
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            # Use pandas ExcelFile to get access to all sheets
-            xls = pd.ExcelFile(file)
-            total_students_created = 0
-
-            # --- NEW: Loop through each sheet in the uploaded Excel file ---
-            for sheet_name in xls.sheet_names:
-                df = pd.read_excel(xls, sheet_name=sheet_name)
-                df = df.where(pd.notnull(df), None)
-                df.columns = df.columns.str.strip()
-
-                # Basic validation to ensure the sheet has student data
-                required_columns = ['University ID', 'Student Name', 'Group', 'Course']
-                if not all(col in df.columns for col in required_columns):
-                    # If a sheet doesn't have these columns, skip it (e.g., an info sheet)
-                    continue
+            # Every sheet is checked before anything is written
+            report = validate_student_workbook(file, tracker)
+            if not report.is_valid:
+                message = f"The workbook has {report.error_count} errors. Nothing was imported."
+                tracker.fail(message)
+                return Response({"error": message, "report": report.as_dict()}, status=status.HTTP_400_BAD_REQUEST)
 
-                # Determine the Year for all students in this sheet from the sheet's name
-                try:
-                    # Extracts the number from a sheet name like "Year 1", "Year 2", etc.
-                    year_value = int(sheet_name.split(' ')[-1])
-                    year_obj, _ = Year.objects.get_or_create(year_value=year_value)
-                except (ValueError, IndexError):
-                    # If the sheet name is not in the format "Year X", we can't process it.
-                    # We could return an error or just skip it. Let's skip.
-                    continue
+            if serializer.validated_data['dry_run']:
+                message = (f"The workbook is valid: {report.row_count - report.existing_count} new students "
+                           f"would be imported from {len(report.sheets)} sheets.")
+                tracker.finish(message)
+                return Response({"message": message, "report": report.as_dict()}, status=status.HTTP_200_OK)
 
-                students_to_create_in_sheet = []
-                for _, row in df.iterrows():
-                    roll_no = str(row['University ID'])
-                    
-                    if Student.objects.filter(roll_no=roll_no).exists():
-                        continue
-                    
-                    # Look up or create the foreign key objects
-                    faculty_obj, _ = Faculty.objects.get_or_create(name=row['Course'])
-                    
-                    # A Class is unique by its name, faculty, and year
-                      # A Class is unique by its name, faculty, AND year. All must be in the main query.
-                    class_obj, _ = Class.objects.get_or_create(
-                        name=row['Group'],
-                        faculty=faculty_obj,
-                        year=year_obj
-                    )
-                    
-                    # --- MODIFIED: The same fix applies to Section ---
-                    section_obj, _ = Section.objects.get_or_create(
-                        name='A', # Using 'A' as a default section
-                        class_name=class_obj,
-                        faculty=faculty_obj,
-                        year=year_obj
-                    )
-
-                    students_to_create_in_sheet.append(
-                        Student(
-                            name=row['Student Name'],
-                            roll_no=roll_no,
-                            faculty=faculty_obj,
-                            year=year_obj,
-                            class_name=class_obj,
-                            section=section_obj
-                        )
-                    )
-                
-                Student.objects.bulk_create(students_to_create_in_sheet)
-                total_students_created += len(students_to_create_in_sheet)
+            resume = serializer.validated_data.get('resume')
+            if resume is None and report.existing_count == report.row_count:
+                # Every student exists already (e.g. the same workbook was imported before): nothing to write.
+                message = f"All {report.row_count} students in the workbook already exist. Nothing was imported."
+                tracker.finish(message)
+                return Response({"message": message, "report": report.as_dict()}, status=status.HTTP_200_OK)
 
-            return Response(
-                {"message": f"Successfully imported {total_students_created} new students from {len(xls.sheet_names)} sheets."},
-                status=status.HTTP_201_CREATED
-            )
+            if resume is not None or serializer.validated_data['chunked']:
+                if resume is not None:
+                    run = claim_import_run(resume, report)
+                else:
+                    run = start_import_run(report, serializer.validated_data['chunk_size'])
+                total_students_created = import_student_sheets_chunked(run, report, tracker)
+
+                message = f"Successfully imported {total_students_created} new students from {report.sheet_count} sheets."
+                tracker.finish(message)
+                return Response(
+                    {"message": message, "report": report.as_dict(), "import_run": ImportRunSerializer(run).data},
+                    status=status.HTTP_201_CREATED
+                )
 
+            total_students_created = import_student_sheets(report.sheets, tracker)
+
+            message = f"Successfully imported {total_students_created} new students from {report.sheet_count} sheets."
+            tracker.finish(message)
+            return Response({"message": message, "report": report.as_dict()}, status=status.HTTP_201_CREATED)
+
+        except ImportRun.DoesNotExist:
+            tracker.fail("Import run not found")
+            return Response({"error": "Import run not found"}, status=status.HTTP_404_NOT_FOUND)
+        except ImportRunError as e:
+            tracker.fail(str(e))
+            data = {"error": str(e)}
+            if e.run is not None:
+                data["import_run"] = ImportRunSerializer(e.run).data
+            return Response(data, status=status.HTTP_409_CONFLICT if isinstance(e, ImportRunBusy) else status.HTTP_400_BAD_REQUEST)
         except Exception as e:
+            logger.exception("Unexpected error in %s", type(self).__name__)
+            metrics.VIEW_ERRORS.inc(type(self).__name__)
+            tracker.fail(str(e))
             return Response({"error": f"An unexpected error occurred: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
 
 # --- NO CHANGES TO ANY OF THESE VIEWS ---
 class SeatAssignmentGenerator(APIView):
     """
-    Generates random seat assignments by filling the available seats
-    from the selected rooms with the students for the exam.
+    Generates seat assignments by placing the students for the exam in the
+    available seats of the selected rooms with an allocation strategy.
+
+    With "preview": true the plan is only cached under a preview token that
+    the assignment list, seat map and export endpoints accept as
+    ?preview=<token>; send {"preview_token": <token>} to write it.
+
+    Send an Idempotency-Key header to make retries safe: a repeated request
+    with the same key gets the first response back instead of reshuffling
+    the plan.
+    """
+    def post(self, request, exam_id, *args, **kwargs):
+        # Progress is streamed from /api/progress/<id>/events when the client sends an id
+        try:
+            tracker = progress.tracker(progress.progress_id_from(request), 'generate')
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            exam = Exam.objects.get(id=exam_id)
+
+            key = request.headers.get('Idempotency-Key')
+            if not key:
+                status_code, data = self._generate(exam, request.data, tracker)
+                progress.report(tracker, status_code, data)
+                return Response(data, status=status_code)
+
+            if len(key) > 255:
+                return Response({"error": "The Idempotency-Key header is too long."}, status=status.HTTP_400_BAD_REQUEST)
+            status_code, data, replayed = locking.run_idempotent(
+                key, exam.id, request.data, lambda: self._generate(exam, request.data, tracker)
+            )
+            progress.report(tracker, status_code, data)
+            response = Response(data, status=status_code)
+            if replayed:
+                response['Idempotent-Replayed'] = 'true'
+            return response
+
+        except Exam.DoesNotExist:
+            tracker.fail("Exam not found")
+            return Response({"error": "Exam not found"}, status=status.HTTP_404_NOT_FOUND)
+        except locking.IdempotencyConflict as e:
+            tracker.fail(str(e))
+            return Response({"error": str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        except locking.ExamLocked as e:
+            tracker.fail(str(e))
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        except Exception as e:
+            logger.exception("Unexpected error in %s", type(self).__name__)
+            metrics.VIEW_ERRORS.inc(type(self).__name__)
+            tracker.fail(str(e))
+            return Response({"error": f"An unexpected error occurred: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def _generate(self, exam, payload, tracker=progress.NO_PROGRESS):
+        """Validates the payload and builds the plan. Returns (status code, response data)."""
+        if payload.get('preview_token'):
+            try:
+                result = commit_preview(exam, payload['preview_token'], progress=tracker)
+            except ExamClashError as e:
+                return status.HTTP_409_CONFLICT, {"error": str(e), "clashes": e.clashes}
+            except SeatPlanError as e:
+                return status.HTTP_400_BAD_REQUEST, {"error": str(e)}
+            return status.HTTP_201_CREATED, {
+                "message": f"Successfully assigned {result['assigned']} students to seats.", "stats": result
+            }
+
+        # --- Get data from the React frontend's payload ---
+        room_ids = payload.get('room_ids', [])
+        section_ids = payload.get('section_ids', []) # Get the section IDs
+
+        # --- Validation ---
+        if not room_ids:
+            return status.HTTP_400_BAD_REQUEST, {"error": "No room IDs provided"}
+        if not section_ids:
+            return status.HTTP_400_BAD_REQUEST, {"error": "No section IDs provided to select students."}
+        try:
+            time_budget = float(payload.get('time_budget', strategies.DEFAULT_TIME_BUDGET))
+        except (TypeError, ValueError):
+            return status.HTTP_400_BAD_REQUEST, {"error": "time_budget must be a number of seconds."}
+        if not 0 < time_budget <= strategies.MAX_TIME_BUDGET:
+            return status.HTTP_400_BAD_REQUEST, {
+                "error": f"time_budget must be more than 0 and at most {strategies.MAX_TIME_BUDGET:g} seconds."
+            }
+
+        try:
+            result = generate_seat_plan(
+                exam, room_ids, section_ids,
+                allow_clashes=bool(payload.get('allow_clashes', False)),
+                progress=tracker,
+                # "best" tries the "strategies" listed (all by default) and keeps the best plan.
+                strategy=payload.get('strategy', strategies.DEFAULT_STRATEGY),
+                candidates=payload.get('strategies'),
+                time_budget=time_budget,
+                preview=bool(payload.get('preview', False)),
+            )
+        except ExamClashError as e:
+            return status.HTTP_409_CONFLICT, {"error": str(e), "clashes": e.clashes}
+        except SeatPlanError as e:
+            return status.HTTP_400_BAD_REQUEST, {"error": str(e)}
+
+        if 'preview' in result:
+            return status.HTTP_200_OK, {
+                "message": f"Previewing the seats of {result['assigned']} students. Nothing was saved.",
+                "preview": result.pop('preview'),
+                "expires_in": result.pop('expires_in'),
+                "stats": result,
+            }
+        return status.HTTP_201_CREATED, {
+            "message": f"Successfully assigned {result['assigned']} students to seats.", "stats": result
+        }
+
+class RoomPlanner(APIView):
+    """
+    Picks the rooms for an exam's sections: as few buildings and rooms as
+    possible while keeping a spare margin of free seats. With "generate": true
+    the chosen rooms are passed straight to seat generation.
     """
-    @transaction.atomic
     def post(self, request, exam_id, *args, **kwargs):
         try:
             exam = Exam.objects.get(id=exam_id)
-            
-            # --- Get data from the React frontend's payload ---
-            room_ids = request.data.get('room_ids', [])
-            section_ids = request.data.get('section_ids', []) # Get the section IDs
 
-            # --- Validation ---
-            if not room_ids:
-                return Response({"error": "No room IDs provided"}, status=status.HTTP_400_BAD_REQUEST)
+            section_ids = request.data.get('section_ids', [])
             if not section_ids:
                 return Response({"error": "No section IDs provided to select students."}, status=status.HTTP_400_BAD_REQUEST)
 
-            # --- THE FIX: Replace the placeholder with this logic ---
-            # Filter the Student model to get only the students from the selected sections.
-            students_to_assign = list(Student.objects.filter(section__id__in=section_ids))
-            
-            # Now, shuffle the CORRECT list of students
-            random.shuffle(students_to_assign)
-            
-            # --- The rest of your logic remains the same ---
-            
-            # Get all available seats from the selected rooms, ordered consistently
-            available_seats = list(Seat.objects.filter(room__id__in=room_ids).order_by('room__name', 'row_num', 'col_num'))
-            
-            if len(available_seats) < len(students_to_assign):
+            try:
+                spare_margin = float(request.data.get('spare_margin', DEFAULT_SPARE_MARGIN))
+            except (TypeError, ValueError):
+                return Response({"error": "spare_margin must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+            if spare_margin < 0:
+                return Response({"error": "spare_margin cannot be negative."}, status=status.HTTP_400_BAD_REQUEST)
+
+            plan = plan_rooms(
+                section_ids,
+                spare_margin=spare_margin,
+                room_ids=request.data.get('room_ids'),
+                buildings=request.data.get('buildings'),
+            )
+            if not plan['students']:
+                return Response({"error": "No students found in the selected sections."}, status=status.HTTP_400_BAD_REQUEST)
+            if not plan['room_ids']:
                 return Response({
-                    "error": f"Insufficient capacity. {len(students_to_assign)} students require seating, but only {len(available_seats)} seats are available in the selected rooms."
+                    "error": f"Insufficient capacity. {plan['required_seats']} seats are required, "
+                             f"but the available rooms cannot provide them.",
+                    **plan
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            # Clear any previous assignments for this exam
-            SeatAssignment.objects.filter(exam=exam).delete()
-            
-            assignments_to_create = []
-            for i, student in enumerate(students_to_assign):
-                seat_to_assign = available_seats[i]
-                assignments_to_create.append(SeatAssignment(
-                    student=student,
-                    exam=exam,
-                    seat=seat_to_assign
-                ))
-            
-            SeatAssignment.objects.bulk_create(assignments_to_create)
-            
+            if not request.data.get('generate'):
+                return Response(plan, status=status.HTTP_200_OK)
+
+            result = generate_seat_plan(
+                exam, plan['room_ids'], section_ids,
+                allow_clashes=bool(request.data.get('allow_clashes', False))
+            )
             return Response(
-                {"message": f"Successfully assigned {len(assignments_to_create)} students to seats."},
+                {"message": f"Successfully assigned {result['assigned']} students to seats.", "stats": result, **plan},
                 status=status.HTTP_201_CREATED
             )
-        
+
         except Exam.DoesNotExist:
             return Response({"error": "Exam not found"}, status=status.HTTP_404_NOT_FOUND)
+        except ExamClashError as e:
+            return Response({"error": str(e), "clashes": e.clashes}, status=status.HTTP_409_CONFLICT)
+        except SeatPlanError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except locking.ExamLocked as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
         except Exception as e:
+            logger.exception("Unexpected error in %s", type(self).__name__)
+            metrics.VIEW_ERRORS.inc(type(self).__name__)
+            return Response({"error": f"An unexpected error occurred: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class ExamClashReport(APIView):
+    """
+    Lists every student seated in two exams that overlap in time.
+    Accepts optional ?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD filters.
+    """
+    def get(self, request, *args, **kwargs):
+        try:
+            date_from = self._date(request.query_params.get('date_from'))
+            date_to = self._date(request.query_params.get('date_to'))
+        except ValueError:
+            return Response({"error": "Dates must be in YYYY-MM-DD format."}, status=status.HTTP_400_BAD_REQUEST)
+
+        clashes = find_clashes(date_from, date_to)
+        return Response({"count": len(clashes), "clashes": clashes}, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def _date(value):
+        """The date, or None when no value is given. parse_date returns None for
+        malformed dates and raises ValueError for impossible ones; both are errors here."""
+        if not value:
+            return None
+        date = parse_date(value)
+        if date is None:
+            raise ValueError(value)
+        return date
+
+class ArchiveExams(APIView):
+    """
+    Moves the seat plans of exams dated before a cutoff out of the database
+    into compressed archive files: {"before": "YYYY-MM-DD", "dry_run": false}.
+    Archived plans can still be exported but no longer edited.
+    """
+
+    def post(self, request, *args, **kwargs):
+        try:
+            before = parse_date(str(request.data.get('before') or ''))
+        except ValueError:
+            before = None
+        if before is None:
+            return Response({"error": "before must be a date in YYYY-MM-DD format."}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+
+        try:
+            exams = list(archivable_exams(before))
+            if dry_run:
+                return Response({
+                    "message": f"{len(exams)} exam(s) would be archived.",
+                    "exams": [{"exam_id": e.id, "name": e.name, "date": e.date} for e in exams],
+                }, status=status.HTTP_200_OK)
+
+            locking.prune_idempotency_records()
+            archived, skipped = [], []
+            for exam in exams:
+                try:
+                    plan = archive_exam(exam)
+                except locking.ExamLocked as e:
+                    skipped.append({"exam_id": exam.id, "name": exam.name, "error": str(e)})
+                    continue
+                archived.append({"exam_id": exam.id, "name": exam.name, "date": exam.date, "rows": plan.row_count})
+            return Response({
+                "message": f"Archived {len(archived)} exam(s) and {sum(a['rows'] for a in archived)} seat assignments.",
+                "archived": archived,
+                "skipped": skipped,
+            }, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            logger.exception("Unexpected error in %s", type(self).__name__)
+            metrics.VIEW_ERRORS.inc(type(self).__name__)
             return Response({"error": f"An unexpected error occurred: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class ExportSeatAssignments(APIView):
-    """Exports seat assignments to a comprehensive Excel file."""
+    """Exports seat assignments (or a plan preview) to a comprehensive Excel file."""
     
     def get(self, request, exam_id, *args, **kwargs):
         try:
             exam = Exam.objects.get(id=exam_id)
+            preview, error = requested_preview(request, exam.id)
+            if error:
+                return error
             
-            # This is an optimized query to fetch all related data efficiently.
-            assignments = SeatAssignment.objects.filter(exam=exam).select_related(
-                'student', 'student__section', 'student__class_name', 
-                'student__year', 'student__faculty',
-                'seat', 'seat__room'  # <-- Fetches seat and room data
-            )
+            rows = assignment_rows(exam, preview and preview['entries'])
             
-            if not assignments.exists():
+            if not rows:
                 return Response({"message": "No seat assignments found for this exam."}, status=status.HTTP_404_NOT_FOUND)
-
-            # --- THE FIX IS HERE ---
-            # We access the data by following the relationships: a.seat.room.name
-            data = [{
-                'Exam Name': exam.name,
-                'Exam Date': exam.date,
-                'Building': a.seat.room.building,
-                'Room Name': a.seat.room.name,      # Correct: a -> seat -> room -> name
-                'Seat Number': a.seat.seat_number,    # Correct: a -> seat -> seat_number
-                'Student Name': a.student.name,
-                'Roll No': a.student.roll_no,
-                'Section': str(a.student.section),
-                'Class': str(a.student.class_name),
-                'Year': str(a.student.year),
-                'Faculty': str(a.student.faculty)
-            } for a in assignments]
             
-            df = pd.DataFrame(data)
-            
-            response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+            response = HttpResponse(content_type=XLSX_CONTENT_TYPE)
             response['Content-Disposition'] = f'attachment; filename="seat_assignments_{exam.name}.xlsx"'
-            
-            # This logic creates a separate, sorted sheet for each room
-            with pd.ExcelWriter(response, engine='openpyxl') as writer:
-                room_names = sorted(df['Room Name'].unique())
-                for room_name in room_names:
-                    room_df = df[df['Room Name'] == room_name].copy()
-                    room_df.sort_values(by='Seat Number', inplace=True)
-                    room_df.to_excel(writer, index=False, sheet_name=room_name)
+            write_workbook(rows, response)
             
             return response
         
         except Exam.DoesNotExist:
             return Response({"error": "Exam not found"}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
+            logger.exception("Unexpected error in %s", type(self).__name__)
+            metrics.VIEW_ERRORS.inc(type(self).__name__)
             return Response({"error": f"An unexpected error occurred: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+class ExportSeatAssignmentsCSV(APIView):
+    """Streams seat assignments (or a plan preview) as CSV, row by row, for large exams."""
+
+    def get(self, request, exam_id, *args, **kwargs):
+        try:
+            exam = Exam.objects.get(id=exam_id)
+        except Exam.DoesNotExist:
+            return Response({"error": "Exam not found"}, status=status.HTTP_404_NOT_FOUND)
+        preview, error = requested_preview(request, exam.id)
+        if error:
+            return error
+
+        response = StreamingHttpResponse(iter_csv(exam, preview and preview['entries']), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="seat_assignments_{exam.name}.csv"'
+        return response
+
+class ExportRoomBundle(APIView):
+    """
+    Streams a ZIP with a door list and desk labels for each room of the exam.
+    The download starts with the first room instead of after the whole exam.
+    Accepts ?preview=<token> like the other exports.
+    """
+
+    def get(self, request, exam_id, *args, **kwargs):
+        try:
+            exam = Exam.objects.get(id=exam_id)
+        except Exam.DoesNotExist:
+            return Response({"error": "Exam not found"}, status=status.HTTP_404_NOT_FOUND)
+        preview, error = requested_preview(request, exam.id)
+        if error:
+            return error
+        if preview is None and not has_plan(exam):
+            return Response({"message": "No seat assignments found for this exam."}, status=status.HTTP_404_NOT_FOUND)
+
+        response = StreamingHttpResponse(
+            iter_room_bundle(exam, preview and preview['entries']), content_type='application/zip'
+        )
+        response['Content-Disposition'] = f'attachment; filename="room_lists_{exam.name}.zip"'
+        return response
+
+class SeatLookup(APIView):
+    """
+    Finds a student's seat in an exam by roll number, in a single indexed
+    query on the plan snapshot.
+    This is the endpoint hit by students on exam day, so it reads from the
+    read replica when one is configured.
+    """
+
+    def get(self, request, exam_id, roll_no, *args, **kwargs):
+        seat = SeatPlanEntry.objects.filter(exam_id=exam_id, roll_no=roll_no).values(
+            'roll_no', 'student_name', 'seat_number', 'row_num', 'col_num',
+            'room_name', 'building', 'exam__name', 'exam__date', 'exam__start_time',
+        ).first()
+        if seat is None:
+            return Response({"error": "No seat found for this roll number in this exam."}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({
+            "roll_no": seat['roll_no'],
+            "student_name": seat['student_name'],
+            "exam": seat['exam__name'],
+            "date": seat['exam__date'],
+            "start_time": seat['exam__start_time'],
+            "room": seat['room_name'],
+            "building": seat['building'],
+            "seat_number": seat['seat_number'],
+            "row": seat['row_num'],
+            "column": seat['col_num'],
+        }, status=status.HTTP_200_OK)
+
+class RoomSeatMap(APIView):
+    """
+    Returns one room's grid for an exam in a compact columnar form: parallel
+    row/col/label/student arrays for every seat, where student is an index
+    into a separate student table (null for an empty seat). Built from a
+    single query and cached until the exam's plan changes. ?preview=<token>
+    maps a plan preview instead.
+    """
+
+    def get(self, request, exam_id, room_id, *args, **kwargs):
+        try:
+            exam = Exam.objects.only('id', 'plan_version').get(id=exam_id)
+        except Exam.DoesNotExist:
+            return Response({"error": "Exam not found"}, status=status.HTTP_404_NOT_FOUND)
+        preview, error = requested_preview(request, exam.id)
+        if error:
+            return error
+
+        if preview is not None:
+            result = build_seat_map(exam.id, room_id, preview['entries'])
+            result = result and {'exam_id': exam.id, 'preview': request.query_params['preview'], **result}
+        else:
+            result = seat_map(exam, room_id)
+        if result is None:
+            return Response({"error": "Room not found or it has no seats."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(result, status=status.HTTP_200_OK)
+
+class PlanQuality(APIView):
+    """
+    Scores an exam's seat plan: neighbours sharing a class or section, the
+    class mix of each room, room and building utilisation and the distance
+    of students from room entrances. Cached until the exam's plan changes.
+    """
+
+    def get(self, request, exam_id, *args, **kwargs):
+        try:
+            exam = Exam.objects.only('id', 'plan_version').get(id=exam_id)
+        except Exam.DoesNotExist:
+            return Response({"error": "Exam not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(plan_quality(exam), status=status.HTTP_200_OK)
+
+class ImportRunDetail(APIView):
+    """The progress of a chunked student import: its status, checkpoint and the students created so far."""
+
+    def get(self, request, run_id, *args, **kwargs):
+        try:
+            run = ImportRun.objects.get(id=run_id)
+        except ImportRun.DoesNotExist:
+            return Response({"error": "Import run not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ImportRunSerializer(run).data, status=status.HTTP_200_OK)
+
+class SeatAssignmentChanges(APIView):
+    """
+    Returns the seat assignment changes of an exam after ?since=<cursor>,
+    so polling clients only download what changed. Poll again with the
+    returned cursor. When "reset" is true the plan was replaced after the
+    cursor: fetch it again, then apply the returned changes.
+    """
+
+    def get(self, request, exam_id, *args, **kwargs):
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get('limit', DEFAULT_CHANGES_LIMIT))
+        except ValueError:
+            return Response({"error": "since and limit must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        if since < 0 or not 0 < limit <= MAX_CHANGES_LIMIT:
+            return Response(
+                {"error": f"since cannot be negative and limit must be between 1 and {MAX_CHANGES_LIMIT}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not Exam.objects.filter(id=exam_id).exists():
+            return Response({"error": "Exam not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(changes_since(exam_id, since, limit), status=status.HTTP_200_OK)
+
+class SwapSeats(APIView):
+    """Swaps the seats of two students in an exam: {"roll_nos": ["1001", "1002"]}."""
+
+    def post(self, request, exam_id, *args, **kwargs):
+        try:
+            exam = Exam.objects.get(id=exam_id)
+
+            roll_nos = request.data.get('roll_nos', [])
+            if not isinstance(roll_nos, list) or len(roll_nos) != 2:
+                return Response({"error": "Provide exactly two roll numbers in roll_nos."}, status=status.HTTP_400_BAD_REQUEST)
+
+            first, second = swap_seats(exam, str(roll_nos[0]), str(roll_nos[1]))
+            return Response(
+                {"message": f"Swapped the seats of {roll_nos[0]} and {roll_nos[1]}.",
+                 "assignments": SeatAssignmentSerializer([first, second], many=True).data},
+                status=status.HTTP_200_OK
+            )
+
+        except Exam.DoesNotExist:
+            return Response({"error": "Exam not found"}, status=status.HTTP_404_NOT_FOUND)
+        except SeatPlanError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except locking.ExamLocked as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        except Exception as e:
+            logger.exception("Unexpected error in %s", type(self).__name__)
+            metrics.VIEW_ERRORS.inc(type(self).__name__)
+            return Response({"error": f"An unexpected error occurred: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 class RoomViewSet(viewsets.ModelViewSet):
     """
     API endpoint for listing and managing Rooms.
     """
     # This queryset ensures the API only returns rooms that are marked as available for use.
     queryset = Room.objects.filter(is_available=True)
-    serializer_class = RoomSerializer
\ No newline at end of file
+    serializer_class = RoomSerializer
+
+    @action(detail=True, methods=['get', 'post'], parser_classes=[JSONParser, MultiPartParser, FormParser])
+    def layout(self, request, pk=None):
+        """
+        GET returns the room's layout in the compact JSON format (or MessagePack
+        with ?encoding=msgpack). POST replaces the room's seats with a layout,
+        sent either as the JSON body or as an uploaded .json/.msgpack "file".
+        """
+        room = self.get_object()
+
+        if request.method == 'POST':
+            try:
+                upload = request.FILES.get('file')
+                if upload is not None:
+                    layouts = read_layout_file(upload)
+                    if len(layouts) != 1:
+                        raise LayoutError(f"The file must describe exactly one room, found {len(layouts)}.")
+                    layout = layouts[0]
+                else:
+                    layout = normalize_room(request.data)
+            except LayoutError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            with transaction.atomic():
+                apply_layout(room, layout)
+
+        data = dump_room(room)
+        if request.query_params.get('encoding') == 'msgpack':
+            try:
+                return HttpResponse(encode_layout(data, 'msgpack'), content_type='application/msgpack')
+            except LayoutError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data, status=status.HTTP_201_CREATED if request.method == 'POST' else status.HTTP_200_OK)
+
+class MetricsView(View):
+    """Stage timings and counters of this process in the Prometheus text format."""
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(metrics.REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -55,7 +55,6 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'django_filters',
-    'import_export',
     'exams',
     'room',
 
@@ -70,6 +69,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'exams.routers.ReplicaRoutingMiddleware',
 ]
 
 
@@ -83,7 +83,11 @@ CORS_ALLOWED_ORIGINS = [
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
-    ]
+    ],
+    # Lets list endpoints filter on their filterset_fields, e.g. ?exam=<id>.
+    'DEFAULT_FILTER_BACKENDS': [
+        'django_filters.rest_framework.DjangoFilterBackend',
+    ],
 }
 
 ROOT_URLCONF = 'seatplanning.urls'
@@ -115,9 +119,60 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock when a transaction starts, so concurrent
+            # requests wait for each other instead of failing with "database is locked".
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
+# Optional read replica. When SEATPLANNING_REPLICA_NAME is set, GET requests
+# (lists, lookups and exports) read from it and everything else uses the
+# primary. Locally, point it at a second SQLite file and copy db.sqlite3 over
+# it to "replicate". SEATPLANNING_REPLICA_HOST overrides the host for servers.
+if os.environ.get('SEATPLANNING_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['SEATPLANNING_REPLICA_NAME'],
+        'HOST': os.environ.get('SEATPLANNING_REPLICA_HOST', DATABASES['default'].get('HOST', '')),
+        # Tests use the primary's test database for the replica as well.
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['exams.routers.ReplicaRouter']
+
+# Seconds that reads about an exam stay on the primary after its plan changes,
+# so users see their new plan before the replica catches up.
+REPLICA_STICKY_SECONDS = 30
+
+# Seat plan previews, seat grids, seat maps, progress events and the
+# replica's sticky reads live in the cache, so every worker process must see
+# the same one: files under SEATPLANNING_CACHE_DIR (shared by the workers of
+# one server) by default, or Redis when SEATPLANNING_REDIS_URL is set (shared
+# by several servers). A process-local cache such as LocMemCache is only
+# safe with a single worker; the exams.E001 check refuses it with a replica
+# or previews.
+if os.environ.get('SEATPLANNING_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['SEATPLANNING_REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('SEATPLANNING_CACHE_DIR', BASE_DIR / 'cache'),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Whether seat plans can be generated as previews (see exams.previews).
+SEAT_PLAN_PREVIEWS = True
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -155,6 +210,24 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded room templates and archived seat plans. Archives hold student
+# data, so the media directory is deliberately not served at a URL.
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Content-addressed copies of uploaded workbooks and the rows parsed from
+# them (see exams.uploads), trimmed to UPLOAD_CACHE_MAX_BYTES, least
+# recently used first. They hold student data, so uploads not used for
+# UPLOAD_CACHE_TTL seconds are deleted.
+UPLOAD_CACHE_DIR = MEDIA_ROOT / 'upload_cache'
+UPLOAD_CACHE_MAX_BYTES = 512 * 1024 * 1024
+UPLOAD_CACHE_TTL = 24 * 60 * 60
+
+# Measure the peak Python memory of seat plan generations with tracemalloc
+# (see exams.metrics.measure). It slows the whole worker down while a plan
+# is generated, so leave it off outside of benchmarks; otherwise only the
+# process's peak resident memory is reported.
+MEASURE_PYTHON_MEMORY = False
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 